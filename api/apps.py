@@ -1,7 +1,16 @@
 from __future__ import unicode_literals
 
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        # The team catalog itself is loaded on first use rather than here, as
+        # the database may not be set up yet (e.g. before `migrate`).
+        from api.catalog import invalidate_team_catalog
+        Team = self.get_model('Team')
+        post_save.connect(invalidate_team_catalog, sender=Team, dispatch_uid='team-catalog-save')
+        post_delete.connect(invalidate_team_catalog, sender=Team, dispatch_uid='team-catalog-delete')
@@ -0,0 +1,476 @@
+"""
+Async versions of the reads that clients hold open or poll the most, served
+by `nba_wins_pool.asgi`:
+
+  GET /api/v1/pools/<id>                 `PoolDetail.get`
+  GET /api/v1/pools/<id>/draft/          `DraftDetail.get`
+  GET /api/v1/pools/<id>/draft/events/   `DraftEvents.get`
+
+Under gunicorn's sync workers, each long-poll or event stream holds a whole
+worker until it ends. Here a waiting client only holds a coroutine, which
+its subscription's listener wakes up when a pick is published.
+
+The ORM still blocks, so `AsyncRoutes` makes the default executor of its
+event loop a pool of `ASGI_THREADS` threads. That pool runs every database
+call of the handlers below, and every request handed on to Django. It bounds
+how much blocking work runs at once, not how many clients can be connected.
+
+The handlers give the same answers as the Django views for the JSON,
+compact, MessagePack and event stream formats, and check tokens the same
+way. They skip the Django middleware, so they add no `Server-Timing` header
+and record no metrics. Anything else, e.g. the browsable API or indented
+JSON, is left to Django.
+
+Python 3 only, so nothing the WSGI application loads imports this module.
+"""
+import asyncio
+import functools
+import re
+
+from api.cache import etag_matches, get_cached_data, pool_etag
+from api.models import NUM_DRAFT_PICKS, Pool
+from api.pubsub import draft_channel, get_broker
+from api.renderers import CompactJSONRenderer, EventStreamRenderer, FastJSONRenderer, MessagePackRenderer, msgpack
+from api.serializers import PoolSerializer
+from api.snapshots import get_snapshot
+from api.views import DraftDetail, DraftEvents
+from asgiref.wsgi import WsgiToAsgi
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import QueryDict
+from rest_framework import exceptions, status
+from rest_framework.authentication import TokenAuthentication
+
+RENDERERS = {
+  'json': FastJSONRenderer(),
+  'compact': CompactJSONRenderer(),
+  'event-stream': EventStreamRenderer(),
+}
+if msgpack:
+  RENDERERS['msgpack'] = MessagePackRenderer()
+FORMATS_BY_MEDIA_TYPE = {renderer.media_type: format for format, renderer in RENDERERS.items()}
+
+POOL_FORMATS = ('json',)
+DRAFT_FORMATS = ('json', 'compact') + (('msgpack',) if msgpack else ())
+DRAFT_EVENTS_FORMATS = ('json', 'event-stream')
+
+
+######################################################################
+# BLOCKING CALLS
+######################################################################
+def _call(func, *args):
+  """Runs `func(*args)` with the connection handling of a Django request."""
+  close_old_connections()
+  try:
+    return func(*args)
+  finally:
+    close_old_connections()
+
+
+async def run_sync(func, *args):
+  """Runs the blocking `func(*args)` on the thread pool and returns its result."""
+  loop = asyncio.get_event_loop()
+  return await loop.run_in_executor(None, functools.partial(_call, func, *args))
+
+
+######################################################################
+# REQUESTS AND RESPONSES
+######################################################################
+class AsyncRequest(object):
+  """
+  The parts of an ASGI `http` scope the handlers read. `META` holds the
+  headers under the names Django gives them, e.g. `HTTP_IF_NONE_MATCH`.
+  """
+  def __init__(self, scope):
+    self.path = scope['path']
+    self.query_params = QueryDict(scope.get('query_string', b''))
+    self.META = {}
+    for name, value in scope['headers']:
+      key = 'HTTP_' + name.decode('latin1').upper().replace('-', '_')
+      value = value.decode('latin1')
+      self.META[key] = self.META[key] + ',' + value if key in self.META else value
+
+
+def negotiate(request, formats):
+  """
+  Picks the format of the answer out of `formats`, the first being the
+  default, like DRF would in the usual cases: from the `format` query
+  parameter, or else from the first media range of the Accept header.
+
+  Returns:
+    The format, or None if the request must be left to Django, e.g. for the
+    browsable API or indented JSON.
+  """
+  format = request.query_params.get('format')
+  if format is not None:
+    return format if format in formats else None
+
+  media_type, _, params = request.META.get('HTTP_ACCEPT', '*/*').split(',')[0].partition(';')
+  if 'indent' in params:
+    return None
+  media_type = media_type.strip()
+  if media_type in ('', '*/*', 'application/*'):
+    return formats[0]
+  format = FORMATS_BY_MEDIA_TYPE.get(media_type)
+  return format if format in formats else None
+
+
+def authenticate(request):
+  """
+  Checks the token of `request`, if it has one, like the Django views do.
+  Everyone may read these endpoints, so the user isn't needed.
+
+  Raises:
+    AuthenticationFailed: If the token is invalid.
+  """
+  TokenAuthentication().authenticate(request)
+
+
+def response(format, body, status_code=status.HTTP_200_OK, etag=None, headers=()):
+  """
+  Returns:
+    (status_code, headers, body): An answer in `format` for `send_response`.
+  """
+  renderer = RENDERERS[format]
+  content_type = renderer.media_type
+  if renderer.charset:
+    content_type = '%s; charset=%s' % (content_type, renderer.charset)
+  headers = [('Content-Type', content_type), ('Vary', 'Accept')] + list(headers)
+  if etag is not None:
+    headers.append(('ETag', etag))
+  return status_code, headers, body
+
+
+def render(format, data, **kwargs):
+  """Returns the answer with `data` rendered in `format`, see `response`."""
+  renderer = RENDERERS[format]
+  body = renderer.render(data)
+  if not isinstance(body, bytes):
+    body = body.encode(renderer.charset)
+  return response(format, body, **kwargs)
+
+
+def not_modified(format, etag):
+  return response(format, b'', status_code=status.HTTP_304_NOT_MODIFIED, etag=etag)
+
+
+def error_response(format, exc):
+  """The answer DRF gives when a view raises `exc`."""
+  headers = ()
+  if isinstance(exc, exceptions.AuthenticationFailed):
+    headers = [('WWW-Authenticate', TokenAuthentication().authenticate_header(None))]
+  return render(format, {'detail': exc.detail}, status_code=exc.status_code, headers=headers)
+
+
+def _encode_headers(headers):
+  return [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+
+
+async def send_response(send, status_code, headers, body):
+  headers = list(headers) + [('Content-Length', str(len(body)))]
+  await send({'type': 'http.response.start', 'status': status_code, 'headers': _encode_headers(headers)})
+  await send({'type': 'http.response.body', 'body': body})
+
+
+async def respond(send, format, load):
+  """
+  Sends the answer `load()` returns, running it on the thread pool, or the
+  answer to the API exception it raises.
+  """
+  try:
+    answer = await run_sync(load)
+  except exceptions.APIException as e:
+    answer = error_response(format, e)
+  await send_response(send, *answer)
+
+
+######################################################################
+# POOLS AND DRAFT BOARDS
+######################################################################
+async def pool_detail(request, send, receive, pool_id):
+  """`PoolDetail.get`. Returns False to leave `request` to Django."""
+  format = negotiate(request, POOL_FORMATS)
+  if format is None:
+    return False
+
+  def load():
+    authenticate(request)
+    pool = Pool.objects.filter(id=pool_id).first()
+    if pool is None:
+      raise exceptions.NotFound()
+    etag = pool_etag('pool', pool)
+    if etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+      return not_modified(format, etag)
+    return render(format, get_cached_data('pool', pool, lambda: PoolSerializer.to_data(pool)), etag=etag)
+
+  await respond(send, format, load)
+  return True
+
+
+async def draft_detail(request, send, receive, pool_id):
+  """`DraftDetail.get`. Returns False to leave `request` to Django."""
+  format = negotiate(request, DRAFT_FORMATS)
+  if format is None:
+    return False
+
+  def load():
+    authenticate(request)
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if format == 'json':
+      snapshot = get_snapshot(pool_id)
+      if snapshot is not None:
+        etag, payload = snapshot
+        if etag_matches(if_none_match, etag):
+          return not_modified(format, etag)
+        return response(format, payload, etag=etag)
+
+    pool = Pool.objects.filter(id=pool_id).first()
+    if pool is None:
+      raise exceptions.NotFound()
+    kind = 'draft' if format == 'json' else 'draft-%s' % format
+    etag = pool_etag(kind, pool)
+    if etag_matches(if_none_match, etag):
+      return not_modified(format, etag)
+    data = get_cached_data(kind, pool, lambda: DraftDetail.board_data(format, DraftDetail.get_draft(pool)))
+    return render(format, data, etag=etag)
+
+  await respond(send, format, load)
+  return True
+
+
+######################################################################
+# LIVE UPDATES OF THE DRAFT
+######################################################################
+async def next_message(subscription, timeout, disconnected):
+  """
+  Waits for the next message of `subscription` without blocking the loop.
+
+  Returns:
+    The message, or None if none arrives within `timeout` seconds or the
+    `disconnected` future is done first.
+  """
+  loop = asyncio.get_event_loop()
+  ready = asyncio.Event()
+  subscription.listener = lambda: loop.call_soon_threadsafe(ready.set)
+  deadline = loop.time() + timeout
+  try:
+    while True:
+      # Cleared before looking, so a message queued meanwhile sets it again.
+      ready.clear()
+      message = subscription.get_nowait()
+      if message is not None:
+        return message
+      remaining = deadline - loop.time()
+      if remaining <= 0 or disconnected.done():
+        return None
+      waiter = asyncio.ensure_future(ready.wait())
+      await asyncio.wait((waiter, disconnected), timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+      waiter.cancel()
+  finally:
+    subscription.listener = None
+
+
+async def wait_for_disconnect(receive):
+  while (await receive())['type'] != 'http.disconnect':
+    pass
+
+
+async def draft_events(request, send, receive, pool_id):
+  """`DraftEvents.get`. Returns False to leave `request` to Django."""
+  format = negotiate(request, DRAFT_EVENTS_FORMATS)
+  if format is None:
+    return False
+
+  last_pick_number = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('after') or 0
+  try:
+    last_pick_number = int(last_pick_number)
+  except ValueError:
+    await send_response(send, *render(format, 'Bad Request', status_code=status.HTTP_400_BAD_REQUEST))
+    return True
+
+  def load():
+    authenticate(request)
+    if not Pool.objects.filter(id=pool_id).exists():
+      raise exceptions.NotFound()
+    return DraftEvents.missed_events(pool_id, last_pick_number)
+
+  # Subscribe first, so that no pick falls between the replay and the
+  # subscription. Picks in both are dropped by their pick number.
+  subscription = get_broker().subscribe(draft_channel(pool_id))
+  disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+  timeout = getattr(settings, 'DRAFT_EVENTS_TIMEOUT', 30)
+  try:
+    with subscription:
+      try:
+        events = await run_sync(load)
+      except exceptions.APIException as e:
+        await send_response(send, *error_response(format, e))
+        return True
+
+      if format == EventStreamRenderer.format:
+        await _stream(send, subscription, events, last_pick_number, timeout, disconnected)
+        return True
+
+      if not events and last_pick_number < NUM_DRAFT_PICKS:
+        event = await next_message(subscription, timeout, disconnected)
+        while event is not None and event['draft_pick_number'] <= last_pick_number:
+          event = await next_message(subscription, timeout, disconnected)
+        events = [event] if event is not None else []
+      await send_response(send, *render(format, events))
+      return True
+  finally:
+    disconnected.cancel()
+
+
+async def _stream(send, subscription, events, last_pick_number, timeout, disconnected):
+  """`DraftEvents._stream`, until the client disconnects at the latest."""
+  keepalive = getattr(settings, 'DRAFT_EVENTS_KEEPALIVE', 15)
+  loop = asyncio.get_event_loop()
+  deadline = loop.time() + timeout
+
+  async def send_text(text):
+    await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+  await send({'type': 'http.response.start', 'status': status.HTTP_200_OK, 'headers': _encode_headers([
+    ('Content-Type', EventStreamRenderer.media_type),
+    ('Cache-Control', 'no-cache'),
+    ('X-Accel-Buffering', 'no'),
+  ])})
+  for event in events:
+    await send_text(DraftEvents.format_event(event))
+    last_pick_number = event['draft_pick_number']
+
+  while last_pick_number < NUM_DRAFT_PICKS:
+    remaining = deadline - loop.time()
+    if remaining <= 0:
+      break
+
+    event = await next_message(subscription, min(keepalive, remaining), disconnected)
+    if disconnected.done():
+      return
+    if event is None:
+      await send_text(': keepalive\n\n')
+    elif event['draft_pick_number'] > last_pick_number:
+      await send_text(DraftEvents.format_event(event))
+      last_pick_number = event['draft_pick_number']
+  await send({'type': 'http.response.body', 'body': b''})
+
+
+######################################################################
+# APPLICATION
+######################################################################
+# Matched like the patterns of nba_wins_pool/urls.py, in the same order.
+ROUTES = (
+  (re.compile(r'^/api/v1/pools/(?P<pool_id>[0-9]+)$'), pool_detail),
+  (re.compile(r'^/api/v1/pools/(?P<pool_id>[0-9]+)/draft/events/$'), draft_events),
+  (re.compile(r'^/api/v1/pools/(?P<pool_id>[0-9]+)/draft/'), draft_detail),
+)
+
+
+def django_to_asgi(wsgi_application):
+  """
+  Wraps the Django WSGI application with asgiref's `WsgiToAsgi`. Django 1.11
+  puts a space before the value of each Set-Cookie header, which WSGI
+  servers strip but ASGI servers reject, so this strips it too.
+  """
+  wrapped = WsgiToAsgi(wsgi_application)
+
+  async def application(scope, receive, send):
+    async def send_stripped(message):
+      if message['type'] == 'http.response.start':
+        message = dict(message, headers=[(name, value.strip()) for name, value in message['headers']])
+      await send(message)
+
+    await wrapped(scope, receive, send_stripped)
+  return application
+
+
+class AsyncRoutes(object):
+  """
+  ASGI application that answers the GETs of `ROUTES` itself, and hands every
+  other request, including those the handlers leave to Django, to the ASGI
+  application `fallback`, e.g. Django wrapped by `django_to_asgi`.
+  """
+  def __init__(self, fallback):
+    self.fallback = fallback
+    self._loop = None
+
+  async def __call__(self, scope, receive, send):
+    loop = asyncio.get_event_loop()
+    if loop is not self._loop:
+      # `run_sync` and `WsgiToAsgi` both run on the default executor.
+      loop.set_default_executor(ThreadPoolExecutor(max_workers=settings.ASGI_THREADS))
+      self._loop = loop
+
+    if scope['type'] == 'lifespan':
+      await self._lifespan(receive, send)
+      return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+      for pattern, handle in ROUTES:
+        match = pattern.match(scope['path'])
+        if match:
+          if await handle(AsyncRequest(scope), send, receive, **match.groupdict()):
+            return
+          break
+    await self.fallback(scope, receive, send)
+
+  async def _lifespan(self, receive, send):
+    while True:
+      message = await receive()
+      if message['type'] == 'lifespan.startup':
+        await send({'type': 'lifespan.startup.complete'})
+      elif message['type'] == 'lifespan.shutdown':
+        await send({'type': 'lifespan.shutdown.complete'})
+        return
+
+
+async def call(app, path, query_string='', headers=(), method='GET', body=b''):
+  """
+  Sends a request for `path` to the ASGI application `app` and reads the
+  whole answer, e.g. in tests and benchmarks.
+
+  Returns:
+    (status_code, headers, body): With the header names in lower case.
+  """
+  scope = {
+    'type': 'http',
+    'asgi': {'version': '3.0'},
+    'http_version': '1.1',
+    'method': method,
+    'scheme': 'http',
+    'path': path,
+    'root_path': '',
+    'query_string': query_string.encode('latin1'),
+    'headers': _encode_headers(list(headers) + ([('Content-Length', str(len(body)))] if body else [])),
+    'client': ('127.0.0.1', 0),
+    'server': ('testserver', 80),
+  }
+  done = asyncio.Event()
+  requested = []
+
+  async def receive():
+    if not requested:
+      requested.append(True)
+      return {'type': 'http.request', 'body': body, 'more_body': False}
+    await done.wait()
+    return {'type': 'http.disconnect'}
+
+  answer = {}
+  chunks = []
+
+  async def send(message):
+    if message['type'] == 'http.response.start':
+      answer['status'] = message['status']
+      answer['headers'] = {name.decode('latin1'): value.decode('latin1') for name, value in message['headers']}
+    else:
+      chunks.append(message.get('body', b''))
+      if not message.get('more_body'):
+        done.set()
+
+  try:
+    await app(scope, receive, send)
+  finally:
+    done.set()
+  return answer['status'], answer['headers'], b''.join(chunks)
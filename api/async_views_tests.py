@@ -0,0 +1,190 @@
+import json
+import threading
+import time
+import unittest
+
+from api.cache import get_response_cache
+from api.models import NUM_DRAFT_PICKS
+from api.models_tests import ModelsTestMixin
+from api.pubsub import draft_channel, get_broker
+from api.renderers import CompactJSONRenderer
+from api.snapshots import get_snapshot
+from django.core.wsgi import get_wsgi_application
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+try:
+  import asyncio
+  from api.async_views import AsyncRoutes, call, django_to_asgi
+except (ImportError, SyntaxError):
+  # Python 2, or asgiref isn't installed.
+  AsyncRoutes = None
+
+
+@unittest.skipIf(AsyncRoutes is None, 'The ASGI application needs Python 3 and asgiref')
+@override_settings(DRAFT_EVENTS_TIMEOUT=0.2)
+class AsyncViewsTestCase(ModelsTestMixin, TransactionTestCase):
+  # The handlers query from other threads, which only see committed data.
+
+  def setUp(self):
+    get_response_cache().clear()
+    self.app = AsyncRoutes(django_to_asgi(get_wsgi_application()))
+    self.loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(self.loop)
+    self.users = self.create_test_users(num_users=2)
+    self.teams = self.create_test_teams(num_teams=3)
+    self.pool = self.create_test_draft(self.users)
+    for user, team in zip(self.users, self.teams[:2]):
+      self.pool.make_draft_pick(user, team)
+
+  def tearDown(self):
+    asyncio.set_event_loop(None)
+    self.loop.close()
+
+  def get(self, path, query_string='', headers=()):
+    return self.loop.run_until_complete(call(self.app, path, query_string, headers))
+
+
+class AsyncPoolTests(AsyncViewsTestCase):
+  def test_pool(self):
+    path = '/api/v1/pools/%s' % self.pool.id
+    status_code, headers, body = self.get(path)
+
+    assert status_code == 200
+    assert headers['content-type'] == 'application/json'
+    assert json.loads(body.decode('utf-8'))['name'] == self.pool.name
+
+    status_code, _, body = self.get(path, headers=[('If-None-Match', headers['etag'])])
+    assert status_code == 304
+    assert body == b''
+
+  def test_missing_pool(self):
+    status_code, _, body = self.get('/api/v1/pools/12345')
+
+    assert status_code == 404
+    assert json.loads(body.decode('utf-8')) == {'detail': 'Not found.'}
+
+  def test_invalid_token(self):
+    status_code, headers, _ = self.get(
+      '/api/v1/pools/%s' % self.pool.id, headers=[('Authorization', 'Token nope')])
+
+    assert status_code == 401
+    assert headers['www-authenticate'] == 'Token'
+
+  def test_valid_token(self):
+    token = Token.objects.get(user=self.users[0])
+    status_code, _, _ = self.get('/api/v1/pools/%s' % self.pool.id, headers=[('Authorization', 'Token ' + token.key)])
+
+    assert status_code == 200
+
+  def test_browsable_api_left_to_django(self):
+    status_code, headers, _ = self.get(
+      '/api/v1/pools/%s' % self.pool.id, headers=[('Accept', 'text/html,*/*;q=0.8')])
+
+    assert status_code == 200
+    assert headers['content-type'].startswith('text/html')
+    assert headers['set-cookie'].startswith('csrftoken=')
+
+  def test_other_routes_left_to_django(self):
+    status_code, _, body = self.get('/api/v1/pools/%s/leaderboard/' % self.pool.id)
+
+    assert status_code == 200
+    assert len(json.loads(body.decode('utf-8'))) == 2
+
+
+  def test_create_pool_left_to_django(self):
+    data = {'name': 'Created', 'max_size': 2, 'members': [self.users[0].username]}
+    status_code, _, body = self.loop.run_until_complete(call(
+      self.app, '/api/v1/pools/', headers=[('Content-Type', 'application/json')],
+      method='POST', body=json.dumps(data).encode('utf-8')))
+
+    assert status_code == 201
+    assert json.loads(body.decode('utf-8'))['name'] == 'Created'
+
+
+class AsyncDraftTests(AsyncViewsTestCase):
+  def test_snapshot(self):
+    etag, payload = get_snapshot(self.pool.id)
+    path = '/api/v1/pools/%s/draft/' % self.pool.id
+
+    status_code, headers, body = self.get(path)
+    assert (status_code, headers['etag'], body) == (200, etag, payload)
+
+    status_code, _, _ = self.get(path, headers=[('If-None-Match', etag)])
+    assert status_code == 304
+
+  def test_compact(self):
+    status_code, headers, body = self.get('/api/v1/pools/%s/draft/' % self.pool.id, 'format=compact')
+
+    assert status_code == 200
+    assert headers['content-type'] == CompactJSONRenderer.media_type
+    assert len(json.loads(body.decode('utf-8'))['picks']['user']) == 30
+
+
+class AsyncDraftEventsTests(AsyncViewsTestCase):
+  def setUp(self):
+    super(AsyncDraftEventsTests, self).setUp()
+    self.path = '/api/v1/pools/%s/draft/events/' % self.pool.id
+
+  def test_long_poll_missed_picks(self):
+    status_code, _, body = self.get(self.path, 'after=1')
+
+    assert status_code == 200
+    assert json.loads(body.decode('utf-8')) == [
+      {'draft_pick_number': 2, 'username': self.users[1].username, 'team_id': self.teams[1].team_short_code},
+    ]
+
+  def test_long_poll_waits_for_next_pick(self):
+    event = {'draft_pick_number': 3, 'username': self.users[0].username, 'team_id': self.teams[2].team_short_code}
+    timer = threading.Timer(0.05, get_broker().publish, (draft_channel(self.pool.id), event))
+    timer.start()
+
+    status_code, _, body = self.get(self.path, 'after=2')
+    timer.join()
+
+    assert status_code == 200
+    assert json.loads(body.decode('utf-8')) == [event]
+
+  @override_settings(DRAFT_EVENTS_TIMEOUT=5)
+  def test_long_poll_completed_draft(self):
+    start = time.time()
+    status_code, _, body = self.get(self.path, 'after=%s' % NUM_DRAFT_PICKS)
+
+    assert status_code == 200
+    assert json.loads(body.decode('utf-8')) == []
+    assert time.time() - start < 1
+
+  def test_long_poll_timeout(self):
+    status_code, _, body = self.get(self.path, 'after=2')
+
+    assert status_code == 200
+    assert json.loads(body.decode('utf-8')) == []
+
+  def test_long_polls_wait_together(self):
+    # Many more than ASGI_THREADS clients wait at once.
+    start = time.time()
+    with override_settings(ASGI_THREADS=2):
+      results = self.loop.run_until_complete(asyncio.gather(*[
+        call(self.app, self.path, 'after=2') for _ in range(10)
+      ]))
+
+    assert [status_code for status_code, _, _ in results] == [200] * 10
+    # One after the other, they'd take 10 timeouts.
+    assert time.time() - start < 1
+
+  def test_event_stream_resumes_from_last_event_id(self):
+    status_code, headers, body = self.get(
+      self.path, headers=[('Accept', 'text/event-stream'), ('Last-Event-ID', '1')])
+
+    assert status_code == 200
+    assert headers['content-type'] == 'text/event-stream'
+    body = body.decode('utf-8')
+    assert body.startswith('id: 2\nevent: pick\ndata: ')
+    assert json.loads(body.split('data: ')[1].split('\n')[0])['team_id'] == self.teams[1].team_short_code
+    assert 'id: 1\n' not in body
+    assert body.endswith(': keepalive\n\n')
+
+  def test_missing_pool(self):
+    status_code, _, _ = self.get('/api/v1/pools/12345/draft/events/')
+
+    assert status_code == 404
@@ -0,0 +1,135 @@
+"""
+Drafting on behalf of users who let their turn run out.
+
+`AutoDrafter` ranks the teams once per run: each user's `TeamPreference`s
+first, then the rest of the teams by `projected_wins`. The teams still on the
+board of each pool are kept as a bitmask over the teams, so choosing a pick is
+a scan of one ranking and needs no queries of its own. The picks themselves
+go through `Pool.make_draft_pick`, like the picks users make.
+"""
+from api.exceptions import BadPickException
+from api.logs import get_logger
+from api.models import DraftPick, POOL_DRAFTING, Pool, Team, TeamPreference
+from collections import defaultdict
+from django.utils import timezone
+
+logger = get_logger('nba-logger')
+
+BATCH_SIZE = 500
+
+
+class AutoDrafter(object):
+  def __init__(self):
+    teams = list(Team.objects.order_by('-projected_wins', 'id'))
+    self.bits = {team.id: 1 << i for i, team in enumerate(teams)}
+    self.all_teams = (1 << len(teams)) - 1
+    self.default_ranking = [(self.bits[team.id], team) for team in teams]
+    self._rankings = {}
+
+  def rankings(self, user_ids):
+    """
+    Returns:
+      rankings(dict): {user_id: [(bit, team), ...]}, best team first, for
+        each of `user_ids`. Rankings are loaded once per user and kept.
+    """
+    missing = set(user_ids) - set(self._rankings)
+    if missing:
+      teams_by_id = {team.id: team for _, team in self.default_ranking}
+      preferred = defaultdict(list)
+      preferences = (TeamPreference.objects
+                     .filter(user_id__in=missing)
+                     .order_by('user_id', 'rank')
+                     .values_list('user_id', 'team_id'))
+      for user_id, team_id in preferences:
+        preferred[user_id].append((self.bits[team_id], teams_by_id[team_id]))
+
+      for user_id in missing:
+        ranking = preferred.get(user_id)
+        if ranking:
+          ranked = set(bit for bit, _ in ranking)
+          ranking.extend(entry for entry in self.default_ranking if entry[0] not in ranked)
+        self._rankings[user_id] = ranking or self.default_ranking
+
+    return {user_id: self._rankings[user_id] for user_id in user_ids}
+
+  def remaining_teams(self, pool_ids):
+    """
+    Returns:
+      remaining(dict): {pool_id: bitmask of the teams nobody has drafted yet}.
+    """
+    remaining = dict.fromkeys(pool_ids, self.all_teams)
+    drafted = (DraftPick.objects
+               .filter(pool_id__in=pool_ids, team__isnull=False)
+               .values_list('pool_id', 'team_id'))
+    for pool_id, team_id in drafted:
+      remaining[pool_id] &= ~self.bits[team_id]
+    return remaining
+
+  @staticmethod
+  def choose(ranking, remaining):
+    """Returns the best team of `ranking` that is in `remaining`, or None."""
+    for bit, team in ranking:
+      if remaining & bit:
+        return team
+    return None
+
+  def draft(self, pools):
+    """
+    Makes the current pick of each of `pools` for its current picker.
+
+    Args:
+      pools(list): Drafting pools, with `current_picker` loaded.
+
+    Returns:
+      num_picks(int): The number of picks made. Pools whose pick was made by
+        someone else in the meantime are skipped.
+    """
+    remaining = self.remaining_teams([pool.id for pool in pools])
+    rankings = self.rankings(set(pool.current_picker_id for pool in pools))
+
+    num_picks = 0
+    for pool in pools:
+      team = self.choose(rankings[pool.current_picker_id], remaining[pool.id])
+      if team is None:
+        continue
+      try:
+        pool.make_draft_pick(pool.current_picker, team, pick_number=pool.current_pick_number)
+      except BadPickException as e:
+        logger.info('autodraft.pick_skipped', pool_id=pool.id, reason=e)
+        continue
+      num_picks += 1
+
+    return num_picks
+
+
+def overdue_pools(deadline, now=None):
+  """
+  Returns:
+    pools(QuerySet): The drafting pools whose current pick has been waiting
+      for longer than `deadline` (a timedelta), ordered by id.
+  """
+  cutoff = (now or timezone.now()) - deadline
+  return (Pool.objects
+          .filter(state=POOL_DRAFTING, current_pick_started_at__lte=cutoff)
+          .select_related('current_picker')
+          .order_by('id'))
+
+
+def draft_overdue_picks(deadline, now=None, batch_size=BATCH_SIZE):
+  """
+  Auto-picks for every pool returned by `overdue_pools`, `batch_size` pools
+  at a time.
+
+  Returns:
+    num_picks(int): The number of picks made.
+  """
+  drafter = AutoDrafter()
+  pools = overdue_pools(deadline, now)
+  num_picks = 0
+  last_id = 0
+  while True:
+    batch = list(pools.filter(id__gt=last_id)[:batch_size])
+    if not batch:
+      return num_picks
+    num_picks += drafter.draft(batch)
+    last_id = batch[-1].id
@@ -0,0 +1,899 @@
+"""
+Benchmarks for the hot paths of the API.
+
+Run them with `python manage.py benchmark [name ...]`, which creates a
+throwaway test database, runs each benchmark against it and prints the
+results as JSON. Every benchmark is a function that takes the number of
+repetitions and a scale factor for the size of its dataset, and returns a
+JSON-serializable dict.
+"""
+import functools
+import json
+import logging
+import random
+import threading
+import time
+
+from api.cache import get_response_cache
+from api.jobs import run_due_jobs
+from api.models import (
+  DRAFT_ORDER_BY_POOL_SIZE,
+  DraftBoardSnapshot,
+  DraftPick,
+  Membership,
+  NUM_DRAFT_PICKS,
+  Pool,
+  Standing,
+  SUPPORTED_POOL_SIZES,
+  Team,
+)
+from api.parsers import FastJSONParser
+from api.renderers import CompactJSONRenderer, FastJSONRenderer, MessagePackRenderer, msgpack
+from api.serializers import DraftPickSerializer, PoolMemberSerializer, PoolSerializer
+from api.snapshots import save_snapshot
+from collections import OrderedDict
+from datetime import datetime
+from django.contrib.auth.models import User
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils.six import BytesIO, StringIO
+from django.utils.six.moves import queue
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name):
+  """Registers the decorated function as the benchmark called `name`."""
+  def register(func):
+    BENCHMARKS[name] = func
+    return func
+  return register
+
+
+def percentile(samples, pct):
+  """Returns the `pct` percentile of `samples` using the nearest-rank method."""
+  ordered = sorted(samples)
+  rank = max(int(round(pct / 100.0 * len(ordered))), 1)
+  return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples):
+  """Summarizes a list of timings (in seconds) in milliseconds."""
+  return {
+    'n': len(samples),
+    'mean_ms': 1000.0 * sum(samples) / len(samples),
+    'p50_ms': 1000.0 * percentile(samples, 50),
+    'p95_ms': 1000.0 * percentile(samples, 95),
+    'p99_ms': 1000.0 * percentile(samples, 99),
+  }
+
+
+def measure_request(client, method, path, **kwargs):
+  """
+  Makes one request with `client` and returns the response, the time it took
+  in seconds and the number of queries it ran.
+  """
+  with CaptureQueriesContext(connection) as queries:
+    start = time.time()
+    response = getattr(client, method)(path, **kwargs)
+    elapsed = time.time() - start
+  return response, elapsed, len(queries)
+
+
+def compare(baseline, results, threshold=0.1, path=()):
+  """
+  Yields (metric, before, after) for every latency in `results` (a `*_ms`
+  key at any depth) that moved by more than `threshold` from `baseline`,
+  the results of an earlier run.
+  """
+  for key, value in sorted(results.items()):
+    if key not in baseline:
+      continue
+    if isinstance(value, dict) and isinstance(baseline[key], dict):
+      for change in compare(baseline[key], value, threshold, path + (key,)):
+        yield change
+    elif key.endswith('_ms') and baseline[key]:
+      if abs(value - baseline[key]) > threshold * baseline[key]:
+        yield '.'.join(path + (key,)), baseline[key], value
+
+
+def create_users(num_users, prefix='bench'):
+  """Creates `num_users` users in one query and returns them."""
+  # Usernames must match the [a-zA-Z0-9]+ of the user URLs.
+  stamp = '%s%sx' % (prefix, int(time.time() * 1000000))
+  User.objects.bulk_create([
+    User(username='%s%s' % (stamp, i), email='%s%s@mailinator.com' % (stamp, i))
+    for i in range(num_users)
+  ])
+  return list(User.objects.filter(username__startswith=stamp).order_by('id'))
+
+
+def create_teams():
+  """Creates one Team per draft pick in one query and returns them."""
+  stamp = 'bench_%s' % int(time.time() * 1000000)
+  Team.objects.bulk_create([
+    Team(league_short_code='NBA', league_full_name='National Basketball Association',
+         team_short_code='%s_%s' % (stamp, i), team_full_name='Team %s' % i)
+    for i in range(NUM_DRAFT_PICKS)
+  ])
+  return list(Team.objects.filter(team_short_code__startswith=stamp).order_by('id'))
+
+
+def create_drafted_pools(num_pools, users, teams, rng):
+  """
+  Creates `num_pools` pools of `users` whose drafts are complete, with their
+  standings, using bulk inserts. Returns the ids of the new pools.
+  """
+  last_id = Pool.objects.order_by('-id').values_list('id', flat=True).first() or 0
+  Pool.objects.bulk_create(
+    [Pool(name='Benchmark Pool', max_size=len(users), member_count=len(users)) for _ in range(num_pools)],
+    batch_size=500)
+  pool_ids = list(Pool.objects.filter(id__gt=last_id).values_list('id', flat=True))
+
+  user_ids = [user.id for user in users]
+  picks = []
+  standings = []
+  for pool_id in pool_ids:
+    draft_order = Pool.compute_draft_order(user_ids, rng=rng)
+    drafted_teams = list(teams)
+    rng.shuffle(drafted_teams)
+    for (pick, user_id), team in zip(sorted(draft_order.items()), drafted_teams):
+      picks.append(DraftPick(pool_id=pool_id, user_id=user_id, team=team, draft_pick_number=pick))
+    standings.extend(Standing(pool_id=pool_id, user_id=user_id) for user_id in user_ids)
+
+  DraftPick.objects.bulk_create(picks, batch_size=500)
+  Standing.objects.bulk_create(standings, batch_size=500)
+  return pool_ids
+
+
+def create_full_pool(users):
+  """Creates a Pool whose members are `users`, without starting the draft."""
+  pool = Pool.objects.create(name='Benchmark Pool', max_size=len(users))
+  Membership.objects.bulk_create([
+    Membership(pool=pool, user=user, date_joined=datetime.now()) for user in users
+  ])
+  return pool
+
+
+def create_complete_board(rng):
+  """Creates a pool of six, with its members, whose 30 picks have been made."""
+  users = create_users(6)
+  pool_id = create_drafted_pools(1, users, create_teams(), rng)[0]
+  Membership.objects.bulk_create([
+    Membership(pool_id=pool_id, user=user, date_joined=datetime.now()) for user in users
+  ])
+  return Pool.objects.get(id=pool_id)
+
+
+def board(pool):
+  return list(pool.draftpick_set.select_related('user', 'team').order_by('draft_pick_number'))
+
+
+######################################################################
+# POOL FILL
+######################################################################
+def _begin_draft_one_insert_per_pick(pool):
+  """The original `Pool.begin_draft`: one INSERT per pick, no locking."""
+  members = pool.members.all()
+  users_by_id = {member.id: member for member in members}
+  user_ids_by_draft_order = Pool.compute_draft_order(users_by_id.keys())
+  for (pick, user_id) in user_ids_by_draft_order.items():
+    DraftPick.objects.create(pool=pool, user=users_by_id[user_id], draft_pick_number=pick)
+
+
+@benchmark('begin_draft')
+def bench_begin_draft(repeat, scale):
+  """
+  Latency of building the draft board when a pool fills, for every supported
+  pool size, with one INSERT per pick (before) and `Pool.begin_draft` (after).
+  """
+  results = OrderedDict()
+  for pool_size in SUPPORTED_POOL_SIZES:
+    users = create_users(pool_size)
+    timings = {'before': [], 'after': []}
+    for _ in range(repeat):
+      for label, start_draft in (('before', _begin_draft_one_insert_per_pick),
+                                 ('after', Pool.begin_draft)):
+        pool = create_full_pool(users)
+        start = time.time()
+        start_draft(pool)
+        timings[label].append(time.time() - start)
+
+    results[pool_size] = {label: summarize(samples) for label, samples in timings.items()}
+
+  return results
+
+
+######################################################################
+# DRAFT ORDER
+######################################################################
+def _compute_draft_order_per_pick(user_ids, rng):
+  """The original `Pool.compute_draft_order`: fills the result pick by pick."""
+  random_user_ids = list(set(user_ids))
+  rng.shuffle(random_user_ids)
+  draft_order = list(DRAFT_ORDER_BY_POOL_SIZE[len(set(user_ids))])
+  user_ids_by_draft_order = {}
+  for pick_index, user_index in enumerate(draft_order):
+    user_ids_by_draft_order[pick_index + 1] = random_user_ids[user_index - 1]
+  return user_ids_by_draft_order
+
+
+@benchmark('compute_draft_order')
+def bench_compute_draft_order(repeat, scale):
+  """
+  Time to compute 1,000 draft orders for every supported pool size, filling
+  the result pick by pick (before) and with `Pool.compute_draft_order` (after).
+  Both use the same seeded rng so they produce the same orders.
+  """
+  results = OrderedDict()
+  for pool_size in SUPPORTED_POOL_SIZES:
+    user_ids = list(range(1, pool_size + 1))
+    timings = {'before': [], 'after': []}
+    for _ in range(repeat):
+      for label, compute in (('before', _compute_draft_order_per_pick),
+                             ('after', lambda ids, rng: Pool.compute_draft_order(ids, rng=rng))):
+        rng = random.Random(pool_size)
+        start = time.time()
+        for _ in range(1000):
+          compute(user_ids, rng)
+        timings[label].append(time.time() - start)
+
+    results[pool_size] = {label: summarize(samples) for label, samples in timings.items()}
+
+  return results
+
+
+######################################################################
+# TEAM RESULTS
+######################################################################
+@benchmark('load_team_results')
+def bench_load_team_results(repeat, scale):
+  """
+  Time to apply a full 82-game season of results for every team to
+  10,000 * `scale` completed pools of six (use `--scale 10` for 100k pools).
+  Every team was drafted in every pool, so every standing changes.
+  """
+  rng = random.Random(82)
+  users = create_users(6)
+  teams = create_teams()
+  num_pools = int(10000 * scale)
+
+  start = time.time()
+  create_drafted_pools(num_pools, users, teams, rng)
+  seed_time = time.time() - start
+
+  timings = []
+  for _ in range(repeat):
+    records = {}
+    for team in Team.objects.filter(id__in=[t.id for t in teams]):
+      wins = rng.randint(0, 82)
+      records[team.id] = (team.wins + wins, team.losses + 82 - wins)
+
+    start = time.time()
+    Team.set_records(records)
+    timings.append(time.time() - start)
+
+  return {
+    'num_pools': num_pools,
+    'num_standings': Standing.objects.filter(user__in=users).count(),
+    'seed_s': seed_time,
+    'season': summarize(timings),
+  }
+
+
+######################################################################
+# INDEXES
+######################################################################
+def create_index_pools(num_pools):
+  """
+  Creates `num_pools` pools of the same two users, each with one pick made
+  and one open, and analyzes the tables for the planner.
+
+  Returns:
+    (users, pool): The two users and the pool in the middle.
+  """
+  users = create_users(2, prefix='index')
+  team = create_teams()[0]
+  stamp = 'index_%s' % int(time.time() * 1000000)
+  Pool.objects.bulk_create(
+    [Pool(name='%s_%s' % (stamp, i), max_size=2) for i in range(num_pools)], batch_size=500)
+  pool_ids = list(Pool.objects.filter(name__startswith=stamp).order_by('id').values_list('id', flat=True))
+
+  today = datetime.now()
+  Membership.objects.bulk_create(
+    [Membership(pool_id=pool_id, user=user, date_joined=today) for pool_id in pool_ids for user in users],
+    batch_size=500)
+  DraftPick.objects.bulk_create(
+    [DraftPick(pool_id=pool_id, user=users[0], team=team, draft_pick_number=1) for pool_id in pool_ids] +
+    [DraftPick(pool_id=pool_id, user=users[1], draft_pick_number=2) for pool_id in pool_ids],
+    batch_size=500)
+
+  with connection.cursor() as cursor:
+    cursor.execute('ANALYZE')
+
+  return users, Pool.objects.get(id=pool_ids[len(pool_ids) // 2])
+
+
+def explain(queryset):
+  """Returns the query plan of `queryset` as a single string."""
+  sql, params = queryset.query.sql_with_params()
+  prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+  with connection.cursor() as cursor:
+    cursor.execute(prefix + sql, params)
+    return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def index_name(model, columns, unique=True):
+  """Returns the name of the index on exactly `columns` of `model`, or None."""
+  with connection.cursor() as cursor:
+    constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+  for name, constraint in constraints.items():
+    if constraint['index'] and constraint['columns'] == columns and constraint['unique'] == unique:
+      return name
+  return None
+
+
+def index_lookups(users, pool):
+  """
+  Returns:
+    lookups(OrderedDict): Map from the name of each hot DraftPick and
+      Membership lookup -> (queryset, names of the indexes it should use).
+  """
+  return OrderedDict([
+    ('next_open_pick', (
+      DraftPick.objects.filter(pool=pool, team=None).order_by('draft_pick_number'),
+      ['api_draftpick_open_idx'])),
+    ('picked_teams', (
+      DraftPick.objects.filter(pool=pool).exclude(team__isnull=True),
+      [index_name(DraftPick, ['pool_id', 'team_id']), index_name(DraftPick, ['pool_id', 'draft_pick_number'])])),
+    ('membership', (
+      Membership.objects.filter(user=users[0], pool=pool),
+      [index_name(Membership, ['user_id', 'pool_id'])])),
+    ('memberships_of_user', (
+      Membership.objects.filter(user=users[0]),
+      [index_name(Membership, ['user_id', 'pool_id'])])),
+  ])
+
+
+@benchmark('index_plans')
+def bench_index_plans(repeat, scale):
+  """
+  Query plans and latencies of the hot DraftPick and Membership lookups on
+  100,000 * `scale` pools of two, with one pick made and one open in each.
+  """
+  users, pool = create_index_pools(max(int(100000 * scale), 1))
+  results = OrderedDict()
+  for name, (queryset, index_names) in index_lookups(users, pool).items():
+    plan = explain(queryset)
+    timings = []
+    for _ in range(repeat):
+      start = time.time()
+      list(queryset.all())
+      timings.append(time.time() - start)
+    results[name] = dict(
+      summarize(timings), plan=plan, uses_index=any(index in plan for index in index_names if index))
+  return results
+
+
+######################################################################
+# POOLS BY USER
+######################################################################
+@benchmark('pools_by_user')
+def bench_pools_by_user(repeat, scale):
+  """
+  Latency and query count of `PoolsByUser.get` for users in 1, 10 and 500
+  completed pools of six.
+  """
+  rng = random.Random(14)
+  teams = create_teams()
+  results = OrderedDict()
+  for num_pools in (1, 10, 500):
+    users = create_users(6)
+    create_drafted_pools(num_pools, users, teams, rng)
+    Membership.objects.bulk_create([
+      Membership(pool_id=pool_id, user=user, date_joined=datetime.now())
+      for pool_id in Pool.objects.filter(draftpick__user=users[0]).distinct().values_list('id', flat=True)
+      for user in users
+    ], batch_size=500)
+
+    client = APIClient()
+    client.force_authenticate(user=users[0])
+    timings = []
+    num_queries = set()
+    for _ in range(repeat):
+      response, elapsed, queries = measure_request(client, 'get', '/api/v1/%s/pools/' % users[0].username)
+      assert len(response.data) == num_pools
+      timings.append(elapsed)
+      num_queries.add(queries)
+
+    results[num_pools] = dict(summarize(timings), queries=sorted(num_queries))
+
+  return results
+
+
+######################################################################
+# LOAD TEST
+######################################################################
+LOADTEST_THREADS = 8
+
+
+def run_concurrently(num_threads, tasks, work):
+  """
+  Calls `work(client, samples, task)` for every task on `num_threads`
+  threads, each with its own `APIClient` and database connection, and
+  returns the samples they appended along with the wall time in seconds.
+  With a single thread the tasks run on the calling thread.
+  """
+  tasks_queue = queue.Queue()
+  for task in tasks:
+    tasks_queue.put(task)
+  samples = []
+  errors = []
+
+  def worker(close_connection):
+    client = APIClient()
+    thread_samples = []
+    try:
+      while True:
+        try:
+          task = tasks_queue.get_nowait()
+        except queue.Empty:
+          break
+        work(client, thread_samples, task)
+    except Exception as e:
+      errors.append(e)
+    finally:
+      samples.extend(thread_samples)
+      if close_connection:
+        connection.close()
+
+  start = time.time()
+  if num_threads == 1:
+    worker(close_connection=False)
+  else:
+    threads = [threading.Thread(target=worker, args=(True,)) for _ in range(num_threads)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+  wall_time = time.time() - start
+
+  if errors:
+    raise errors[0]
+  return samples, wall_time
+
+
+def _request(client, samples, endpoint, method, path, **kwargs):
+  """Makes a request that must succeed and records it under `endpoint`."""
+  response, elapsed, queries = measure_request(client, method, path, **kwargs)
+  assert response.status_code == 200, '%s %s: %s %s' % (
+    method.upper(), path, response.status_code, response.data)
+  samples.append((endpoint, elapsed, queries))
+  return response
+
+
+def _fill_pool(client, samples, task):
+  pool_id, users = task
+  for user in users:
+    _request(client, samples, 'pool_members_put', 'put', '/api/v1/pools/%s/members/' % pool_id,
+             data={'username': user.username}, format='json')
+
+
+def _draft_pool(client, samples, task):
+  """Plays a whole draft: each picker takes a random team that's still open."""
+  pool_id, users_by_username, team_ids = task
+  rng = random.Random(pool_id)
+  path = '/api/v1/pools/%s/draft/' % pool_id
+  board = _request(client, samples, 'draft_get', 'get', path).data
+  while True:
+    open_picks = [pick for pick in board if 'team' not in pick]
+    if not open_picks:
+      return
+    drafted = set(pick['team']['team_id'] for pick in board if 'team' in pick)
+    client.force_authenticate(user=users_by_username[open_picks[0]['user']['username']])
+    team_id = rng.choice([team_id for team_id in team_ids if team_id not in drafted])
+    board = _request(client, samples, 'draft_put', 'put', path,
+                     data={'team_id': team_id}, format='json').data
+
+
+def _summarize_load(samples, wall_time):
+  endpoints = OrderedDict()
+  for endpoint in sorted(set(endpoint for endpoint, _, _ in samples)):
+    timings = [elapsed for name, elapsed, _ in samples if name == endpoint]
+    queries = [num_queries for name, _, num_queries in samples if name == endpoint]
+    endpoints[endpoint] = dict(
+      summarize(timings),
+      queries_mean=float(sum(queries)) / len(queries),
+      queries_max=max(queries),
+      throughput_rps=len(timings) / wall_time,
+    )
+  return {
+    'wall_s': wall_time,
+    'requests': len(samples),
+    'throughput_rps': len(samples) / wall_time,
+    'endpoints': endpoints,
+  }
+
+
+@benchmark('loadtest')
+def bench_loadtest(repeat, scale):
+  """
+  Simulates whole pools end to end through the API, in process: 5 * `scale`
+  pools of every supported size are filled through `PoolMembers.put` by
+  users drawn from a shared set of 50 * `scale`, then every draft is played
+  to the end through `DraftDetail.put`. Pools are filled and drafted
+  concurrently on `LOADTEST_THREADS` threads (one on SQLite, which can't take
+  concurrent writers). Each request is one sample, so `repeat` is unused.
+  """
+  rng = random.Random(16)
+  num_pools_per_size = max(1, int(5 * scale))
+  users = create_users(max(max(SUPPORTED_POOL_SIZES), int(50 * scale)))
+  team_ids = [team.team_short_code for team in create_teams()]
+  num_threads = 1 if connection.vendor == 'sqlite' else LOADTEST_THREADS
+
+  pools = []
+  for pool_size in SUPPORTED_POOL_SIZES:
+    for _ in range(num_pools_per_size):
+      pool = Pool.objects.create(name='Load Test Pool', max_size=pool_size)
+      pools.append((pool.id, rng.sample(users, pool_size)))
+
+  fill_samples, fill_time = run_concurrently(num_threads, pools, _fill_pool)
+  draft_samples, draft_time = run_concurrently(num_threads, [
+    (pool_id, {user.username: user for user in pool_users}, team_ids)
+    for pool_id, pool_users in pools
+  ], _draft_pool)
+
+  return {
+    'num_users': len(users),
+    'num_pools': len(pools),
+    'threads': num_threads,
+    'fill': _summarize_load(fill_samples, fill_time),
+    'draft': _summarize_load(draft_samples, draft_time),
+  }
+
+
+######################################################################
+# LOGGING
+######################################################################
+def _join_pool_eager_logging(pool_id, username):
+  """
+  The original `PoolMembers.put` path, which formats its log messages, and
+  evaluates a queryset for one of them, whether or not they are emitted.
+  """
+  std_logger = logging.getLogger('nba-logger')
+  std_logger.info('request data: %s' % {'username': username})
+  user = User.objects.get(username=username)
+  pool = Pool.objects.get(id=int(pool_id))
+  std_logger.info('pool: %s' % pool)
+  pool.add_member(user)
+  std_logger.info('pool after adding member: %s' % pool.members.all())
+  return pool.members.all()
+
+
+def _join_pool(pool_id, username):
+  return PoolMemberSerializer.update_from_data(pool_id, {'username': username})
+
+
+@benchmark('logging')
+def bench_logging(repeat, scale):
+  """
+  Latency and query count of joining a pool with the original eager logging
+  (before) and the structured, lazy logging (after), with 'nba-logger' at
+  INFO and at WARNING. Records are formatted into memory, not printed.
+  """
+  std_logger = logging.getLogger('nba-logger')
+  old_level, old_handlers = std_logger.level, std_logger.handlers
+  handler = logging.StreamHandler(StringIO())
+  handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+  std_logger.handlers = [handler]
+
+  results = OrderedDict()
+  try:
+    for level in ('INFO', 'WARNING'):
+      std_logger.setLevel(level)
+      results[level] = OrderedDict()
+      for label, join in (('before', _join_pool_eager_logging), ('after', _join_pool)):
+        timings = []
+        num_queries = set()
+        for _ in range(repeat):
+          # Pools of six, so no join starts a draft.
+          users = create_users(5)
+          pool = Pool.objects.create(name='Benchmark Pool', max_size=6)
+          for user in users:
+            with CaptureQueriesContext(connection) as queries:
+              start = time.time()
+              join(str(pool.id), user.username)
+              timings.append(time.time() - start)
+            num_queries.add(len(queries))
+        results[level][label] = dict(summarize(timings), queries=sorted(num_queries))
+  finally:
+    std_logger.setLevel(old_level)
+    std_logger.handlers = old_handlers
+
+  return results
+
+
+######################################################################
+# JSON RENDERING
+######################################################################
+@benchmark('json')
+def bench_json(repeat, scale):
+  """
+  Time to render the `DraftDetail` and `PoolDetail` data of a complete
+  6-person, 30-pick draft 1,000 times with DRF's `JSONRenderer` (before) and
+  `FastJSONRenderer` (after), and to parse the rendered board as many times
+  with `JSONParser` and `FastJSONParser`.
+  """
+  pool = create_complete_board(random.Random(19))
+  payloads = OrderedDict([
+    ('draft', DraftPickSerializer.to_data_batch(board(pool))),
+    ('pool', PoolSerializer.to_data_batch([pool])[0]),
+  ])
+
+  results = OrderedDict()
+  for name, data in payloads.items():
+    timings = {'before': [], 'after': []}
+    for _ in range(repeat):
+      for label, renderer in (('before', JSONRenderer()), ('after', FastJSONRenderer())):
+        start = time.time()
+        for _ in range(1000):
+          rendered = renderer.render(data)
+        timings[label].append(time.time() - start)
+    results['render_%s' % name] = dict(
+      {label: summarize(samples) for label, samples in timings.items()}, bytes=len(rendered))
+
+  body = JSONRenderer().render(payloads['draft'])
+  timings = {'before': [], 'after': []}
+  for _ in range(repeat):
+    for label, parser in (('before', JSONParser()), ('after', FastJSONParser())):
+      start = time.time()
+      for _ in range(1000):
+        parser.parse(BytesIO(body), 'application/json', {'encoding': 'utf-8'})
+      timings[label].append(time.time() - start)
+  results['parse_draft'] = {label: summarize(samples) for label, samples in timings.items()}
+
+  return results
+
+
+######################################################################
+# BOARD FORMATS
+######################################################################
+@benchmark('board_formats')
+def bench_board_formats(repeat, scale):
+  """
+  Size of a complete 6-person, 30-pick board as the list of picks (before)
+  and as the columnar board in compact JSON and MessagePack, and the time a
+  client takes to decode each 1,000 times.
+  """
+  draft_picks = board(create_complete_board(random.Random(20)))
+  formats = [
+    ('json', FastJSONRenderer(), DraftPickSerializer.to_data_batch, json.loads),
+    ('compact', CompactJSONRenderer(), DraftPickSerializer.to_columns, json.loads),
+  ]
+  if msgpack is not None:
+    formats.append(('msgpack', MessagePackRenderer(), DraftPickSerializer.to_columns,
+                    lambda body: msgpack.unpackb(body, raw=False)))
+
+  results = OrderedDict()
+  for name, renderer, to_data, decode in formats:
+    body = renderer.render(to_data(draft_picks))
+    timings = []
+    for _ in range(repeat):
+      start = time.time()
+      for _ in range(1000):
+        decode(body)
+      timings.append(time.time() - start)
+    results[name] = dict(bytes=len(body), decode=summarize(timings))
+
+  return results
+
+
+######################################################################
+# DRAFT BOARD SNAPSHOTS
+######################################################################
+@benchmark('draft_snapshot')
+def bench_draft_snapshot(repeat, scale):
+  """
+  Latency and queries of `GET /draft/` for a complete board that isn't in the
+  response cache, serialized on the way out (before, which also looks for a
+  snapshot first) and served from its snapshot (after), and the time a pick
+  spends writing the snapshot.
+  """
+  pool = create_complete_board(random.Random(22))
+  draft_picks = board(pool)
+  client = APIClient()
+  client.force_authenticate(user=draft_picks[0].user)
+  path = '/api/v1/pools/%s/draft/' % pool.id
+  cache = get_response_cache()
+
+  results = OrderedDict()
+  for label in ('before', 'after'):
+    if label == 'before':
+      DraftBoardSnapshot.objects.filter(pool=pool).delete()
+    else:
+      save_snapshot(pool.id, draft_picks)
+
+    timings = []
+    for _ in range(repeat):
+      cache.clear()
+      _, elapsed, num_queries = measure_request(client, 'get', path)
+      timings.append(elapsed)
+    results[label] = dict(queries=num_queries, **summarize(timings))
+
+  timings = []
+  for _ in range(repeat):
+    with transaction.atomic():
+      start = time.time()
+      save_snapshot(pool.id, draft_picks)
+      timings.append(time.time() - start)
+  results['snapshot_write'] = summarize(timings)
+
+  return results
+
+
+######################################################################
+# POOL BATCHES
+######################################################################
+def _create_pools_one_by_one(pools_data):
+  """What `PoolSerializer.create_from_data` does for each pool of a batch."""
+  for pool_data in pools_data:
+    users = User.objects.filter(username__in=pool_data['members'])
+    pool = Pool.objects.create(name=pool_data['name'], max_size=pool_data['max_size'])
+    for user in users:
+      pool.add_member(user)
+
+
+@benchmark('pool_batch')
+def bench_pool_batch(repeat, scale):
+  """
+  Time and queries to create a batch of 1,000 full pools of six (times
+  `scale`), one pool and one `add_member` at a time (before) and with
+  `PoolSerializer.create_batch_from_data` (after). At most 3 rounds, as
+  every round creates the whole batch twice. Queries are counted for a
+  batch of 10 pools, since the query log of a connection is bounded.
+  """
+  num_pools = max(int(1000 * scale), 1)
+  rng = random.Random(23)
+  usernames = [user.username for user in create_users(num_pools)]
+  pools_data = [
+    {'name': 'Batch Pool %s' % i, 'max_size': 6, 'members': rng.sample(usernames, 6)}
+    for i in range(num_pools)
+  ]
+  creators = (
+    ('before', _create_pools_one_by_one),
+    ('after', lambda data: PoolSerializer.create_batch_from_data({'pools': data})),
+  )
+
+  results = OrderedDict()
+  for label, create in creators:
+    with CaptureQueriesContext(connection) as queries:
+      create(pools_data[:10])
+    results[label] = {'num_pools': num_pools, 'queries_per_10_pools': len(queries)}
+
+  timings = {'before': [], 'after': []}
+  for _ in range(min(repeat, 3)):
+    for label, create in creators:
+      start = time.time()
+      create(pools_data)
+      timings[label].append(time.time() - start)
+
+  for label, samples in timings.items():
+    results[label].update(summarize(samples))
+  return results
+
+
+######################################################################
+# ASYNC DRAFT START
+######################################################################
+@benchmark('draft_start')
+def bench_draft_start(repeat, scale):
+  """
+  Latency of the join that fills a pool of six, which starts the draft in
+  the request (before) or queues it for a `run_jobs` worker (after), and the
+  time the worker then spends on each queued start.
+  """
+  users = create_users(6)
+  timings = {'before': [], 'after': [], 'worker': []}
+  for _ in range(repeat):
+    for label, draft_start_async in (('before', False), ('after', True)):
+      pool = Pool.objects.create(name='Benchmark Pool', max_size=len(users))
+      for user in users[:-1]:
+        pool.add_member(user)
+
+      with override_settings(DRAFT_START_ASYNC=draft_start_async):
+        start = time.time()
+        pool.add_member(users[-1])
+        timings[label].append(time.time() - start)
+
+    start = time.time()
+    run_due_jobs()
+    timings['worker'].append(time.time() - start)
+
+  return OrderedDict((label, summarize(timings[label])) for label in ('before', 'after', 'worker'))
+
+
+######################################################################
+# ASGI
+######################################################################
+SERVER_THREADS = 4
+
+
+def _summarize_server(timings, timeout, wall_time):
+  long_polls = timings['long_poll']
+  return OrderedDict([
+    ('threads', SERVER_THREADS),
+    # Answered within the first timeout or so, i.e. waiting at the same time.
+    ('long_polls_held_at_once', sum(1 for elapsed in long_polls if elapsed < 1.5 * timeout)),
+    ('long_poll', summarize(long_polls)),
+    ('board_get', summarize(timings['board_get'])),
+    ('wall_s', wall_time),
+  ])
+
+
+@benchmark('asgi')
+def bench_asgi(repeat, scale):
+  """
+  How many draft long-polls a server holds at once and how long a board GET
+  waits meanwhile, under WSGI (before) and ASGI (after). 40 long-polls
+  (times `scale`) that time out after half a second, then `repeat` board
+  GETs, are all sent at once. Under WSGI they're served by 4 threads, like 4
+  gunicorn sync workers, and under ASGI by the event loop of
+  `nba_wins_pool.asgi` with 4 `ASGI_THREADS`. Latencies count from when
+  every request was sent. The ASGI half needs Python 3 and asgiref.
+  """
+  pool = create_complete_board(random.Random(25))
+  save_snapshot(pool.id, board(pool))
+  timeout = 0.5
+  requests = (
+    [('long_poll', '/api/v1/pools/%s/draft/events/' % pool.id, 'after=%s' % NUM_DRAFT_PICKS)] * max(int(40 * scale), 1) +
+    [('board_get', '/api/v1/pools/%s/draft/' % pool.id, '')] * repeat
+  )
+
+  results = OrderedDict()
+  with override_settings(DRAFT_EVENTS_TIMEOUT=timeout, ASGI_THREADS=SERVER_THREADS):
+    timings = {'long_poll': [], 'board_get': []}
+    start = time.time()
+
+    def wsgi_request(client, samples, request):
+      kind, path, query_string = request
+      response = client.get(path + '?' + query_string)
+      assert response.status_code == 200, '%s: %s' % (path, response.status_code)
+      timings[kind].append(time.time() - start)
+
+    _, wall_time = run_concurrently(SERVER_THREADS, requests, wsgi_request)
+    results['before'] = _summarize_server(timings, timeout, wall_time)
+
+    try:
+      import asyncio
+      from api.async_views import AsyncRoutes, call, django_to_asgi
+    except (ImportError, SyntaxError):
+      return results
+
+    app = AsyncRoutes(django_to_asgi(get_wsgi_application()))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    timings = {'long_poll': [], 'board_get': []}
+
+    def asgi_done(kind, future):
+      status_code = future.result()[0]
+      assert status_code == 200, '%s: %s' % (kind, status_code)
+      timings[kind].append(time.time() - start)
+
+    try:
+      start = time.time()
+      futures = []
+      for kind, path, query_string in requests:
+        future = asyncio.ensure_future(call(app, path, query_string))
+        future.add_done_callback(functools.partial(asgi_done, kind))
+        futures.append(future)
+      loop.run_until_complete(asyncio.gather(*futures))
+      results['after'] = _summarize_server(timings, timeout, time.time() - start)
+    finally:
+      asyncio.set_event_loop(None)
+      loop.close()
+
+  return results
@@ -0,0 +1,22 @@
+from api.benchmarks import bench_loadtest, compare
+from api.models import DraftPick, POOL_COMPLETE, Pool, SUPPORTED_POOL_SIZES
+from django.test import TestCase
+
+
+class CompareTests(TestCase):
+  def test_reports_changed_latencies(self):
+    baseline = {'a': {'p50_ms': 10.0, 'p95_ms': 20.0, 'n': 5}, 'b': {'p50_ms': 1.0}}
+    results = {'a': {'p50_ms': 10.5, 'p95_ms': 30.0, 'n': 50}, 'c': {'p50_ms': 1.0}}
+
+    assert list(compare(baseline, results)) == [('a.p95_ms', 20.0, 30.0)]
+
+
+class LoadTestTests(TestCase):
+  def test_plays_every_draft(self):
+    results = bench_loadtest(repeat=1, scale=0.2)
+
+    assert results['num_pools'] == len(SUPPORTED_POOL_SIZES)
+    assert results['fill']['endpoints']['pool_members_put']['n'] == sum(SUPPORTED_POOL_SIZES)
+    assert results['draft']['endpoints']['draft_put']['n'] == 30 * len(SUPPORTED_POOL_SIZES)
+    assert set(Pool.objects.values_list('state', flat=True)) == {POOL_COMPLETE}
+    assert not DraftPick.objects.filter(team__isnull=True).exists()
@@ -0,0 +1,157 @@
+"""
+Versioned read-through cache for pool responses.
+
+Every `Pool` has a `generation` counter that is bumped whenever its members
+or its draft board change. Cached responses and their ETags are keyed by
+(pool id, generation), so a write makes every older entry unreachable
+instead of having to find and delete it; stale entries simply age out of
+the cache.
+
+The cache itself is the Django cache named `RESPONSE_CACHE_ALIAS`, so the
+backend is pluggable through `settings.CACHES`: `LRUMemoryCache` below for
+tests and single processes, or a Redis-protocol backend in production.
+"""
+import threading
+import time
+
+from api.instrumentation import instrument
+from collections import OrderedDict
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from django.utils.six.moves import cPickle as pickle
+from rest_framework import status
+from rest_framework.response import Response
+
+RESPONSE_CACHE_ALIAS = 'responses'
+
+
+class LRUMemoryCache(BaseCache):
+  """
+  Thread-safe, process-local cache backend that evicts the least recently
+  used entry once `MAX_ENTRIES` is reached. Values are pickled, like they
+  would be by a networked backend, so callers never share cached objects.
+  """
+  def __init__(self, name, params):
+    BaseCache.__init__(self, params)
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def _get_entry(self, key):
+    """Returns the pickled value of `key`, or None. Caller holds the lock."""
+    entry = self._entries.get(key)
+    if entry is None:
+      return None
+
+    pickled, expiry = entry
+    if expiry is not None and expiry <= time.time():
+      del self._entries[key]
+      return None
+
+    # Mark the entry as most recently used.
+    del self._entries[key]
+    self._entries[key] = entry
+    return pickled
+
+  def _set_entry(self, key, pickled, timeout):
+    """Stores `pickled` under `key`, evicting if needed. Caller holds the lock."""
+    self._entries.pop(key, None)
+    while len(self._entries) >= self._max_entries:
+      self._entries.popitem(last=False)
+    self._entries[key] = (pickled, self.get_backend_timeout(timeout))
+
+  def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+    key = self.make_key(key, version=version)
+    self.validate_key(key)
+    pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    with self._lock:
+      if self._get_entry(key) is not None:
+        return False
+      self._set_entry(key, pickled, timeout)
+      return True
+
+  def get(self, key, default=None, version=None):
+    key = self.make_key(key, version=version)
+    self.validate_key(key)
+    with self._lock:
+      pickled = self._get_entry(key)
+    return default if pickled is None else pickle.loads(pickled)
+
+  def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+    key = self.make_key(key, version=version)
+    self.validate_key(key)
+    pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    with self._lock:
+      self._set_entry(key, pickled, timeout)
+
+  def delete(self, key, version=None):
+    key = self.make_key(key, version=version)
+    self.validate_key(key)
+    with self._lock:
+      self._entries.pop(key, None)
+
+  def has_key(self, key, version=None):
+    key = self.make_key(key, version=version)
+    self.validate_key(key)
+    with self._lock:
+      return self._get_entry(key) is not None
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+
+def get_response_cache():
+  return caches[RESPONSE_CACHE_ALIAS]
+
+
+def etag_matches(if_none_match, etag):
+  """Whether the value of an If-None-Match header matches `etag`."""
+  if not if_none_match:
+    return False
+  etags = parse_etags(if_none_match)
+  return etag in etags or '*' in etags
+
+
+def pool_etag(kind, pool):
+  """The ETag of the `kind` representation of `pool` as it is now."""
+  return quote_etag('%s-%s-%s' % (kind, pool.id, pool.generation))
+
+
+def get_cached_data(kind, pool, build_data):
+  """
+  Returns the data of the `kind` response of `pool`, building it with
+  `build_data()` and caching it only when no up to date copy is cached.
+  """
+  cache = get_response_cache()
+  key = 'response:%s:%s:%s' % (kind, pool.id, pool.generation)
+  data = cache.get(key)
+  if data is None:
+    with instrument('serialization'):
+      data = build_data()
+    cache.set(key, data)
+  return data
+
+
+def cached_response(request, kind, pool, build_data):
+  """
+  Returns the `kind` response of `pool` for `request`, building its data
+  with `build_data()` only when no up to date copy is cached. A request whose
+  If-None-Match header matches the current ETag gets an empty 304. The
+  format is negotiated, so both vary on Accept.
+
+  Args:
+    request: The DRF request being answered.
+    kind(str): Which representation of the pool this is, e.g. 'pool' or
+      'draft'. Part of both the cache key and the ETag.
+    pool(Pool): The pool being requested, with an up to date `generation`.
+    build_data(callable): Returns the response data on a cache miss.
+  """
+  etag = pool_etag(kind, pool)
+  if etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+    response = Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+  else:
+    response = Response(get_cached_data(kind, pool, build_data), headers={'ETag': etag})
+  patch_vary_headers(response, ('Accept',))
+  return response
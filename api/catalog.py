@@ -0,0 +1,138 @@
+"""
+Process-wide catalog of the teams.
+
+The 30 teams are loaded once per process, on first use, together with their
+pre-serialized API data, so that pick validation and board serialization
+need no team queries. A catalog is a snapshot: its `Team`s and dicts are
+shared by every request and must not be modified. Only its set of known
+missing teams grows, under `_lock`.
+
+Saving or deleting a `Team` (e.g. `loaddata nba_teams.yaml`) drops the
+catalog of the process, through the signals connected in `ApiConfig.ready`,
+and bumps a version stamp in the shared response cache, which the other
+processes check every `VERSION_CHECK_INTERVAL` seconds. Bulk writes don't
+send signals, so a team missing from the catalog also causes a reload; a
+team that is still missing afterwards is remembered as such until the version
+stamp changes, so repeated lookups of unknown teams don't reload each time.
+Records (`wins`/`losses`) change all season long and are deliberately not
+read from the catalog.
+"""
+import threading
+import time
+
+from api.cache import get_response_cache
+from api.models import Team
+
+VERSION_KEY = 'team-catalog:version'
+VERSION_CHECK_INTERVAL = 30
+
+_catalog = None
+_lock = threading.Lock()
+
+
+class TeamCatalog(object):
+  def __init__(self, teams, version):
+    # The serializers use the catalog themselves.
+    from api.serializers import TeamSerializer
+
+    self.version = version
+    self.checked_at = time.time()
+    self.teams_by_id = {team.id: team for team in teams}
+    self.teams_by_short_code = {team.team_short_code: team for team in teams}
+    self.data_by_id = {team.id: TeamSerializer.to_data(team) for team in teams}
+    # (mapping name, key) pairs found in neither this catalog nor a reload.
+    self.missing = set()
+
+
+def _version():
+  return get_response_cache().get(VERSION_KEY)
+
+
+def _reload(previous=None):
+  """
+  Reloads the catalog of this process only.
+
+  Args:
+    previous: The catalog being replaced. Its known missing teams carry over
+      while the version stamp is unchanged.
+  """
+  global _catalog
+  with _lock:
+    catalog = TeamCatalog(list(Team.objects.all()), _version())
+    if previous is not None and previous.version == catalog.version:
+      catalog.missing = set(previous.missing)
+    _catalog = catalog
+  return catalog
+
+
+def get_team_catalog():
+  """Returns the current catalog, loading it if needed."""
+  catalog = _catalog
+  if catalog is not None and time.time() - catalog.checked_at > VERSION_CHECK_INTERVAL:
+    version = _version()
+    if version == catalog.version:
+      catalog.checked_at = time.time()
+    else:
+      catalog = None
+
+  if catalog is None:
+    catalog = _reload()
+  return catalog
+
+
+def invalidate_team_catalog(**kwargs):
+  """
+  Drops the catalog of this process and tells the others to drop theirs.
+  Connected to the `post_save` and `post_delete` signals of `Team`.
+  """
+  global _catalog
+  _catalog = None
+  cache = get_response_cache()
+  cache.add(VERSION_KEY, 0, timeout=None)
+  try:
+    cache.incr(VERSION_KEY)
+  except ValueError:
+    # Evicted in between; any new value tells the other processes to reload.
+    cache.set(VERSION_KEY, int(time.time()), timeout=None)
+
+
+def _lookup(mapping, key):
+  """
+  Returns `key` from the catalog mapping named `mapping`, or None. A miss
+  reloads the catalog once per version stamp.
+  """
+  catalog = get_team_catalog()
+  value = getattr(catalog, mapping).get(key)
+  if value is None and (mapping, key) not in catalog.missing:
+    catalog = _reload(catalog)
+    value = getattr(catalog, mapping).get(key)
+    if value is None:
+      with _lock:
+        catalog.missing.add((mapping, key))
+  return value
+
+
+def get_team(short_code):
+  """
+  Returns the `Team` whose `team_short_code` is `short_code`.
+
+  Raises:
+    Team.DoesNotExist: If there is no such team.
+  """
+  team = _lookup('teams_by_short_code', short_code)
+  if team is None:
+    raise Team.DoesNotExist('No team %s' % short_code)
+  return team
+
+
+def get_team_data(team_id):
+  """
+  Returns the pre-serialized `TeamSerializer` data of the team `team_id`.
+
+  Raises:
+    KeyError: If there is no such team.
+  """
+  data = _lookup('data_by_id', team_id)
+  if data is None:
+    raise KeyError(team_id)
+  return data
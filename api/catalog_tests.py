@@ -0,0 +1,91 @@
+from api import catalog
+from api.catalog import VERSION_KEY, get_team, get_team_catalog, get_team_data
+from api.cache import get_response_cache
+from api.models import Standing, Team
+from api.views_tests import ViewsTestCase
+
+
+class TeamCatalogTests(ViewsTestCase):
+  def setUp(self):
+    super(TeamCatalogTests, self).setUp()
+    self.teams = self.create_test_teams(num_teams=2)
+
+  def test_no_queries_once_loaded(self):
+    get_team_catalog()
+
+    with self.assertNumQueries(0):
+      assert get_team('team-1') == self.teams[1]
+      assert get_team_data(self.teams[0].id)['team_id'] == 'team-0'
+
+  def test_unknown_team(self):
+    with self.assertRaises(Team.DoesNotExist):
+      get_team('not-a-team')
+
+  def test_unknown_team_reloads_once(self):
+    get_team_catalog()
+    # One reload for each unknown team, not for each lookup.
+    with self.assertNumQueries(2):
+      for _ in range(3):
+        with self.assertRaises(Team.DoesNotExist):
+          get_team('not-a-team')
+        with self.assertRaises(Team.DoesNotExist):
+          get_team('not-a-team-either')
+
+    with self.assertNumQueries(1):
+      with self.assertRaises(KeyError):
+        get_team_data(12345)
+
+  def test_unknown_team_found_after_save(self):
+    with self.assertRaises(Team.DoesNotExist):
+      get_team('team-new')
+    Team.objects.create(team_short_code='team-new', team_full_name='New')
+
+    assert get_team('team-new').team_full_name == 'New'
+
+  def test_save_invalidates(self):
+    get_team_catalog()
+    self.teams[0].team_full_name = 'Renamed'
+    self.teams[0].save()
+
+    assert get_team_data(self.teams[0].id)['team_full_name'] == 'Renamed'
+
+  def test_bulk_created_teams_are_found(self):
+    get_team_catalog()
+    Team.objects.bulk_create([Team(team_short_code='team-bulk', team_full_name='Bulk')])
+
+    assert get_team('team-bulk').team_full_name == 'Bulk'
+
+  def test_other_processes_invalidate(self):
+    loaded = get_team_catalog()
+    # Another process bumps the version stamp.
+    get_response_cache().set(VERSION_KEY, 'elsewhere', timeout=None)
+
+    assert get_team_catalog() is loaded
+    loaded.checked_at -= catalog.VERSION_CHECK_INTERVAL + 1
+    assert get_team_catalog() is not loaded
+
+
+class CatalogPickTests(ViewsTestCase):
+  def setUp(self):
+    super(CatalogPickTests, self).setUp()
+    self.users = self.create_test_users(num_users=2)
+    self.teams = self.create_test_teams(num_teams=2)
+    self.pool = self.create_test_draft(self.users)
+    self.client.force_authenticate(user=self.users[0])
+    self.url = '/api/v1/pools/%s/draft/' % self.pool.id
+
+  def test_unknown_team(self):
+    response = self.client.put(self.url, {'team_id': 'not-a-team'}, format='json')
+
+    assert response.status_code == 400
+
+  def test_standings_use_current_records(self):
+    get_team_catalog()
+    # Records are updated in bulk, without touching the catalog.
+    Team.set_records({self.teams[0].id: (7, 3)})
+
+    response = self.client.put(self.url, {'team_id': 'team-0'}, format='json')
+
+    assert response.status_code == 200
+    standing = Standing.objects.get(pool=self.pool, user=self.users[0])
+    assert (standing.wins, standing.losses) == (7, 3)
@@ -0,0 +1,254 @@
+import json
+import os
+import shutil
+import tempfile
+
+from api.autodraft import AutoDrafter, draft_overdue_picks
+from api.jobs import run_due_jobs
+from api.models import DraftBoardSnapshot, DraftPick, Job, Pool, Standing, Team, TeamPreference
+from api.models_tests import ModelsTestCase
+from datetime import timedelta
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from django.utils.six import StringIO
+
+
+class CommandsTestCase(ModelsTestCase):
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir)
+
+  def write_file(self, name, contents):
+    path = os.path.join(self.tmp_dir, name)
+    with open(path, 'w') as f:
+      f.write(contents)
+    return path
+
+  def call_command(self, *args, **kwargs):
+    stdout = StringIO()
+    call_command(*args, stdout=stdout, **kwargs)
+    return stdout.getvalue()
+
+
+class LoadTeamResultsTests(CommandsTestCase):
+  def setUp(self):
+    super(LoadTeamResultsTests, self).setUp()
+    self.users = self.create_test_users(num_users=2)
+    self.teams = self.create_test_teams(num_teams=3)
+    self.pool = self.create_test_draft(self.users)
+    self.pool.make_draft_pick(self.users[0], self.teams[0])
+    self.pool.make_draft_pick(self.users[1], self.teams[1])
+
+  def _record(self, team):
+    team = Team.objects.get(id=team.id)
+    return (team.wins, team.losses)
+
+  def _standing(self, user):
+    standing = Standing.objects.get(pool=self.pool, user=user)
+    return (standing.wins, standing.losses)
+
+  def test_game_results(self):
+    path = self.write_file('results.json', json.dumps([
+      {'winner': 'team-0', 'loser': 'team-1'},
+      {'winner': 'team-0', 'loser': 'team-2'},
+      {'winner': 'team-2', 'loser': 'team-1'},
+    ]))
+
+    self.call_command('load_team_results', path)
+
+    assert self._record(self.teams[0]) == (2, 0)
+    assert self._record(self.teams[1]) == (0, 2)
+    assert self._record(self.teams[2]) == (1, 1)
+    assert self._standing(self.users[0]) == (2, 0)
+    assert self._standing(self.users[1]) == (0, 2)
+
+  def test_team_records(self):
+    path = self.write_file('records.csv', 'team_id,wins,losses\nteam-0,5,1\nteam-1,3,3\n')
+
+    self.call_command('load_team_results', path)
+    # Loading the same records again must not double count.
+    self.call_command('load_team_results', path)
+
+    assert self._record(self.teams[0]) == (5, 1)
+    assert self._standing(self.users[0]) == (5, 1)
+    assert self._standing(self.users[1]) == (3, 3)
+
+  def test_async(self):
+    path = self.write_file('records.csv', 'team_id,wins,losses\nteam-0,5,1\n')
+
+    output = self.call_command('load_team_results', path, run_async=True)
+
+    assert output.strip() == 'Read 1 rows, queued the update of 1 teams.'
+    assert self._record(self.teams[0]) == (0, 0)
+    run_due_jobs()
+    assert self._record(self.teams[0]) == (5, 1)
+    assert self._standing(self.users[0]) == (5, 1)
+
+  def test_async_games_are_added_when_run(self):
+    first = self.write_file('first.json', json.dumps([{'winner': 'team-0', 'loser': 'team-1'}]))
+    second = self.write_file('second.json', json.dumps([
+      {'winner': 'team-0', 'loser': 'team-2'},
+      {'winner': 'team-1', 'loser': 'team-0'},
+    ]))
+
+    # Both files are queued before the worker runs.
+    self.call_command('load_team_results', first, run_async=True)
+    self.call_command('load_team_results', second, run_async=True)
+    run_due_jobs()
+
+    assert self._record(self.teams[0]) == (2, 1)
+    assert self._record(self.teams[1]) == (1, 1)
+    assert self._record(self.teams[2]) == (0, 1)
+    assert self._standing(self.users[0]) == (2, 1)
+
+  def test_same_games_loaded_once(self):
+    path = self.write_file('results.json', json.dumps([{'winner': 'team-0', 'loser': 'team-1'}]))
+
+    self.call_command('load_team_results', path)
+    with self.assertRaises(CommandError):
+      self.call_command('load_team_results', path)
+    with self.assertRaises(CommandError):
+      self.call_command('load_team_results', path, run_async=True)
+    run_due_jobs()
+
+    assert self._record(self.teams[0]) == (1, 0)
+    assert self._standing(self.users[1]) == (0, 1)
+
+  def test_async_same_games_queued_once(self):
+    path = self.write_file('results.json', json.dumps([{'winner': 'team-0', 'loser': 'team-1'}]))
+
+    self.call_command('load_team_results', path, run_async=True)
+    with self.assertRaises(CommandError):
+      self.call_command('load_team_results', path, run_async=True)
+    run_due_jobs()
+    with self.assertRaises(CommandError):
+      self.call_command('load_team_results', path)
+
+    assert self._record(self.teams[0]) == (1, 0)
+    assert Job.objects.filter(kind='add_team_results').count() == 1
+
+  def test_unknown_team(self):
+    path = self.write_file('results.yaml', '- winner: team-0\n  loser: not-a-team\n')
+
+    with self.assertRaises(CommandError):
+      self.call_command('load_team_results', path)
+
+    assert self._record(self.teams[0]) == (0, 0)
+
+
+class AutodraftTests(CommandsTestCase):
+  def setUp(self):
+    super(AutodraftTests, self).setUp()
+    self.users = self.create_test_users(num_users=2)
+    self.teams = self.create_test_teams(num_teams=4)
+    for team, projected_wins in zip(self.teams, (10, 40, 30, 20)):
+      Team.objects.filter(id=team.id).update(projected_wins=projected_wins)
+    self.pool = self.create_test_draft(self.users)
+
+  def _expire_current_pick(self, pool):
+    Pool.objects.filter(id=pool.id).update(
+      current_pick_started_at=timezone.now() - timedelta(hours=2))
+
+  def _team(self, pool, pick_number):
+    return DraftPick.objects.get(pool=pool, draft_pick_number=pick_number).team_id
+
+  def test_picks_by_projected_wins(self):
+    self._expire_current_pick(self.pool)
+
+    output = self.call_command('autodraft', deadline_minutes=60)
+
+    assert output.strip() == 'Made 1 auto-picks.'
+    assert self._team(self.pool, 1) == self.teams[1].id
+    # The next pick has only just come up.
+    assert self._team(self.pool, 2) is None
+    assert Pool.objects.get(id=self.pool.id).current_pick_number == 2
+
+  def test_picks_by_preferences(self):
+    self.pool.make_draft_pick(self.users[0], self.teams[3])
+    for rank, team in enumerate((self.teams[3], self.teams[0]), 1):
+      TeamPreference.objects.create(user=self.users[1], team=team, rank=rank)
+    self._expire_current_pick(self.pool)
+
+    self.call_command('autodraft', deadline_minutes=60)
+
+    assert self._team(self.pool, 2) == self.teams[0].id
+    assert Standing.objects.get(pool=self.pool, user=self.users[1]).wins == 0
+
+  def test_skips_picks_within_deadline(self):
+    output = self.call_command('autodraft', deadline_minutes=60)
+
+    assert output.strip() == 'Made 0 auto-picks.'
+    assert self._team(self.pool, 1) is None
+
+  def test_batches(self):
+    pools = [self.pool] + [self.create_test_draft(self.users) for _ in range(2)]
+    for pool in pools:
+      self._expire_current_pick(pool)
+
+    assert draft_overdue_picks(timedelta(minutes=60), batch_size=2) == 3
+    assert [self._team(pool, 1) for pool in pools] == [self.teams[1].id] * 3
+
+  def test_choose_falls_back_to_projected_wins(self):
+    TeamPreference.objects.create(user=self.users[0], team=self.teams[0], rank=1)
+    drafter = AutoDrafter()
+    ranking = drafter.rankings([self.users[0].id])[self.users[0].id]
+
+    assert [team.id for _, team in ranking] == [
+      self.teams[i].id for i in (0, 1, 2, 3)]
+    remaining = drafter.all_teams & ~drafter.bits[self.teams[0].id] & ~drafter.bits[self.teams[1].id]
+    assert drafter.choose(ranking, remaining) == self.teams[2]
+    assert drafter.choose(ranking, 0) is None
+
+
+class RebuildDraftSnapshotsTests(CommandsTestCase):
+  def setUp(self):
+    super(RebuildDraftSnapshotsTests, self).setUp()
+    self.users = self.create_test_users(num_users=2)
+    self.teams = self.create_test_teams(num_teams=2)
+    self.pools = [self.create_test_draft(self.users) for _ in range(3)]
+    self.create_test_pool(max_size=3)
+
+  def _board(self, pool):
+    payload = DraftBoardSnapshot.objects.get(pool=pool).payload
+    return json.loads(bytes(payload).decode('utf-8'))
+
+  def test_creates_missing_snapshots(self):
+    DraftBoardSnapshot.objects.all().delete()
+
+    output = self.call_command('rebuild_draft_snapshots', batch_size=2)
+
+    # The open pool has no board.
+    assert output.strip() == 'Checked 3 draft boards, rebuilt 3 snapshots.'
+    assert DraftBoardSnapshot.objects.count() == 3
+    assert len(self._board(self.pools[0])) == 30
+
+    output = self.call_command('rebuild_draft_snapshots')
+    assert output.strip() == 'Checked 3 draft boards, rebuilt 0 snapshots.'
+
+  def test_rewrites_stale_snapshots(self):
+    self.pools[0].make_draft_pick(self.users[0], self.teams[0])
+    team = Team.objects.get(id=self.teams[0].id)
+    team.team_full_name = 'Renamed'
+    team.save()
+    version = DraftBoardSnapshot.objects.get(pool=self.pools[0]).version
+
+    output = self.call_command('rebuild_draft_snapshots', str(self.pools[0].id))
+
+    assert output.strip() == 'Checked 1 draft boards, rebuilt 1 snapshots.'
+    assert DraftBoardSnapshot.objects.get(pool=self.pools[0]).version == version + 1
+    assert self._board(self.pools[0])[0]['team']['team_full_name'] == 'Renamed'
+    assert DraftBoardSnapshot.objects.get(pool=self.pools[1]).version == 1
+
+  def test_async(self):
+    DraftBoardSnapshot.objects.all().delete()
+
+    output = self.call_command('rebuild_draft_snapshots', run_async=True, batch_size=2)
+
+    assert output.strip() == 'Queued the rebuild.'
+    assert json.loads(Job.objects.get().payload) == {'pool_ids': None, 'batch_size': 2}
+    assert not DraftBoardSnapshot.objects.exists()
+    run_due_jobs()
+    assert DraftBoardSnapshot.objects.count() == 3
@@ -22,5 +22,20 @@ class TooFewMembersException(Exception):
   pass
 
 
+class DraftStartedException(Exception):
+  """Raised when a member leaves a Pool whose draft has started."""
+  pass
+
+
 class BadPickException(Exception):
   pass
+
+
+class InvalidPoolsException(Exception):
+  """
+  Raised when some of a batch of pools can't be created. `errors` has the
+  error of every pool in the batch, or None for the valid ones.
+  """
+  def __init__(self, errors):
+    super(InvalidPoolsException, self).__init__('Invalid pools')
+    self.errors = errors
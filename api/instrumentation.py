@@ -0,0 +1,208 @@
+"""
+Per-request timing of the API.
+
+When `settings.INSTRUMENTATION_ENABLED` is set, `InstrumentationMiddleware`
+records for every request its number of SQL queries, the time spent in SQL,
+in serialization (code wrapped in `instrument('serialization')`), in
+rendering and in total. Each request gets a Server-Timing header with its own
+numbers, and the numbers are added to histograms tagged by view class, which
+`metrics` serves in the Prometheus text format.
+
+When it isn't set the middleware removes itself at startup, `instrument`
+returns a shared no-op and `metrics` 404s, so there is nothing to pay per
+request. The histograms live in process memory, so each server process
+reports its own.
+"""
+import threading
+import time
+
+from collections import OrderedDict
+from itertools import islice
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# (name, help, buckets) of every histogram, each tagged by view.
+METRICS = (
+  ('nba_request_duration_seconds', 'Total time to answer a request.', LATENCY_BUCKETS),
+  ('nba_request_sql_duration_seconds', 'Time spent running SQL queries.', LATENCY_BUCKETS),
+  ('nba_request_serialization_duration_seconds', 'Time spent serializing data.', LATENCY_BUCKETS),
+  ('nba_request_render_duration_seconds', 'Time spent rendering the response body.', LATENCY_BUCKETS),
+  ('nba_request_sql_queries', 'Number of SQL queries run.', QUERY_COUNT_BUCKETS),
+)
+
+_local = threading.local()
+
+
+######################################################################
+# HISTOGRAMS
+######################################################################
+class Histogram(object):
+  """A cumulative histogram of observations, like a Prometheus histogram."""
+  def __init__(self, buckets):
+    self.buckets = buckets
+    self.counts = [0] * len(buckets)
+    self.count = 0
+    self.sum = 0.0
+
+  def observe(self, value):
+    for i, bound in enumerate(self.buckets):
+      if value <= bound:
+        self.counts[i] += 1
+    self.count += 1
+    self.sum += value
+
+
+class Registry(object):
+  """The histograms of every metric, per view. Safe to use from many threads."""
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._histograms = OrderedDict((name, {}) for name, _, _ in METRICS)
+    self._buckets = {name: buckets for name, _, buckets in METRICS}
+
+  def observe(self, view, values):
+    """Adds `values`, a {metric name: value} dict, to the histograms of `view`."""
+    with self._lock:
+      for name, value in values.items():
+        by_view = self._histograms[name]
+        if view not in by_view:
+          by_view[view] = Histogram(self._buckets[name])
+        by_view[view].observe(value)
+
+  def clear(self):
+    with self._lock:
+      for by_view in self._histograms.values():
+        by_view.clear()
+
+  def to_text(self):
+    """Returns every histogram in the Prometheus text exposition format."""
+    lines = []
+    with self._lock:
+      for name, help_text, _ in METRICS:
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s histogram' % name)
+        for view, histogram in sorted(self._histograms[name].items()):
+          for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append('%s_bucket{view="%s",le="%s"} %s' % (name, view, bound, count))
+          lines.append('%s_bucket{view="%s",le="+Inf"} %s' % (name, view, histogram.count))
+          lines.append('%s_sum{view="%s"} %r' % (name, view, histogram.sum))
+          lines.append('%s_count{view="%s"} %s' % (name, view, histogram.count))
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+######################################################################
+# TIMERS
+######################################################################
+class _Timer(object):
+  """Adds the time spent inside the `with` block to `timings[name]`."""
+  def __init__(self, timings, name):
+    self.timings = timings
+    self.name = name
+
+  def __enter__(self):
+    self.start = time.time()
+
+  def __exit__(self, *exc_info):
+    self.timings[self.name] = self.timings.get(self.name, 0.0) + time.time() - self.start
+
+
+class _NoOpTimer(object):
+  def __enter__(self):
+    pass
+
+  def __exit__(self, *exc_info):
+    pass
+
+
+_NO_OP_TIMER = _NoOpTimer()
+
+
+def instrument(name):
+  """
+  Returns a context manager that adds the time spent inside it to the `name`
+  timing of the current request, e.g.
+
+    with instrument('serialization'):
+      data = PoolSerializer.to_data_batch(pools)
+
+  Outside of an instrumented request it does nothing.
+  """
+  timings = getattr(_local, 'timings', None)
+  if timings is None:
+    return _NO_OP_TIMER
+  return _Timer(timings, name)
+
+
+######################################################################
+# MIDDLEWARE
+######################################################################
+class InstrumentationMiddleware(object):
+  """
+  Times every request and tags it with the class of the view that answered
+  it. SQL queries are counted from the connections' query logs, which are
+  kept for the length of the request only.
+  """
+  def __init__(self, get_response):
+    if not getattr(settings, 'INSTRUMENTATION_ENABLED', False):
+      raise MiddlewareNotUsed
+    self.get_response = get_response
+
+  def __call__(self, request):
+    start = time.time()
+    request._instrumentation_view = 'unresolved'
+    _local.timings = timings = {}
+    query_logs = []
+    for connection in connections.all():
+      query_logs.append((connection, connection.force_debug_cursor, len(connection.queries_log)))
+      connection.force_debug_cursor = True
+
+    try:
+      response = self.get_response(request)
+    finally:
+      _local.timings = None
+      queries = []
+      for connection, force_debug_cursor, num_logged in query_logs:
+        connection.force_debug_cursor = force_debug_cursor
+        queries.extend(islice(connection.queries_log, num_logged, None))
+
+    total = time.time() - start
+    sql = sum(float(query['time']) for query in queries)
+    response['Server-Timing'] = ', '.join(
+      ['sql;dur=%.1f;desc="%s queries"' % (1000 * sql, len(queries))] +
+      ['%s;dur=%.1f' % (name, 1000 * value) for name, value in sorted(timings.items())] +
+      ['total;dur=%.1f' % (1000 * total)]
+    )
+    registry.observe(request._instrumentation_view, {
+      'nba_request_duration_seconds': total,
+      'nba_request_sql_duration_seconds': sql,
+      'nba_request_serialization_duration_seconds': timings.get('serialization', 0.0),
+      'nba_request_render_duration_seconds': timings.get('render', 0.0),
+      'nba_request_sql_queries': len(queries),
+    })
+    return response
+
+  def process_view(self, request, view_func, view_args, view_kwargs):
+    view_class = getattr(view_func, 'view_class', None)
+    request._instrumentation_view = (view_class or view_func).__name__
+
+  def process_template_response(self, request, response):
+    # DRF responses are rendered right after this, and the render callbacks
+    # run right after rendering.
+    timer = instrument('render')
+    timer.__enter__()
+    response.add_post_render_callback(lambda response: timer.__exit__(None, None, None))
+    return response
+
+
+def metrics(request):
+  """Serves the histograms in the Prometheus text exposition format."""
+  if not getattr(settings, 'INSTRUMENTATION_ENABLED', False):
+    raise Http404
+  return HttpResponse(registry.to_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
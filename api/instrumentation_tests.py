@@ -0,0 +1,58 @@
+from api.instrumentation import Histogram, _NO_OP_TIMER, instrument, registry
+from api.views_tests import ViewsTestCase
+from django.test import override_settings
+
+
+class HistogramTests(ViewsTestCase):
+  def test_buckets_are_cumulative(self):
+    histogram = Histogram((1, 5, 10))
+    for value in (0.5, 3, 7, 20):
+      histogram.observe(value)
+
+    assert histogram.counts == [1, 2, 3]
+    assert histogram.count == 4
+    assert histogram.sum == 30.5
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True)
+class InstrumentationTests(ViewsTestCase):
+  def setUp(self):
+    super(InstrumentationTests, self).setUp()
+    registry.clear()
+    self.users = self.create_test_users(num_users=2)
+    self.pool = self.create_test_draft(self.users)
+
+  # The compact board is always serialized, unlike the default one which is
+  # served from its snapshot.
+  def test_server_timing(self):
+    response = self.client.get('/api/v1/pools/%s/draft/?format=compact' % self.pool.id)
+
+    timings = dict(
+      (entry.split(';')[0], entry) for entry in response['Server-Timing'].split(', '))
+    assert sorted(timings) == ['render', 'serialization', 'sql', 'total']
+    assert 'desc="2 queries"' in timings['sql']
+
+  def test_metrics_by_view(self):
+    self.client.get('/api/v1/pools/%s/draft/?format=compact' % self.pool.id)
+    self.client.get('/api/v1/pools/%s' % self.pool.id)
+    self.client.get('/api/v1/pools/%s' % self.pool.id)
+
+    response = self.client.get('/metrics')
+
+    assert response.status_code == 200
+    text = response.content.decode('utf-8')
+    assert 'nba_request_duration_seconds_count{view="DraftDetail"} 1\n' in text
+    assert 'nba_request_duration_seconds_count{view="PoolDetail"} 2\n' in text
+    assert 'nba_request_sql_queries_bucket{view="DraftDetail",le="2"} 1\n' in text
+    assert 'nba_request_sql_queries_bucket{view="DraftDetail",le="1"} 0\n' in text
+
+
+class DisabledInstrumentationTests(ViewsTestCase):
+  def test_costs_nothing(self):
+    pool = self.create_test_pool()
+
+    response = self.client.get('/api/v1/pools/%s' % pool.id)
+
+    assert 'Server-Timing' not in response
+    assert instrument('serialization') is _NO_OP_TIMER
+    assert self.client.get('/metrics').status_code == 404
@@ -0,0 +1,220 @@
+"""
+A small job queue kept in the database.
+
+`Job.enqueue(kind, payload)` stores a job, normally in the transaction of the
+write that calls for it, so the job exists if and only if the write commits.
+`manage.py run_jobs` workers claim due jobs with SELECT ... FOR UPDATE SKIP
+LOCKED, so any number of them can run side by side without being handed the
+same job, and run each one with the handler registered for its kind.
+
+A claimed job is leased for `LEASE_SECONDS`, and claimed again if its worker
+dies before finishing it. A job that raises is retried with exponential
+backoff until it has been attempted `MAX_ATTEMPTS` times, then marked failed
+with its last error.
+
+A handler normally runs in the same transaction that marks its job done,
+with the job's row locked so it isn't claimed again however long it takes.
+Handlers registered with `atomic=False`, e.g. long rebuilds, commit their
+own work as they go instead, and renew their lease while they run. Either
+way a handler may run more than once, e.g. after its worker dies, so
+handlers must be idempotent.
+
+SQLite has no row locks: run a single worker against it.
+"""
+import json
+import traceback
+
+from api.exceptions import TooFewMembersException
+from api.logs import get_logger
+from api.models import JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_RUNNING, Job, Pool, Team
+from api.snapshots import rebuild_snapshots
+from collections import OrderedDict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = get_logger('nba-logger')
+
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 5
+# Doubled after every failed attempt.
+RETRY_DELAY_SECONDS = 30
+
+HANDLERS = OrderedDict()
+# The kinds whose handlers commit their own work, see `handler`.
+SELF_COMMITTING_KINDS = set()
+
+
+def handler(kind, atomic=True):
+  """
+  Registers the decorated function as the handler of `kind` jobs. Unless
+  `atomic`, the handler runs outside of any transaction and is passed a
+  `renew_lease()` to call at least every `LEASE_SECONDS`.
+  """
+  def register(func):
+    HANDLERS[kind] = func
+    if atomic:
+      SELF_COMMITTING_KINDS.discard(kind)
+    else:
+      SELF_COMMITTING_KINDS.add(kind)
+    return func
+  return register
+
+
+######################################################################
+# HANDLERS
+######################################################################
+@handler('begin_draft')
+def begin_draft(pool_id):
+  """Starts the draft of a Pool filled while `DRAFT_START_ASYNC` was set."""
+  try:
+    Pool.objects.get(id=pool_id).begin_draft()
+  except Pool.DoesNotExist:
+    logger.info('job.pool_deleted', pool_id=pool_id)
+  except TooFewMembersException:
+    # A member left in the meantime. The join that fills the Pool again
+    # enqueues a job of its own.
+    logger.info('job.draft_not_started', pool_id=pool_id)
+
+
+@handler('rebuild_snapshots', atomic=False)
+def rebuild_draft_snapshots(renew_lease, pool_ids=None, batch_size=500):
+  """
+  Rewrites the draft board snapshots that are out of date, each Pool in its
+  own transaction, so picks are only held up by the Pool being rewritten.
+  """
+  rebuild_snapshots(pool_ids=pool_ids, batch_size=batch_size, on_batch=renew_lease)
+
+
+def _by_team_id(records):
+  """Decodes a map of team ids, as strings, to [wins, losses]."""
+  return {int(team_id): tuple(record) for team_id, record in records.items()}
+
+
+@handler('add_team_results')
+def add_team_results(games, records=None):
+  """
+  Adds the `games` won and lost to the records of the teams, replacing the
+  record of the teams in `records` first, and updates the standings of the
+  pools that drafted them.
+  """
+  Team.add_results(_by_team_id(games), _by_team_id(records or {}))
+
+
+@handler('set_team_records')
+def set_team_records(records):
+  """
+  Replaces the records of the teams. Only for the jobs queued by earlier
+  versions of `load_team_results --async`, which now queues `add_team_results`.
+  """
+  Team.set_records(_by_team_id(records))
+
+
+######################################################################
+# WORKER
+######################################################################
+def claim_jobs(limit, now=None):
+  """
+  Claims up to `limit` due jobs, oldest first, including running jobs whose
+  lease has run out, skipping the ones other workers are claiming.
+
+  Returns:
+    jobs(list): The claimed jobs, leased for `LEASE_SECONDS`.
+  """
+  now = now or timezone.now()
+  lease_until = now + timedelta(seconds=LEASE_SECONDS)
+  with transaction.atomic():
+    jobs = list(
+      Job.objects
+      .select_for_update(skip_locked=True)
+      .filter(status__in=(JOB_PENDING, JOB_RUNNING), run_after__lte=now)
+      .order_by('run_after', 'id')[:limit]
+    )
+    if jobs:
+      Job.objects.filter(id__in=[job.id for job in jobs]).update(
+        status=JOB_RUNNING,
+        attempts=F('attempts') + 1,
+        run_after=lease_until,
+      )
+
+  for job in jobs:
+    job.status = JOB_RUNNING
+    job.attempts += 1
+    job.run_after = lease_until
+  return jobs
+
+
+def renew_lease(job, now=None):
+  """
+  Extends the lease of the running `job` to `LEASE_SECONDS` from `now`.
+
+  Returns:
+    False if the lease had already run out and the job was claimed again.
+  """
+  job.run_after = (now or timezone.now()) + timedelta(seconds=LEASE_SECONDS)
+  return bool(Job.objects.filter(id=job.id, status=JOB_RUNNING, attempts=job.attempts).update(
+    run_after=job.run_after))
+
+
+def run_job(job, now=None):
+  """
+  Runs a claimed job and records how it went. A failed attempt is retried
+  after a delay counted from `now`, which defaults to the current time.
+
+  Returns:
+    True if the job is done, False if it will be retried or has failed.
+  """
+  try:
+    if job.kind not in HANDLERS:
+      raise LookupError('No handler for %s jobs' % job.kind)
+    if job.attempts > MAX_ATTEMPTS:
+      raise RuntimeError('Lease ran out on the last attempt')
+
+    payload = json.loads(job.payload)
+    if job.kind in SELF_COMMITTING_KINDS:
+      HANDLERS[job.kind](renew_lease=lambda: renew_lease(job), **payload)
+      Job.objects.filter(id=job.id).update(status=JOB_DONE, last_error='')
+    else:
+      with transaction.atomic():
+        # Claiming skips locked jobs, so this one isn't claimed again while
+        # its handler runs, even once its lease has run out.
+        list(Job.objects.select_for_update().filter(id=job.id).values_list('id', flat=True))
+        HANDLERS[job.kind](**payload)
+        Job.objects.filter(id=job.id).update(status=JOB_DONE, last_error='')
+  except Exception:
+    job.last_error = traceback.format_exc()
+    if job.attempts >= MAX_ATTEMPTS:
+      job.status = JOB_FAILED
+      logger.error('job.failed', job_id=job.id, kind=job.kind, attempts=job.attempts)
+    else:
+      job.status = JOB_PENDING
+      job.run_after = (now or timezone.now()) + timedelta(seconds=RETRY_DELAY_SECONDS * 2 ** (job.attempts - 1))
+      logger.warning('job.retrying', job_id=job.id, kind=job.kind, attempts=job.attempts)
+    Job.objects.filter(id=job.id).update(
+      status=job.status, run_after=job.run_after, last_error=job.last_error)
+    return False
+
+  job.status = JOB_DONE
+  logger.debug('job.done', job_id=job.id, kind=job.kind, attempts=job.attempts)
+  return True
+
+
+def run_due_jobs(batch_size=10, max_jobs=None):
+  """
+  Claims and runs due jobs, `batch_size` at a time, until there are none
+  left or `max_jobs` have been run.
+
+  Returns:
+    num_jobs(int): How many jobs were run, whether or not they succeeded.
+  """
+  num_jobs = 0
+  while max_jobs is None or num_jobs < max_jobs:
+    limit = batch_size if max_jobs is None else min(batch_size, max_jobs - num_jobs)
+    jobs = claim_jobs(limit)
+    if not jobs:
+      break
+    for job in jobs:
+      run_job(job)
+    num_jobs += len(jobs)
+  return num_jobs
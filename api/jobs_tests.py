@@ -0,0 +1,192 @@
+import json
+
+from api import jobs
+from api.jobs import claim_jobs, handler, run_due_jobs, run_job
+from api.models import (
+  JOB_DONE,
+  JOB_FAILED,
+  JOB_PENDING,
+  JOB_RUNNING,
+  POOL_DRAFTING,
+  POOL_OPEN,
+  DraftBoardSnapshot,
+  Job,
+  Pool,
+  Standing,
+)
+from api.models_tests import ModelsTestCase
+from datetime import timedelta
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+calls = []
+# How deep in transactions each self-committing handler ran.
+savepoint_depths = []
+
+
+@handler('test_record')
+def record(value):
+  calls.append(value)
+
+
+@handler('test_self_committing', atomic=False)
+def self_committing(renew_lease, value):
+  calls.append(value)
+  savepoint_depths.append(len(connection.savepoint_ids))
+  renew_lease()
+
+
+@handler('test_fail')
+def fail():
+  raise ValueError('Nope')
+
+
+class JobsTestCase(ModelsTestCase):
+  def setUp(self):
+    del calls[:]
+    del savepoint_depths[:]
+
+  def _run_all_due(self, at):
+    """Runs every job that is due at `at`."""
+    for job in claim_jobs(100, now=at):
+      run_job(job, now=at)
+
+
+class EnqueueTests(JobsTestCase):
+  def test_idempotency_key(self):
+    first = Job.enqueue('test_record', {'value': 1}, idempotency_key='once')
+    second = Job.enqueue('test_record', {'value': 2}, idempotency_key='once')
+
+    assert second.id == first.id
+    assert Job.objects.count() == 1
+    assert json.loads(Job.objects.get().payload) == {'value': 1}
+
+  def test_without_key(self):
+    Job.enqueue('test_record', {'value': 1})
+    Job.enqueue('test_record', {'value': 1})
+
+    assert Job.objects.count() == 2
+
+
+class WorkerTests(JobsTestCase):
+  def test_runs_due_jobs_in_order(self):
+    for value in (1, 2, 3):
+      Job.enqueue('test_record', {'value': value})
+    Job.enqueue('test_record', {'value': 4}, run_after=timezone.now() + timedelta(hours=1))
+
+    assert run_due_jobs(batch_size=2) == 3
+
+    assert calls == [1, 2, 3]
+    assert list(Job.objects.order_by('id').values_list('status', 'attempts')) == [
+      (JOB_DONE, 1), (JOB_DONE, 1), (JOB_DONE, 1), (JOB_PENDING, 0)]
+
+  def test_claimed_jobs_are_leased(self):
+    Job.enqueue('test_record', {'value': 1})
+    now = timezone.now()
+
+    assert len(claim_jobs(10, now=now)) == 1
+    assert claim_jobs(10, now=now) == []
+    assert Job.objects.get().status == JOB_RUNNING
+
+    # The worker died: the job is claimed again once its lease runs out.
+    later = now + timedelta(seconds=jobs.LEASE_SECONDS + 1)
+    job, = claim_jobs(10, now=later)
+    assert job.attempts == 2
+    assert run_job(job)
+    assert calls == [1]
+
+  def test_retries_with_backoff_then_fails(self):
+    Job.enqueue('test_fail')
+    at = timezone.now()
+
+    for attempt in range(1, jobs.MAX_ATTEMPTS):
+      self._run_all_due(at)
+      job = Job.objects.get()
+      assert (job.status, job.attempts) == (JOB_PENDING, attempt)
+      assert 'ValueError: Nope' in job.last_error
+      assert job.run_after == at + timedelta(seconds=jobs.RETRY_DELAY_SECONDS * 2 ** (attempt - 1))
+      at = job.run_after
+
+    self._run_all_due(at)
+    job = Job.objects.get()
+    assert (job.status, job.attempts) == (JOB_FAILED, jobs.MAX_ATTEMPTS)
+    self._run_all_due(at + timedelta(days=1))
+    assert Job.objects.get().attempts == jobs.MAX_ATTEMPTS
+
+  def test_self_committing_handler(self):
+    claimed_at = timezone.now() - timedelta(hours=1)
+    Job.enqueue('test_self_committing', {'value': 1}, run_after=claimed_at)
+    depth = len(connection.savepoint_ids)
+    job, = claim_jobs(10, now=claimed_at)
+
+    assert run_job(job)
+
+    assert calls == [1]
+    # Not in a transaction of the worker's own.
+    assert savepoint_depths == [depth]
+    job = Job.objects.get()
+    assert job.status == JOB_DONE
+    # The lease was renewed from the current time.
+    assert job.run_after > claimed_at + timedelta(seconds=jobs.LEASE_SECONDS)
+
+  def test_unknown_kind(self):
+    Job.enqueue('test_unknown')
+
+    run_due_jobs()
+
+    assert 'No handler for test_unknown jobs' in Job.objects.get().last_error
+
+  def test_command(self):
+    Job.enqueue('test_record', {'value': 1})
+    stdout = StringIO()
+
+    call_command('run_jobs', once=True, stdout=stdout)
+
+    assert stdout.getvalue().strip() == 'Ran 1 jobs.'
+    assert calls == [1]
+
+
+@override_settings(DRAFT_START_ASYNC=True)
+class AsyncDraftStartTests(JobsTestCase):
+  def setUp(self):
+    super(AsyncDraftStartTests, self).setUp()
+    self.users = self.create_test_users(num_users=3)
+    self.pool = self.create_test_pool(max_size=2)
+
+  def test_worker_starts_draft(self):
+    for user in self.users[:2]:
+      self.pool.add_member(user)
+
+    pool = Pool.objects.get(id=self.pool.id)
+    assert pool.state == POOL_OPEN
+    assert pool.member_count == 2
+    assert not pool.draftpick_set.exists()
+    assert Job.objects.get().kind == 'begin_draft'
+
+    assert run_due_jobs() == 1
+
+    pool = Pool.objects.get(id=self.pool.id)
+    assert pool.state == POOL_DRAFTING
+    assert pool.draftpick_set.count() == 30
+    assert Standing.objects.filter(pool=pool).count() == 2
+    assert DraftBoardSnapshot.objects.filter(pool=pool).exists()
+    assert Job.objects.get().status == JOB_DONE
+
+  def test_member_left_before_start(self):
+    for user in self.users[:2]:
+      self.pool.add_member(user)
+    self.pool.remove_member(self.users[1])
+
+    run_due_jobs()
+
+    assert Pool.objects.get(id=self.pool.id).state == POOL_OPEN
+    assert Job.objects.get().status == JOB_DONE
+
+    # Filling the pool again queues a new job.
+    self.pool.add_member(self.users[2])
+    assert Job.objects.filter(status=JOB_PENDING).count() == 1
+    run_due_jobs()
+    assert Pool.objects.get(id=self.pool.id).state == POOL_DRAFTING
@@ -0,0 +1,123 @@
+"""
+Structured, lazy logging.
+
+`get_logger(name)` wraps a standard logger so that every message is an
+event name plus keyword fields:
+
+  logger.info('pool.member_added', pool_id=pool.id, username=user.username)
+
+Nothing is formatted unless a handler actually emits the record: the level
+is checked first, the message renders itself (as `event key=value ...`)
+only when a formatter asks for it, and `Lazy` fields are only computed then,
+so they may be arbitrarily expensive. `JsonFormatter` emits one JSON object
+per record instead, and `SamplingFilter` keeps a fraction of the routine
+records. Both are wired up in `settings.LOGGING`.
+"""
+import json
+import logging
+import random
+import sys
+
+from datetime import datetime
+
+
+class Lazy(object):
+  """A log field computed by `func(*args)` only if the record is emitted."""
+  def __init__(self, func, *args):
+    self.func = func
+    self.args = args
+
+  def resolve(self):
+    return self.func(*self.args)
+
+
+def _resolve(value):
+  return value.resolve() if isinstance(value, Lazy) else value
+
+
+class Message(object):
+  """The message of a structured record, rendered on demand."""
+  def __init__(self, event, fields):
+    self.event = event
+    self.fields = fields
+
+  def resolved_fields(self):
+    return dict((key, _resolve(value)) for key, value in self.fields.items())
+
+  def __str__(self):
+    fields = self.resolved_fields()
+    return ' '.join([self.event] + ['%s=%s' % (key, fields[key]) for key in sorted(fields)])
+
+
+class StructuredLogger(object):
+  """Logs events with keyword fields through the standard logger `name`."""
+  def __init__(self, name):
+    self.logger = logging.getLogger(name)
+
+  def isEnabledFor(self, level):
+    return self.logger.isEnabledFor(level)
+
+  def debug(self, event, **fields):
+    self._log(logging.DEBUG, event, fields)
+
+  def info(self, event, **fields):
+    self._log(logging.INFO, event, fields)
+
+  def warning(self, event, **fields):
+    self._log(logging.WARNING, event, fields)
+
+  def error(self, event, **fields):
+    self._log(logging.ERROR, event, fields)
+
+  def exception(self, event, **fields):
+    self._log(logging.ERROR, event, fields, exc_info=sys.exc_info())
+
+  def _log(self, level, event, fields, exc_info=None):
+    if not self.logger.isEnabledFor(level):
+      return
+    # Attribute the record to our caller rather than to this module.
+    caller = sys._getframe(2)
+    record = self.logger.makeRecord(
+      self.logger.name, level, caller.f_code.co_filename, caller.f_lineno,
+      Message(event, fields), (), exc_info, caller.f_code.co_name)
+    self.logger.handle(record)
+
+
+def get_logger(name):
+  return StructuredLogger(name)
+
+
+class SamplingFilter(logging.Filter):
+  """
+  Keeps a `rate` fraction of the records at or below `max_level`, and every
+  record above it.
+  """
+  def __init__(self, rate=1.0, max_level='INFO'):
+    super(SamplingFilter, self).__init__()
+    self.rate = float(rate)
+    self.max_level = logging.getLevelName(max_level) if not isinstance(max_level, int) else max_level
+
+  def filter(self, record):
+    if record.levelno > self.max_level or self.rate >= 1.0:
+      return True
+    return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+  """Formats each record as one line of JSON, with its fields at the top level."""
+  def format(self, record):
+    data = {
+      'time': datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+      'level': record.levelname,
+      'logger': record.name,
+      'module': record.module,
+      'lineno': record.lineno,
+    }
+    if isinstance(record.msg, Message):
+      data.update(record.msg.resolved_fields())
+      data['event'] = record.msg.event
+    else:
+      data['event'] = record.getMessage()
+    if record.exc_info:
+      data['exc'] = self.formatException(record.exc_info)
+    return json.dumps(data, default=str, sort_keys=True)
@@ -0,0 +1,55 @@
+import json
+import logging
+
+from api.logs import JsonFormatter, Lazy, SamplingFilter, get_logger
+from django.test import SimpleTestCase
+from django.utils.six import StringIO
+
+
+class LogsTests(SimpleTestCase):
+  def setUp(self):
+    self.stream = StringIO()
+    self.handler = logging.StreamHandler(self.stream)
+    self.handler.setFormatter(logging.Formatter('%(module)s:%(funcName)s %(message)s'))
+    self.logger = get_logger('nba-logger.tests')
+    self.logger.logger.addHandler(self.handler)
+    self.logger.logger.setLevel(logging.INFO)
+    self.logger.logger.propagate = False
+
+  def tearDown(self):
+    self.logger.logger.removeHandler(self.handler)
+
+  def test_event_and_fields(self):
+    self.logger.info('pool.member_added', pool_id=3, username='alice')
+
+    assert self.stream.getvalue() == 'logs_tests:test_event_and_fields pool.member_added pool_id=3 username=alice\n'
+
+  def test_disabled_levels_are_free(self):
+    calls = []
+    self.logger.debug('pool.debug', members=Lazy(calls.append, 'resolved'))
+
+    assert calls == []
+    assert self.stream.getvalue() == ''
+
+  def test_lazy_fields_resolve_when_emitted(self):
+    self.logger.info('pool.members', members=Lazy(sorted, ['bob', 'alice']))
+
+    assert self.stream.getvalue().endswith("members=['alice', 'bob']\n")
+
+  def test_json_formatter(self):
+    self.handler.setFormatter(JsonFormatter())
+    self.logger.info('pool.member_added', pool_id=3, username=Lazy(str, 'alice'))
+
+    data = json.loads(self.stream.getvalue())
+    assert data['event'] == 'pool.member_added'
+    assert data['pool_id'] == 3
+    assert data['username'] == 'alice'
+    assert data['level'] == 'INFO'
+    assert data['module'] == 'logs_tests'
+
+  def test_sampling(self):
+    self.handler.addFilter(SamplingFilter(rate=0))
+    self.logger.info('pool.routine')
+    self.logger.warning('pool.unusual')
+
+    assert self.stream.getvalue() == 'logs_tests:test_sampling pool.unusual\n'
@@ -0,0 +1,22 @@
+from api.autodraft import draft_overdue_picks
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+  help = (
+    'Makes the current pick of every draft that has been waiting on the same '
+    'pick for longer than the deadline, using the picker\'s team preferences '
+    'and then the teams\' projected wins. Meant to be run every few minutes by '
+    'a scheduler.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--deadline-minutes', type=float, default=settings.AUTODRAFT_DEADLINE_MINUTES,
+      help='How long a pick may wait before it is made automatically.')
+
+  def handle(self, *args, **options):
+    num_picks = draft_overdue_picks(timedelta(minutes=options['deadline_minutes']))
+    self.stdout.write('Made %s auto-picks.' % num_picks)
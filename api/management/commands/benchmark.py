@@ -0,0 +1,51 @@
+import json
+
+from api.benchmarks import BENCHMARKS, compare
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+  help = 'Runs the API benchmarks against a throwaway test database.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('names', nargs='*', help='Benchmarks to run. Defaults to all of them.')
+    parser.add_argument('--repeat', type=int, default=20, help='Repetitions per measurement.')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplies the size of the datasets.')
+    parser.add_argument('--output', help='Also write the results as JSON to this path.')
+    parser.add_argument(
+      '--baseline',
+      help='The JSON results of an earlier run. Latencies that moved by more than '
+           '--threshold from it are reported on stderr.')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative change to report.')
+
+  def handle(self, *args, **options):
+    names = options['names'] or list(BENCHMARKS.keys())
+    baseline = None
+    if options['baseline']:
+      with open(options['baseline']) as f:
+        baseline = json.load(f)
+
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+      raise CommandError('Unknown benchmarks: %s. Choose from: %s' % (
+        ', '.join(unknown), ', '.join(BENCHMARKS.keys())))
+
+    # Never benchmark against the real database.
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+      results = {name: BENCHMARKS[name](options['repeat'], options['scale']) for name in names}
+    finally:
+      connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if options['output']:
+      with open(options['output'], 'w') as f:
+        f.write(output)
+    self.stdout.write(output)
+
+    if baseline is not None:
+      # Round trip so the keys are strings, as they are in `baseline`.
+      for metric, before, after in compare(baseline, json.loads(output), options['threshold']):
+        self.stderr.write('%s: %.3f -> %.3f ms (%+.0f%%)' % (
+          metric, before, after, 100.0 * (after - before) / before))
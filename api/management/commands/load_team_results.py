@@ -0,0 +1,125 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import yaml
+
+from api.models import JOB_DONE, Job, Team
+from collections import defaultdict
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+
+
+def iter_rows(path):
+  """
+  Yields one dict per row of a `.csv`, `.json`, `.jsonl` or `.yaml` file.
+  CSV and JSON Lines files are streamed rather than loaded at once.
+  """
+  extension = os.path.splitext(path)[1].lower()
+  with io.open(path, encoding='utf-8') as f:
+    if extension == '.csv':
+      for row in csv.DictReader(f):
+        yield row
+    elif extension == '.jsonl':
+      for line in f:
+        if line.strip():
+          yield json.loads(line)
+    elif extension == '.json':
+      for row in json.load(f):
+        yield row
+    elif extension in ('.yaml', '.yml'):
+      for row in yaml.safe_load(f) or []:
+        yield row
+    else:
+      raise CommandError('Unsupported results file: %s' % path)
+
+
+def file_sha1(path):
+  """Returns the hex SHA-1 of the contents of the file `path`."""
+  sha1 = hashlib.sha1()
+  with io.open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(64 * 1024), b''):
+      sha1.update(chunk)
+  return sha1.hexdigest()
+
+
+class Command(BaseCommand):
+  help = (
+    'Loads NBA results into the Team win/loss columns and refreshes the '
+    'standings of the pools in which the affected teams were drafted. Each '
+    'row is either a game result, {"winner": <team_id>, "loser": <team_id>}, '
+    'which adds a win and a loss, or a team record, {"team_id": <team_id>, '
+    '"wins": <int>, "losses": <int>}, which replaces the record. A file with '
+    'game results is only loaded once.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('path', help='A .csv, .json, .jsonl or .yaml results file.')
+    parser.add_argument(
+      '--async', action='store_true', dest='run_async',
+      help='Queue the update of the teams and standings for a `run_jobs` worker.')
+
+  def handle(self, *args, **options):
+    # 0. Fold every row into the new records and the games to add per team.
+    teams_by_short_code = {team.team_short_code: team for team in Team.objects.all()}
+    records = {}
+    games = defaultdict(lambda: [0, 0])
+    num_rows = 0
+    for row in iter_rows(options['path']):
+      num_rows += 1
+      try:
+        if 'winner' in row:
+          games[self._team(teams_by_short_code, row['winner']).id][0] += 1
+          games[self._team(teams_by_short_code, row['loser']).id][1] += 1
+        else:
+          team = self._team(teams_by_short_code, row['team_id'])
+          records[team.id] = (int(row['wins']), int(row['losses']))
+      except (KeyError, ValueError) as e:
+        raise CommandError('Bad row %s: %r (%s)' % (num_rows, row, e))
+
+    # 1. Games are added to the records, so loading the same file twice would
+    # count them twice. The job, or the record of the synchronous update, is
+    # keyed by the contents of the file. Records alone can be loaded again.
+    idempotency_key = None
+    if games:
+      idempotency_key = 'add_team_results:%s' % file_sha1(options['path'])
+      if Job.objects.filter(idempotency_key=idempotency_key).exists():
+        raise CommandError(self._already_loaded(options['path']))
+
+    # 2. Update the teams and the standings of the pools that drafted them.
+    # Games are added to the records as they are when the update runs.
+    payload = {
+      'games': {str(team_id): wins_losses for team_id, wins_losses in games.items()},
+      'records': {str(team_id): list(record) for team_id, record in records.items()},
+    }
+    if options['run_async']:
+      Job.enqueue('add_team_results', payload, idempotency_key=idempotency_key)
+      self.stdout.write('Read %s rows, queued the update of %s teams.' % (
+        num_rows, len(set(games) | set(records))))
+      return
+
+    try:
+      with transaction.atomic():
+        if idempotency_key is not None:
+          Job.objects.create(
+            kind='add_team_results',
+            payload=json.dumps(payload, sort_keys=True),
+            idempotency_key=idempotency_key,
+            status=JOB_DONE,
+          )
+        deltas = Team.add_results(dict(games), records)
+    except IntegrityError:
+      # Loaded at the same time by another run.
+      raise CommandError(self._already_loaded(options['path']))
+
+    self.stdout.write('Read %s rows, updated %s teams.' % (num_rows, len(deltas)))
+
+  def _already_loaded(self, path):
+    return 'The games in %s were already loaded.' % path
+
+  def _team(self, teams_by_short_code, short_code):
+    try:
+      return teams_by_short_code[short_code]
+    except KeyError:
+      raise CommandError('Unknown team: %s' % short_code)
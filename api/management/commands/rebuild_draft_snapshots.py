@@ -0,0 +1,35 @@
+from api.models import Job
+from api.snapshots import rebuild_snapshots
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+  help = (
+    'Renders the draft boards again and rewrites the pre-rendered snapshots '
+    'that are missing or out of date, e.g. after a team or a user has been '
+    'renamed. Only the boards of the given pools if any are given.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('pool_ids', nargs='*', type=int, help='Only rebuild these pools.')
+    parser.add_argument(
+      '--batch-size', type=int, default=500,
+      help='How many pools to compare at a time.')
+    parser.add_argument(
+      '--async', action='store_true', dest='run_async',
+      help='Queue the rebuild for a `run_jobs` worker instead.')
+
+  def handle(self, *args, **options):
+    if options['run_async']:
+      Job.enqueue('rebuild_snapshots', {
+        'pool_ids': options['pool_ids'] or None,
+        'batch_size': options['batch_size'],
+      })
+      self.stdout.write('Queued the rebuild.')
+      return
+
+    num_checked, num_rebuilt = rebuild_snapshots(
+      pool_ids=options['pool_ids'] or None,
+      batch_size=options['batch_size'],
+    )
+    self.stdout.write('Checked %s draft boards, rebuilt %s snapshots.' % (num_checked, num_rebuilt))
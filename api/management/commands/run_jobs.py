@@ -0,0 +1,37 @@
+import time
+
+from api.jobs import run_due_jobs
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+class Command(BaseCommand):
+  help = (
+    'Runs the background jobs queued in the database, e.g. starting drafts '
+    'when DRAFT_START_ASYNC is set, polling for new ones until stopped. Any '
+    'number of workers can run at once on Postgres.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--once', action='store_true',
+      help='Exit once there are no due jobs left instead of polling.')
+    parser.add_argument(
+      '--batch-size', type=int, default=10,
+      help='How many jobs to claim at a time.')
+    parser.add_argument(
+      '--poll-interval', type=float, default=1.0,
+      help='How long to wait for new jobs when there are none, in seconds.')
+
+  def handle(self, *args, **options):
+    num_jobs = 0
+    while True:
+      close_old_connections()
+      num_run = run_due_jobs(batch_size=options['batch_size'])
+      num_jobs += num_run
+      if options['once']:
+        break
+      if not num_run:
+        time.sleep(options['poll_interval'])
+
+    self.stdout.write('Ran %s jobs.' % num_jobs)
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 04:23
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_auto_20161006_1728'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='draftpick',
+            unique_together=set([('pool', 'team')]),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 04:25
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+import django.db.models.deletion
+
+
+def delete_duplicate_rows(apps, schema_editor):
+    """
+    Boards started twice have two picks per number, and racing joins can leave
+    two memberships for the same user. Keep one row of each (preferring picks
+    that have a team) so that the unique indexes below can be created.
+    """
+    DraftPick = apps.get_model('api', 'DraftPick')
+    Membership = apps.get_model('api', 'Membership')
+
+    seen_picks = set()
+    duplicate_pick_ids = []
+    # Where NULLs sort first (SQLite, MySQL) the empty pick would come first.
+    picks = DraftPick.objects.order_by(
+        'pool_id', 'draft_pick_number', F('team_id').asc(nulls_last=True), 'id')
+    for pick_id, pool_id, pick_number, team_id in picks.values_list(
+            'id', 'pool_id', 'draft_pick_number', 'team_id').iterator():
+        if (pool_id, pick_number) in seen_picks:
+            duplicate_pick_ids.append(pick_id)
+        seen_picks.add((pool_id, pick_number))
+
+    seen_members = set()
+    duplicate_membership_ids = []
+    memberships = Membership.objects.order_by('user_id', 'pool_id', 'id')
+    for membership_id, user_id, pool_id in memberships.values_list('id', 'user_id', 'pool_id').iterator():
+        if (user_id, pool_id) in seen_members:
+            duplicate_membership_ids.append(membership_id)
+        seen_members.add((user_id, pool_id))
+
+    DraftPick.objects.filter(id__in=duplicate_pick_ids).delete()
+    Membership.objects.filter(id__in=duplicate_membership_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0006_draftpick_unique_pool_team'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_rows, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='draftpick',
+            unique_together=set([('pool', 'team'), ('pool', 'draft_pick_number')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='membership',
+            unique_together=set([('user', 'pool')]),
+        ),
+        # The composite indexes above start with these columns, so the single
+        # column foreign key indexes are redundant.
+        migrations.AlterField(
+            model_name='draftpick',
+            name='pool',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.Pool'),
+        ),
+        migrations.AlterField(
+            model_name='membership',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        # Finds the next open pick of a pool without touching picks that have
+        # already been made.
+        migrations.RunSQL(
+            ['CREATE INDEX api_draftpick_open_idx ON api_draftpick (pool_id, draft_pick_number) '
+             'WHERE team_id IS NULL'],
+            ['DROP INDEX api_draftpick_open_idx'],
+        ),
+    ]
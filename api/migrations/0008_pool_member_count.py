@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 04:26
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_draft_pick_and_membership_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pool',
+            name='member_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            ['UPDATE api_pool SET member_count = '
+             '(SELECT COUNT(*) FROM api_membership WHERE api_membership.pool_id = api_pool.id)'],
+            migrations.RunSQL.noop,
+        ),
+    ]
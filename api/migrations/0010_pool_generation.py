@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 04:29
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_team_record_and_standings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pool',
+            name='generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
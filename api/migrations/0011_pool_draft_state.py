@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 04:32
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0010_pool_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pool',
+            name='current_pick_number',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pool',
+            name='current_picker',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pools_to_pick', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='pool',
+            name='state',
+            field=models.CharField(choices=[('open', 'open'), ('drafting', 'drafting'), ('complete', 'complete')], db_index=True, default='open', max_length=16),
+        ),
+        # Derive the state of existing pools from their boards.
+        migrations.RunSQL(
+            [
+                "UPDATE api_pool SET state = 'complete' "
+                "WHERE EXISTS (SELECT 1 FROM api_draftpick WHERE api_draftpick.pool_id = api_pool.id)",
+                "UPDATE api_pool SET state = 'drafting', current_pick_number = "
+                "(SELECT MIN(draft_pick_number) FROM api_draftpick "
+                " WHERE api_draftpick.pool_id = api_pool.id AND api_draftpick.team_id IS NULL) "
+                "WHERE EXISTS (SELECT 1 FROM api_draftpick "
+                "              WHERE api_draftpick.pool_id = api_pool.id AND api_draftpick.team_id IS NULL)",
+                "UPDATE api_pool SET current_picker_id = "
+                "(SELECT user_id FROM api_draftpick WHERE api_draftpick.pool_id = api_pool.id "
+                " AND api_draftpick.draft_pick_number = api_pool.current_pick_number) "
+                "WHERE state = 'drafting'",
+            ],
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 04:34
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0011_pool_draft_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamPreference',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='pool',
+            name='current_pick_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='projected_wins',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        # Start the clock at deploy time for drafts that are already running,
+        # rather than auto-picking all of them on the first scheduler run.
+        migrations.RunSQL(
+            ["UPDATE api_pool SET current_pick_started_at = CURRENT_TIMESTAMP "
+             "WHERE state = 'drafting'"],
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterIndexTogether(
+            name='pool',
+            index_together=set([('state', 'current_pick_started_at')]),
+        ),
+        migrations.AddField(
+            model_name='teampreference',
+            name='team',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.Team'),
+        ),
+        migrations.AddField(
+            model_name='teampreference',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='teampreference',
+            unique_together=set([('user', 'rank'), ('user', 'team')]),
+        ),
+    ]
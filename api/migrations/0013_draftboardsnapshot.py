@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 04:51
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_autodraft'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DraftBoardSnapshot',
+            fields=[
+                ('pool', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='api.Pool')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('payload', models.BinaryField()),
+            ],
+        ),
+    ]
@@ -1,26 +1,92 @@
 from __future__ import unicode_literals
 
-import logging
+import json
+import random
 
 from api.exceptions import (
   BadPickException,
+  DraftStartedException,
   DuplicateMemberException,
   InvalidMemberException,
   TooFewMembersException,
   TooManyMembersException,
 )
+from api.logs import get_logger
+from api.pubsub import draft_channel, draft_pick_event, get_broker
 from datetime import datetime
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, F, Subquery, Value, When
 from django.dispatch import receiver
 from django.db.models.signals import post_save
-from random import shuffle
+from django.utils import timezone
+from operator import itemgetter
 from rest_framework.authtoken.models import Token
 
-logger = logging.getLogger('nba-logger')
+logger = get_logger('nba-logger')
 
 SUPPORTED_POOL_SIZES = (2, 3, 5, 6)
+NUM_DRAFT_PICKS = 30
+
+# The states a Pool goes through: waiting for members, drafting and done.
+POOL_OPEN = 'open'
+POOL_DRAFTING = 'drafting'
+POOL_COMPLETE = 'complete'
+POOL_STATES = (POOL_OPEN, POOL_DRAFTING, POOL_COMPLETE)
+DRAFT_PICK_NUMBERS = tuple(range(1, NUM_DRAFT_PICKS + 1))
+
+# The states of a background Job. See `api.jobs`.
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_STATUSES = (JOB_PENDING, JOB_RUNNING, JOB_DONE, JOB_FAILED)
+
+# Map from size of pool to the draft order. The n-th entry is the (1-indexed)
+# slot of the user who makes pick n once the members have been shuffled.
+DRAFT_ORDER_BY_POOL_SIZE = {
+  2: (1, 2, 2, 1, 2, 1, 2, 1, 1, 2, 2, 1, 1, 2, 2, 1, 1, 2, 2, 1, 1, 2, 2, 1, 1, 2, 2, 1, 2, 1),
+  3: (1, 2, 3, 3, 2, 1, 2, 1, 3, 3, 2, 1, 1, 2, 3, 3, 2, 1, 1, 2, 3, 3, 2, 1, 2, 1, 3, 3, 2, 1),
+  5: (1, 2, 3, 4, 5, 5, 4, 3, 2, 1, 1, 2, 3, 5, 4, 5, 4, 3, 2, 1, 4, 2, 3, 1, 5, 5, 4, 3, 2, 1),
+  6: (1, 2, 3, 4, 5, 6, 6, 5, 4, 3, 2, 1, 5, 2, 4, 3, 6, 1, 5, 6, 4, 2, 3, 1, 6, 5, 4, 3, 2, 1),
+}
+
+
+def _validate_draft_orders(draft_order_by_pool_size):
+  """
+  Verifies that there is a draft order for every supported pool size and that
+  each one gives every user exactly NUM_DRAFT_PICKS / pool_size picks.
+
+  Raises:
+    ValueError: If any draft order is malformed.
+  """
+  if tuple(sorted(draft_order_by_pool_size)) != SUPPORTED_POOL_SIZES:
+    raise ValueError('Expected a draft order for each of %s' % (SUPPORTED_POOL_SIZES,))
+
+  for pool_size, draft_order in draft_order_by_pool_size.items():
+    if len(draft_order) != NUM_DRAFT_PICKS:
+      raise ValueError('Draft order for %s users has %s picks' % (pool_size, len(draft_order)))
+    for slot in range(1, pool_size + 1):
+      if draft_order.count(slot) != NUM_DRAFT_PICKS // pool_size:
+        raise ValueError('Draft order for %s users gives slot %s %s picks' % (
+          pool_size, slot, draft_order.count(slot)))
+
+
+_validate_draft_orders(DRAFT_ORDER_BY_POOL_SIZE)
+
+# Picks every user for a shuffled list of user_ids in one call.
+_DRAFT_ORDER_GETTERS = {
+  pool_size: itemgetter(*[slot - 1 for slot in draft_order])
+  for pool_size, draft_order in DRAFT_ORDER_BY_POOL_SIZE.items()
+}
+
+
+def _snapshots():
+  # `api.snapshots` renders boards with the serializers, which import this
+  # module.
+  from api import snapshots
+  return snapshots
 
 
 # This code is triggered whenever a new user has been created and saved to the database
@@ -38,51 +104,202 @@ class Pool(models.Model):
   name = models.CharField(max_length=128)
   max_size = models.PositiveSmallIntegerField(default=5)
   members = models.ManyToManyField(User, through='Membership')
+  # Kept in step with the `Membership` rows by `add_member`/`remove_member`.
+  member_count = models.PositiveSmallIntegerField(default=0)
+  # Bumped whenever the members or the draft board change. See `api.cache`.
+  generation = models.PositiveIntegerField(default=0)
+
+  # Where the draft is at, kept up to date by `begin_draft` and
+  # `make_draft_pick`. `current_picker` is whose turn it is while drafting.
+  state = models.CharField(
+    max_length=16,
+    choices=[(state, state) for state in POOL_STATES],
+    default=POOL_OPEN,
+    db_index=True,
+  )
+  current_pick_number = models.PositiveSmallIntegerField(blank=True, null=True)
+  current_picker = models.ForeignKey(
+    User,
+    on_delete=models.SET_NULL,
+    blank=True,
+    null=True,
+    related_name='pools_to_pick',
+  )
+  # When `current_pick_number` came up, so overdue picks can be auto-drafted.
+  current_pick_started_at = models.DateTimeField(blank=True, null=True)
+
+  class Meta:
+    index_together = (('state', 'current_pick_started_at'),)
+
+  def bump_generation(self):
+    """Marks every cached response of the Pool as out of date."""
+    Pool.objects.filter(id=self.id).update(generation=F('generation') + 1)
+
+  def set_current_pick(self, draft_pick):
+    """
+    Moves the draft on to `draft_pick`, or marks it complete if `draft_pick`
+    is None, and marks every cached response of the Pool as out of date.
+    Called with the Pool row locked.
+    """
+    if draft_pick is None:
+      self.state = POOL_COMPLETE
+      self.current_pick_number = None
+      self.current_picker_id = None
+      self.current_pick_started_at = None
+    else:
+      self.state = POOL_DRAFTING
+      self.current_pick_number = draft_pick.draft_pick_number
+      self.current_picker_id = draft_pick.user_id
+      self.current_pick_started_at = timezone.now()
+
+    Pool.objects.filter(id=self.id).update(
+      state=self.state,
+      current_pick_number=self.current_pick_number,
+      current_picker_id=self.current_picker_id,
+      current_pick_started_at=self.current_pick_started_at,
+      generation=F('generation') + 1,
+    )
 
   def add_member(self, user):
     """
     Adds a new member to the Pool. If, after adding the new member, we're at
-    `self.max_size`, then kicks off the Pool.
+    `self.max_size`, then kicks off the Pool. The Pool row is locked while the
+    member is added, so concurrent joins are serialized and exactly one of
+    them starts the draft.
     """
-    # 0. Verify that we can add another unique member.
-    original_pool_size = len(self.members.all())
-    if original_pool_size >= self.max_size:
-      raise TooManyMembersException("Cannot add any more members to the Pool.")
-
-    if user in self.members.all():
-      raise DuplicateMemberException("Cannot add the same member to the Pool twice.")
-
-    # 1. Add the new member to the Pool.
-    curr_time = datetime.now()
-    Membership.objects.create(pool=self, user=user, date_joined=curr_time)
-
-    # 2. If we now have enough members in the pool to begin, compute the
-    # draft order and draft status.
-    new_members = self.members.all()
-    assert len(new_members) == original_pool_size + 1
-    if len(new_members) == self.max_size:
-      self.begin_draft()
+    with transaction.atomic():
+      # 0. Verify that we can add another unique member.
+      pool = Pool.objects.select_for_update().get(id=self.id)
+      if pool.member_count >= pool.max_size:
+        raise TooManyMembersException("Cannot add any more members to the Pool.")
+
+      if Membership.objects.filter(pool=self, user=user).exists():
+        raise DuplicateMemberException("Cannot add the same member to the Pool twice.")
+
+      # 1. Add the new member to the Pool.
+      curr_time = datetime.now()
+      Membership.objects.create(pool=self, user=user, date_joined=curr_time)
+      Pool.objects.filter(id=self.id).update(
+        member_count=F('member_count') + 1,
+        generation=F('generation') + 1,
+      )
+      self.member_count = pool.member_count + 1
+
+      # 2. If we now have enough members in the pool to begin, compute the
+      # draft order and draft status, or have a worker do it. The key is
+      # unique to this join, as members may still leave before it runs.
+      if self.member_count == pool.max_size:
+        if settings.DRAFT_START_ASYNC:
+          Job.enqueue('begin_draft', {'pool_id': self.id},
+                      idempotency_key='begin_draft:%s:%s' % (self.id, pool.generation + 1))
+        else:
+          self.begin_draft()
 
     return self
 
   def remove_member(self, user):
     """
-    Removes the user from the membership list of the Pool
+    Removes the user from the membership list of the Pool. The Pool row is
+    locked first, like in `add_member`, so a leave can't interleave with the
+    join that starts the draft.
+
+    Raises:
+      DraftStartedException: If the draft of the Pool has started.
+      InvalidMemberException: If the user isn't a member of the Pool.
     """
-    if user not in self.members.all():
-      raise InvalidMemberException("Cannot remove a member that isn't part of the pool")
+    with transaction.atomic():
+      pool = Pool.objects.select_for_update().get(id=self.id)
+      if pool.state != POOL_OPEN:
+        raise DraftStartedException("Cannot leave a Pool whose draft has started.")
+
+      deleted, _ = Membership.objects.filter(user=user, pool=self).delete()
+      if not deleted:
+        raise InvalidMemberException("Cannot remove a member that isn't part of the pool")
 
-    m = Membership.objects.get(user=user, pool=self)
-    m.delete()
+      Pool.objects.filter(id=self.id).update(
+        member_count=F('member_count') - 1,
+        generation=F('generation') + 1,
+      )
+
+    self.refresh_from_db(fields=['member_count', 'generation'])
+
+  @staticmethod
+  def create_batch(pools_members, rng=None):
+    """
+    Creates many Pools with their members at once, and begins the draft of
+    every one that is full. Everything is inserted with one bulk INSERT per
+    table in a single transaction, except the Pools themselves on databases
+    that can't return the ids of bulk inserted rows (e.g. SQLite), where each
+    Pool takes an INSERT of its own.
+
+    Args:
+      pools_members(list): (pool, members) pairs of an unsaved `Pool` and the
+        distinct `User`s to add to it, at most `pool.max_size` of them.
+      rng(random.Random): Optional source of randomness for the draft orders.
+
+    Returns:
+      pools(list): The saved Pools, in order.
+    """
+    started_at = timezone.now()
+    boards = []
+    for pool, members in pools_members:
+      assert len(members) <= pool.max_size
+      pool.member_count = len(members)
+      board = None
+      if len(members) == pool.max_size:
+        users_by_id = {member.id: member for member in members}
+        user_ids_by_draft_order = Pool.compute_draft_order(users_by_id.keys(), rng=rng)
+        board = [
+          DraftPick(user=users_by_id[user_id], draft_pick_number=pick)
+          for (pick, user_id) in sorted(user_ids_by_draft_order.items())
+        ]
+        pool.state = POOL_DRAFTING
+        pool.current_pick_number = board[0].draft_pick_number
+        pool.current_picker_id = board[0].user_id
+        pool.current_pick_started_at = started_at
+      boards.append(board)
+
+    pools = [pool for pool, _ in pools_members]
+    with transaction.atomic():
+      if connection.features.can_return_ids_from_bulk_insert:
+        Pool.objects.bulk_create(pools)
+      else:
+        for pool in pools:
+          pool.save()
+
+      date_joined = datetime.now()
+      memberships, draft_picks, standings, snapshots = [], [], [], []
+      # Thousands of rows, so ids are set directly rather than through the
+      # related object descriptors.
+      for (pool, members), board in zip(pools_members, boards):
+        memberships.extend(
+          Membership(pool_id=pool.id, user_id=member.id, date_joined=date_joined) for member in members)
+        if board is None:
+          continue
+        for draft_pick in board:
+          draft_pick.pool_id = pool.id
+        draft_picks.extend(board)
+        standings.extend(Standing(pool_id=pool.id, user_id=member.id) for member in members)
+        snapshots.append(_snapshots().build_snapshot(pool.id, board))
+
+      Membership.objects.bulk_create(memberships)
+      DraftPick.objects.bulk_create(draft_picks)
+      Standing.objects.bulk_create(standings)
+      DraftBoardSnapshot.objects.bulk_create(snapshots)
+
+    logger.info('pool.batch_created', num_pools=len(pools), num_drafting=len(snapshots))
+    return pools
 
   @staticmethod
-  def compute_draft_order(user_ids):
+  def compute_draft_order(user_ids, rng=None):
     """
     Given a list of `user_ids`, randomly shuffles the `user_ids` and returns
     them in a draft order.
 
     Args:
       user_ids(iterable): A list of `user_ids` of the members of the pool.
+      rng(random.Random): Optional source of randomness for the shuffle, so
+        that draft orders can be reproduced. Defaults to the `random` module.
 
     Returns:
       user_ids_by_draft_order(dict): Map from draft_order -> user_id.
@@ -91,75 +308,120 @@ class Pool(models.Model):
     Raises:
       AssertionError: If `user_ids` is the incorrect length.
     """
-    # 0. De-dupe the user_ids and sanity check.
-    pool_size = len(set(user_ids))
+    # 0. De-dupe the user_ids and sanity check. Sorting first makes the
+    # shuffle depend only on `rng`, not on set iteration order.
+    random_user_ids = sorted(set(user_ids))
+    pool_size = len(random_user_ids)
     assert pool_size in SUPPORTED_POOL_SIZES
 
     # 1. Shuffle the user_ids randomly.
-    random_user_ids = list(set(user_ids))
-    shuffle(random_user_ids)
+    (rng or random).shuffle(random_user_ids)
+    logger.debug('pool.draft_order_shuffled', user_ids=random_user_ids)
 
-    logger.info('random user_ids: %s' % random_user_ids)
+    # 2. Look up the user for every pick at once.
+    return dict(zip(DRAFT_PICK_NUMBERS, _DRAFT_ORDER_GETTERS[pool_size](random_user_ids)))
 
-    # 2. Map from size of pool to the order.
-    draft_order_by_pool_size = {
-      2: [1, 2, 2, 1, 2, 1, 2, 1, 1, 2, 2, 1, 1, 2, 2, 1, 1, 2, 2, 1, 1, 2, 2, 1, 1, 2, 2, 1, 2, 1],
-      3: [1, 2, 3, 3, 2, 1, 2, 1, 3, 3, 2, 1, 1, 2, 3, 3, 2, 1, 1, 2, 3, 3, 2, 1, 2, 1, 3, 3, 2, 1],
-      5: [1, 2, 3, 4, 5, 5, 4, 3, 2, 1, 1, 2, 3, 5, 4, 5, 4, 3, 2, 1, 4, 2, 3, 1, 5, 5, 4, 3, 2, 1],
-      6: [1, 2, 3, 4, 5, 6, 6, 5, 4, 3, 2, 1, 5, 2, 4, 3, 6, 1, 5, 6, 4, 2, 3, 1, 6, 5, 4, 3, 2, 1],
-    }
-
-    # 3. Grab the relevant draft order and populate the dict.
-    draft_order = draft_order_by_pool_size[pool_size]
-    logger.info('draft order: %s' % draft_order)
-    user_ids_by_draft_order = {}
-    for pick_index, user_index in enumerate(draft_order):
-      user_ids_by_draft_order[pick_index + 1] = random_user_ids[user_index - 1]
-
-    logger.info('user_ids_by_draft_order: %s' % user_ids_by_draft_order)
-
-    return user_ids_by_draft_order
-
-  def begin_draft(self):
+  def begin_draft(self, rng=None):
     """
     Verifies that we have enough members to start the pool and then creates
-    empty DraftPicks for each member of the Pool.
+    empty DraftPicks for each member of the Pool. The whole board is inserted
+    at once while the Pool row is locked, and a Pool whose board already
+    exists is left untouched, so a double-triggered start is harmless.
+
+    Args:
+      rng(random.Random): Optional source of randomness for the draft order.
 
     Returns:
       Nothing but creates a series of DraftPicks for each member.
 
     Raises:
-      AssertionError: If we cannot begin the draft yet.
+      TooFewMembersException: If we cannot begin the draft yet.
     """
-    members = self.members.all()
-    if len(members) != self.max_size:
-      raise TooFewMembersException("Not enough members to start the pool!")
-
-    users_by_id = {member.id: member for member in members}
-    user_ids_by_draft_order = Pool.compute_draft_order(users_by_id.keys())
-
-    logger.info('user_ids_by_draft_order: %s' % user_ids_by_draft_order)
-    for (pick, user_id) in user_ids_by_draft_order.iteritems():
-      user = users_by_id[user_id]
-      DraftPick.objects.create(pool=self, user=user, draft_pick_number=pick)
-
-  def make_draft_pick(self, user, team):
-    # 0. Ensure that only the next user up can make a pick.
-    pick = DraftPick.objects.filter(pool=self, team=None).order_by('draft_pick_number')[0]
-    if pick.user != user:
-      raise BadPickException("Not user: %s's turn to pick!" % user.username)
+    with transaction.atomic():
+      Pool.objects.select_for_update().get(id=self.id)
+      if DraftPick.objects.filter(pool=self).exists():
+        logger.debug('pool.draft_already_started', pool_id=self.id)
+        return
+
+      members = self.members.all()
+      if len(members) != self.max_size:
+        raise TooFewMembersException("Not enough members to start the pool!")
+
+      users_by_id = {member.id: member for member in members}
+      user_ids_by_draft_order = Pool.compute_draft_order(users_by_id.keys(), rng=rng)
+
+      draft_picks = [
+        DraftPick(pool=self, user=users_by_id[user_id], draft_pick_number=pick)
+        for (pick, user_id) in sorted(user_ids_by_draft_order.items())
+      ]
+      DraftPick.objects.bulk_create(draft_picks)
+      Standing.objects.bulk_create([Standing(pool=self, user=member) for member in members])
+      self.set_current_pick(draft_picks[0])
+      _snapshots().save_snapshot(self.id, draft_picks)
+
+  def make_draft_pick(self, user, team, pick_number=None):
+    """
+    Assigns `team` to the next open pick on the board, as long as it's `user`'s
+    turn. The Pool row is locked for the whole pick so concurrent picks in the
+    same Pool are serialized, and the unique (pool, team) constraint on
+    `DraftPick` rejects a team that has already been chosen.
 
-    # 1. Ensure that the user doesn't try to pick a team that has already been
-    # chosen.
-    dps = DraftPick.objects.filter(pool=self).exclude(team__isnull=True).order_by('draft_pick_number')
-    teams_picked = [dp.team for dp in dps]
-    if team in teams_picked:
-      raise BadPickException("Can't pick a team %s that has already been chosen" % team.team_full_name)
+    Args:
+      pick_number(int): Optionally, the pick the caller means to make, so a
+        stale caller can't make the pick after it.
 
-    pick.team = team
-    pick.save()
+    Returns:
+      draft_picks(list): The updated board ordered by `draft_pick_number`, with
+        each pick's `user` and `team` already loaded.
 
-    return self
+    Raises:
+      BadPickException: If the draft isn't in progress, it's not `user`'s turn,
+        `pick_number` isn't the current pick or `team` has already been chosen.
+    """
+    with transaction.atomic():
+      # 0. Lock the Pool so that only one pick can be made at a time.
+      pool = Pool.objects.select_for_update().get(id=self.id)
+
+      # 1. Ensure that only the next user up can make a pick.
+      if pool.state == POOL_COMPLETE:
+        raise BadPickException("The draft is already complete!")
+      if pool.state != POOL_DRAFTING:
+        raise BadPickException("The draft hasn't started yet!")
+      if pool.current_picker_id != user.id:
+        raise BadPickException("Not user: %s's turn to pick!" % user.username)
+      if pick_number is not None and pool.current_pick_number != pick_number:
+        raise BadPickException("Pick %s has already been made!" % pick_number)
+
+      draft_picks = list(
+        DraftPick.objects.filter(pool=self).select_related('user').order_by('draft_pick_number')
+      )
+      pick = next(dp for dp in draft_picks if dp.draft_pick_number == pool.current_pick_number)
+
+      # 2. Ensure that the user doesn't try to pick a team that has already
+      # been chosen.
+      pick.team = team
+      try:
+        with transaction.atomic():
+          pick.save(update_fields=['team'])
+      except IntegrityError:
+        raise BadPickException("Can't pick a team %s that has already been chosen" % team.team_full_name)
+
+      # 3. The team's record now counts towards the user's standing. It's read
+      # from the row, since `team` may come from the team catalog, whose
+      # records aren't kept up to date.
+      record = Team.objects.filter(id=team.id)
+      Standing.objects.filter(pool=self, user=user).update(
+        wins=F('wins') + Subquery(record.values('wins')[:1]),
+        losses=F('losses') + Subquery(record.values('losses')[:1]),
+      )
+      self.set_current_pick(next((dp for dp in draft_picks if dp.team_id is None), None))
+      _snapshots().save_snapshot(self.id, draft_picks)
+
+      # 4. Tell anyone following the draft, once the pick is committed.
+      event = draft_pick_event(pick)
+      transaction.on_commit(lambda: get_broker().publish(draft_channel(self.id), event))
+
+    return draft_picks
 
   def __unicode__(self):
     return '<Pool (name=%s, max_size=%s)>' % (self.name, self.max_size)
@@ -171,9 +433,13 @@ class Membership(models.Model):
   A `User` joins a `Pool` through their membership.
   """
   pool = models.ForeignKey(Pool, on_delete=models.CASCADE)
-  user = models.ForeignKey(User, on_delete=models.CASCADE)
+  # Lookups by user are served by the (user, pool) unique index.
+  user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
   date_joined = models.DateField()
 
+  class Meta:
+    unique_together = (('user', 'pool'),)
+
 
 class Team(models.Model):
   """
@@ -185,12 +451,218 @@ class Team(models.Model):
   team_short_code = models.CharField(max_length=256)
   team_full_name = models.CharField(max_length=256)
 
+  wins = models.PositiveSmallIntegerField(default=0)
+  losses = models.PositiveSmallIntegerField(default=0)
+  # Ranks teams for users who haven't stored their own `TeamPreference`s.
+  projected_wins = models.PositiveSmallIntegerField(default=0)
+
+  def set_record(self, wins, losses):
+    """
+    Updates the team's win/loss record and applies the difference to the
+    standings of every user who drafted the team.
+    """
+    Team.set_records({self.id: (wins, losses)})
+    self.wins = wins
+    self.losses = losses
+
+  @staticmethod
+  def set_records(records):
+    """
+    Updates the win/loss record of many teams with a single UPDATE, then
+    applies the differences to the standings of every user who drafted one of
+    the teams. Teams whose record didn't change are skipped entirely.
+
+    Args:
+      records(dict): Map from team_id -> (wins, losses).
+
+    Returns:
+      deltas(dict): Map from team_id -> (wins_delta, losses_delta) for every
+        team whose record changed.
+    """
+    with transaction.atomic():
+      teams = Team.objects.select_for_update().filter(id__in=records.keys())
+      deltas = {}
+      for team in teams:
+        wins, losses = records[team.id]
+        if (wins, losses) != (team.wins, team.losses):
+          deltas[team.id] = (wins - team.wins, losses - team.losses)
+
+      if deltas:
+        Team.objects.filter(id__in=deltas.keys()).update(
+          wins=Case(*[When(id=team_id, then=Value(records[team_id][0])) for team_id in deltas]),
+          losses=Case(*[When(id=team_id, then=Value(records[team_id][1])) for team_id in deltas]),
+        )
+        Standing.apply_team_deltas(deltas)
+
+    return deltas
+
+  @staticmethod
+  def add_results(games, records=None):
+    """
+    Like `set_records`, but also adds games to the record of each team, as
+    it is once the Team rows are locked. Results loaded at the same time, or
+    applied by a worker after later ones, all count.
+
+    Args:
+      games(dict): Map from team_id -> (wins, losses) to add.
+      records(dict): Map from team_id -> (wins, losses) replacing the record
+        the games are added to.
+
+    Returns:
+      deltas(dict): See `set_records`.
+    """
+    records = dict(records or {})
+    with transaction.atomic():
+      for team in Team.objects.select_for_update().filter(id__in=games.keys()):
+        wins, losses = records.get(team.id, (team.wins, team.losses))
+        records[team.id] = (wins + games[team.id][0], losses + games[team.id][1])
+      return Team.set_records(records)
+
   def __unicode__(self):
     return '<Team %s:%s>' % (self.league_short_code, self.team_full_name)
 
 
+class TeamPreference(models.Model):
+  """
+  A user's ranking of the teams, best first, used to draft for them when they
+  run out of time to pick.
+  """
+  # Lookups by user are served by the (user, rank) unique index.
+  user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+  team = models.ForeignKey(Team, on_delete=models.CASCADE)
+  rank = models.PositiveSmallIntegerField()
+
+  class Meta:
+    unique_together = (('user', 'rank'), ('user', 'team'))
+
+
 class DraftPick(models.Model):
-  pool = models.ForeignKey(Pool, on_delete=models.CASCADE)
+  # Lookups by pool are served by the (pool, draft_pick_number) unique index,
+  # and the next open pick by the partial `api_draftpick_open_idx` index
+  # created in migration 0007.
+  pool = models.ForeignKey(Pool, on_delete=models.CASCADE, db_index=False)
   user = models.ForeignKey(User, on_delete=models.CASCADE)
   team = models.ForeignKey(Team, on_delete=models.CASCADE, blank=True, null=True)
   draft_pick_number = models.IntegerField(default=1)
+
+  class Meta:
+    unique_together = (('pool', 'team'), ('pool', 'draft_pick_number'))
+
+
+class DraftBoardSnapshot(models.Model):
+  """
+  The board of `pool` as `DraftDetail` serves it, rendered to JSON whenever
+  `begin_draft` or `make_draft_pick` changes it and in the same transaction,
+  so reading the board takes a single lookup by primary key. `version` goes
+  up with every write. See `api.snapshots`.
+  """
+  pool = models.OneToOneField(Pool, on_delete=models.CASCADE, primary_key=True)
+  version = models.PositiveIntegerField(default=0)
+  payload = models.BinaryField()
+
+  def __unicode__(self):
+    return '<DraftBoardSnapshot (pool=%s, version=%s)>' % (self.pool_id, self.version)
+
+
+class Standing(models.Model):
+  """
+  Materialized win/loss totals of the teams `user` has drafted in `pool`. The
+  rows are created when the draft begins and updated incrementally as picks
+  are made and team records change, so a leaderboard is one indexed read.
+  """
+  # Lookups by pool are served by the (pool, user) unique index.
+  pool = models.ForeignKey(Pool, on_delete=models.CASCADE, db_index=False)
+  user = models.ForeignKey(User, on_delete=models.CASCADE)
+  wins = models.PositiveIntegerField(default=0)
+  losses = models.PositiveIntegerField(default=0)
+
+  class Meta:
+    unique_together = (('pool', 'user'),)
+
+  @staticmethod
+  def apply_team_deltas(deltas):
+    """
+    Adds the change in each team's record to the standing of every user who
+    drafted that team. Only the pools in which the team has been picked are
+    touched, with one UPDATE per team.
+
+    Args:
+      deltas(dict): Map from team_id -> (wins_delta, losses_delta).
+    """
+    for team_id, (wins_delta, losses_delta) in deltas.items():
+      if not wins_delta and not losses_delta:
+        continue
+
+      Standing.objects.filter(
+        pool__draftpick__team_id=team_id,
+        pool__draftpick__user=F('user'),
+      ).update(
+        wins=F('wins') + wins_delta,
+        losses=F('losses') + losses_delta,
+      )
+
+  def __unicode__(self):
+    return '<Standing (pool=%s, user=%s, wins=%s, losses=%s)>' % (
+      self.pool_id, self.user_id, self.wins, self.losses)
+
+
+class Job(models.Model):
+  """
+  A unit of background work, run by the `run_jobs` workers with the handler
+  registered for its `kind`. See `api.jobs`.
+  """
+  kind = models.CharField(max_length=64)
+  # The JSON keyword arguments of the handler.
+  payload = models.TextField(default='{}')
+  # Enqueueing a job with the key of an existing one does nothing.
+  idempotency_key = models.CharField(max_length=255, unique=True, blank=True, null=True)
+  status = models.CharField(
+    max_length=16,
+    choices=[(job_status, job_status) for job_status in JOB_STATUSES],
+    default=JOB_PENDING,
+  )
+  attempts = models.PositiveSmallIntegerField(default=0)
+  # When the job is due or, while it's running, when its lease runs out.
+  run_after = models.DateTimeField(default=timezone.now)
+  last_error = models.TextField(blank=True, default='')
+  created_at = models.DateTimeField(auto_now_add=True)
+
+  class Meta:
+    index_together = (('status', 'run_after'),)
+
+  @staticmethod
+  def enqueue(kind, payload=None, idempotency_key=None, run_after=None):
+    """
+    Adds a job, unless one with the same `idempotency_key` already exists.
+    Called in the transaction of the write that calls for the job, the job
+    only exists if that write commits.
+
+    Args:
+      kind(str): Which handler runs the job.
+      payload(dict): The JSON-serializable keyword arguments of the handler.
+      idempotency_key(str): Optionally, a key unique to this piece of work.
+      run_after(datetime): Optionally, when the job becomes due. Defaults to
+        now.
+
+    Returns:
+      job(Job): The new job, or the existing one with `idempotency_key`.
+    """
+    job = Job(
+      kind=kind,
+      payload=json.dumps(payload or {}, sort_keys=True),
+      idempotency_key=idempotency_key,
+      run_after=run_after or timezone.now(),
+    )
+    if idempotency_key is None:
+      job.save()
+      return job
+
+    try:
+      with transaction.atomic():
+        job.save()
+    except IntegrityError:
+      return Job.objects.get(idempotency_key=idempotency_key)
+    return job
+
+  def __unicode__(self):
+    return '<Job (id=%s, kind=%s, status=%s)>' % (self.id, self.kind, self.status)
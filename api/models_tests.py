@@ -1,21 +1,40 @@
+import random
+import threading
 import unittest
 
+from api.benchmarks import create_index_pools, explain, index_lookups, index_name
 from api.exceptions import (
+  BadPickException,
+  DraftStartedException,
   DuplicateMemberException,
+  InvalidMemberException,
   TooFewMembersException,
   TooManyMembersException,
 )
-from api.models import (DraftPick, Pool)
+from api.models import (
+  DRAFT_ORDER_BY_POOL_SIZE,
+  DraftPick,
+  Membership,
+  POOL_COMPLETE,
+  POOL_DRAFTING,
+  POOL_OPEN,
+  Pool,
+  Standing,
+  Team,
+  _validate_draft_orders,
+)
+from api.snapshots import save_snapshot
+from datetime import datetime
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
 
 
 # TODO(shravan): Figure out how to run these tests in the django
 # unit test framework.
-class ModelsTestCase(TestCase):
+class ModelsTestMixin(object):
   """
-  Base class that defines a series of helpers that are useful for testing
-  models.
+  Defines a series of helpers that are useful for testing models.
   """
   # TODO(shravan): Figure out how to write this test case in a django
   # sandbox so users are not persisted to the database.
@@ -53,6 +72,41 @@ class ModelsTestCase(TestCase):
 
     return pool
 
+  def create_test_teams(self, num_teams=2):
+    """Creates `num_teams` Team objects."""
+    return [
+      Team.objects.create(
+        league_short_code='NBA',
+        league_full_name='National Basketball Association',
+        team_short_code='team-%s' % i,
+        team_full_name='Team %s' % i,
+      )
+      for i in range(num_teams)
+    ]
+
+  def create_test_draft(self, users, name=None, num_picks=30):
+    """Creates a full Pool of `users` with an empty board in which the users
+    pick round robin, in the order given, and its snapshot."""
+    pool = self.create_test_pool(name=name, max_size=len(users))
+    for user in users:
+      Membership.objects.create(pool=pool, user=user, date_joined=datetime.now())
+      Standing.objects.create(pool=pool, user=user)
+    for pick_number in range(1, num_picks + 1):
+      user = users[(pick_number - 1) % len(users)]
+      DraftPick.objects.create(pool=pool, user=user, draft_pick_number=pick_number)
+    board = list(DraftPick.objects.filter(pool=pool).select_related('user').order_by('draft_pick_number'))
+    pool.set_current_pick(board[0])
+    save_snapshot(pool.id, board)
+
+    return pool
+
+
+class ModelsTestCase(ModelsTestMixin, TestCase):
+  """
+  Base class for tests that use the `ModelsTestMixin` helpers.
+  """
+  pass
+
 
 class PoolTests(ModelsTestCase):
   def _sanity_check_draft_order_dict(self, user_ids, user_ids_by_draft_order):
@@ -112,6 +166,46 @@ class PoolTests(ModelsTestCase):
     # 1. Verify that begin draft was called
     assert pool.begin_draft.is_called()
 
+  def test_add_member_member_count(self):
+    """Verifies that `member_count` follows joins and leaves."""
+    pool = self.create_test_pool(max_size=3)
+    users = self.create_test_users(num_users=2)
+
+    for user in users:
+      pool.add_member(user)
+    assert pool.member_count == 2
+    assert Pool.objects.get(id=pool.id).member_count == 2
+
+    pool.remove_member(users[0])
+    assert pool.member_count == 1
+    assert Pool.objects.get(id=pool.id).member_count == 1
+
+    with self.assertRaises(InvalidMemberException):
+      pool.remove_member(users[0])
+    assert Pool.objects.get(id=pool.id).member_count == 1
+
+  def test_remove_member_after_draft_started(self):
+    users = self.create_test_users(num_users=2)
+    pool = self.create_test_draft(users)
+    generation = Pool.objects.get(id=pool.id).generation
+
+    with self.assertRaises(DraftStartedException):
+      pool.remove_member(users[0])
+    assert Membership.objects.filter(pool=pool, user=users[0]).exists()
+    assert Pool.objects.get(id=pool.id).generation == generation
+
+  def test_add_member_constant_queries(self):
+    """Joining must not load the member list."""
+    pool = self.create_test_pool(max_size=6)
+    users = self.create_test_users(num_users=5)
+
+    for user in users[:4]:
+      pool.add_member(user)
+
+    # Lock, duplicate check, insert and count update (plus savepoint).
+    with self.assertNumQueries(6):
+      pool.add_member(users[4])
+
   ######################################################################
   # COMPUTE DRAFT ORDER
   ######################################################################
@@ -195,6 +289,35 @@ class PoolTests(ModelsTestCase):
     self._verify_expected_draft_order(user_ids_by_draft_order, 5,
                                       [5, 8, 13, 19, 26])
 
+  def test_compute_draft_order_reproducible(self):
+    """Tests that the same seeded rng always yields the same draft order."""
+    user_ids = [10001, 20002, 30003, 40004, 50005, 60006]
+    first = Pool.compute_draft_order(user_ids, rng=random.Random(24))
+    second = Pool.compute_draft_order(list(reversed(user_ids)), rng=random.Random(24))
+
+    assert first == second
+    assert sorted(first.keys()) == list(range(1, 31))
+    assert sorted(set(first.values())) == user_ids
+
+  def test_validate_draft_orders(self):
+    """Tests that malformed draft order tables are rejected."""
+    _validate_draft_orders(DRAFT_ORDER_BY_POOL_SIZE)
+
+    missing_size = dict(DRAFT_ORDER_BY_POOL_SIZE)
+    del missing_size[6]
+    with self.assertRaises(ValueError):
+      _validate_draft_orders(missing_size)
+
+    too_short = dict(DRAFT_ORDER_BY_POOL_SIZE)
+    too_short[2] = too_short[2][:-1]
+    with self.assertRaises(ValueError):
+      _validate_draft_orders(too_short)
+
+    unbalanced = dict(DRAFT_ORDER_BY_POOL_SIZE)
+    unbalanced[2] = (1,) * 30
+    with self.assertRaises(ValueError):
+      _validate_draft_orders(unbalanced)
+
   ######################################################################
   # BEGIN DRAFT
   ######################################################################
@@ -245,6 +368,234 @@ class PoolTests(ModelsTestCase):
 
       assert pick.draft_pick_number in range(1, 31)
 
+  def test_begin_draft_idempotent(self):
+    """Verifies that starting the same draft twice creates only one board."""
+    users = self.create_test_users(num_users=2)
+    pool = self.create_test_pool(max_size=2)
+
+    for user in users:
+      pool.add_member(user)
+    pool.begin_draft()
+
+    draft_picks = DraftPick.objects.filter(pool=pool)
+    assert draft_picks.count() == 30
+    assert sorted(dp.draft_pick_number for dp in draft_picks) == list(range(1, 31))
+
+  ######################################################################
+  # MAKE DRAFT PICK
+  ######################################################################
+  def test_make_draft_pick(self):
+    """Verifies that a pick is saved and the updated board is returned."""
+    users = self.create_test_users(num_users=2)
+    teams = self.create_test_teams(num_teams=2)
+    pool = self.create_test_draft(users)
+
+    draft_picks = pool.make_draft_pick(users[0], teams[0])
+
+    assert [dp.draft_pick_number for dp in draft_picks] == list(range(1, 31))
+    assert draft_picks[0].team == teams[0]
+    assert all(dp.team is None for dp in draft_picks[1:])
+    assert DraftPick.objects.get(pool=pool, draft_pick_number=1).team == teams[0]
+
+  def test_make_draft_pick_wrong_user(self):
+    """Verifies that only the user whose turn it is can pick."""
+    users = self.create_test_users(num_users=2)
+    teams = self.create_test_teams(num_teams=1)
+    pool = self.create_test_draft(users)
+
+    with self.assertRaises(BadPickException):
+      pool.make_draft_pick(users[1], teams[0])
+
+  def test_make_draft_pick_team_already_chosen(self):
+    """Verifies that a team can only be picked once per pool."""
+    users = self.create_test_users(num_users=2)
+    teams = self.create_test_teams(num_teams=1)
+    pool = self.create_test_draft(users)
+
+    pool.make_draft_pick(users[0], teams[0])
+    with self.assertRaises(BadPickException):
+      pool.make_draft_pick(users[1], teams[0])
+
+    # The failed pick must not have advanced the board.
+    assert DraftPick.objects.get(pool=pool, draft_pick_number=2).team is None
+
+  def test_make_draft_pick_draft_complete(self):
+    """Verifies that no picks can be made once the board is full."""
+    users = self.create_test_users(num_users=2)
+    teams = self.create_test_teams(num_teams=3)
+    pool = self.create_test_draft(users, num_picks=2)
+
+    pool.make_draft_pick(users[0], teams[0])
+    pool.make_draft_pick(users[1], teams[1])
+    with self.assertRaises(BadPickException):
+      pool.make_draft_pick(users[0], teams[2])
+
+  def test_make_draft_pick_stale_pick_number(self):
+    """Verifies that a pick meant for an earlier turn is rejected."""
+    users = self.create_test_users(num_users=1)
+    teams = self.create_test_teams(num_teams=2)
+    pool = self.create_test_draft(users)
+
+    pool.make_draft_pick(users[0], teams[0], pick_number=1)
+    with self.assertRaises(BadPickException):
+      pool.make_draft_pick(users[0], teams[1], pick_number=1)
+    assert DraftPick.objects.get(pool=pool, draft_pick_number=2).team is None
+
+  def test_draft_state(self):
+    """Verifies that the draft state follows the draft from start to end."""
+    users = self.create_test_users(num_users=2)
+    teams = self.create_test_teams(num_teams=30)
+    pool = self.create_test_pool(max_size=2)
+    pool.add_member(users[0])
+    assert Pool.objects.get(id=pool.id).state == POOL_OPEN
+
+    pool.add_member(users[1])
+    pool = Pool.objects.get(id=pool.id)
+    first_pick = DraftPick.objects.get(pool=pool, draft_pick_number=1)
+    assert pool.state == POOL_DRAFTING
+    assert pool.current_pick_number == 1
+    assert pool.current_picker_id == first_pick.user_id
+    assert pool.current_pick_started_at is not None
+
+    for team in teams:
+      pool = Pool.objects.get(id=pool.id)
+      pool.make_draft_pick(pool.current_picker, team)
+      pool = Pool.objects.get(id=pool.id)
+      if pool.state == POOL_DRAFTING:
+        next_pick = DraftPick.objects.get(pool=pool, draft_pick_number=pool.current_pick_number)
+        assert next_pick.team is None
+        assert pool.current_picker_id == next_pick.user_id
+
+    assert pool.state == POOL_COMPLETE
+    assert pool.current_pick_number is None
+    assert pool.current_picker is None
+    assert pool.current_pick_started_at is None
+
+  def test_draft_pick_unique_pool_team(self):
+    """Verifies that the database rejects the same team twice in a pool."""
+    users = self.create_test_users(num_users=2)
+    teams = self.create_test_teams(num_teams=1)
+    pool = self.create_test_pool(max_size=2)
+
+    DraftPick.objects.create(pool=pool, user=users[0], team=teams[0], draft_pick_number=1)
+    with self.assertRaises(IntegrityError):
+      DraftPick.objects.create(pool=pool, user=users[1], team=teams[0], draft_pick_number=2)
+
+
+class StandingTests(ModelsTestCase):
+  def test_begin_draft_creates_standings(self):
+    users = self.create_test_users(num_users=2)
+    pool = self.create_test_pool(max_size=2)
+    for user in users:
+      pool.add_member(user)
+
+    standings = Standing.objects.filter(pool=pool)
+    assert sorted(s.user_id for s in standings) == sorted(u.id for u in users)
+    assert all(s.wins == 0 and s.losses == 0 for s in standings)
+
+  def test_make_draft_pick_adds_team_record(self):
+    users = self.create_test_users(num_users=2)
+    team = self.create_test_teams(num_teams=1)[0]
+    team.set_record(10, 3)
+    pool = self.create_test_draft(users)
+
+    pool.make_draft_pick(users[0], team)
+
+    standing = Standing.objects.get(pool=pool, user=users[0])
+    assert (standing.wins, standing.losses) == (10, 3)
+    standing = Standing.objects.get(pool=pool, user=users[1])
+    assert (standing.wins, standing.losses) == (0, 0)
+
+  def test_set_record_updates_only_drafters(self):
+    users = self.create_test_users(num_users=2)
+    teams = self.create_test_teams(num_teams=2)
+    pools = [self.create_test_draft(users, name='Pool %s' % i) for i in range(3)]
+
+    # users[0] drafts teams[0] in the first two pools only.
+    for pool in pools[:2]:
+      pool.make_draft_pick(users[0], teams[0])
+    pools[2].make_draft_pick(users[0], teams[1])
+    pools[2].make_draft_pick(users[1], teams[0])
+
+    teams[0].set_record(2, 1)
+    teams[0].set_record(5, 1)
+
+    for pool in pools[:2]:
+      standing = Standing.objects.get(pool=pool, user=users[0])
+      assert (standing.wins, standing.losses) == (5, 1)
+      standing = Standing.objects.get(pool=pool, user=users[1])
+      assert (standing.wins, standing.losses) == (0, 0)
+
+    standing = Standing.objects.get(pool=pools[2], user=users[0])
+    assert (standing.wins, standing.losses) == (0, 0)
+    standing = Standing.objects.get(pool=pools[2], user=users[1])
+    assert (standing.wins, standing.losses) == (5, 1)
+
+
+class ConcurrentJoinTests(TransactionTestCase):
+  """
+  Row locks are needed to serialize concurrent joins, so these only run on
+  databases that support SELECT ... FOR UPDATE.
+  """
+  @skipUnlessDBFeature('has_select_for_update')
+  def test_concurrent_joins_start_draft_once(self):
+    pool = Pool.objects.create(name='Race', max_size=6)
+    users = [User.objects.create(username='racer_%s' % i) for i in range(8)]
+    errors = []
+
+    def join(user):
+      try:
+        Pool.objects.get(id=pool.id).add_member(user)
+      except TooManyMembersException as e:
+        errors.append(e)
+      finally:
+        connection.close()
+
+    threads = [threading.Thread(target=join, args=(user,)) for user in users]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    assert len(errors) == 2
+    assert Pool.objects.get(id=pool.id).member_count == 6
+    assert Membership.objects.filter(pool=pool).count() == 6
+    assert DraftPick.objects.filter(pool=pool).count() == 30
+
+
+class IndexTests(ModelsTestCase):
+  """
+  Verifies that the planner serves the hot DraftPick and Membership lookups
+  from the composite indexes. `manage.py benchmark index_plans` checks the
+  same lookups on 100k pools.
+  """
+  NUM_POOLS = 1000
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.users, cls.pool = create_index_pools(cls.NUM_POOLS)
+    cls.lookups = index_lookups(cls.users, cls.pool)
+
+  def _assert_uses_index(self, lookup):
+    queryset, index_names = self.lookups[lookup]
+    plan = explain(queryset)
+    assert any(index in plan for index in index_names if index), plan
+
+  def test_next_open_pick_uses_partial_index(self):
+    self._assert_uses_index('next_open_pick')
+
+  def test_picked_teams_use_pool_index(self):
+    self._assert_uses_index('picked_teams')
+
+  def test_membership_lookups_use_user_pool_index(self):
+    self._assert_uses_index('membership')
+    self._assert_uses_index('memberships_of_user')
+
+  def test_unique_indexes(self):
+    assert index_name(DraftPick, ['pool_id', 'team_id'])
+    assert index_name(DraftPick, ['pool_id', 'draft_pick_number'])
+    assert index_name(Membership, ['user_id', 'pool_id'])
+
 
 # if __name__ == '__main__':
 #     unittest.main()
@@ -0,0 +1,11 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PoolCursorPagination(CursorPagination):
+  """
+  Keyset pagination on the pool id. Each page is one indexed range scan, so
+  fetching a page costs the same however deep into the pools table it is.
+  """
+  ordering = 'id'
+  page_size_query_param = 'page_size'
+  max_page_size = 100
@@ -0,0 +1,21 @@
+from api.renderers import FastJSONRenderer, orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+
+class FastJSONParser(JSONParser):
+  """
+  Parses JSON request bodies with orjson when it's installed, and with DRF's
+  `JSONParser` otherwise. orjson only reads UTF-8, so bodies declared in any
+  other charset also go through `JSONParser`.
+  """
+  renderer_class = FastJSONRenderer
+
+  def parse(self, stream, media_type=None, parser_context=None):
+    encoding = (parser_context or {}).get('encoding', 'utf-8')
+    if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+      return super(FastJSONParser, self).parse(stream, media_type, parser_context)
+    try:
+      return orjson.loads(stream.read())
+    except orjson.JSONDecodeError as exc:
+      raise ParseError('JSON parse error - %s' % exc)
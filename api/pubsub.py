@@ -0,0 +1,174 @@
+"""
+Publish/subscribe of live draft events.
+
+`Pool.make_draft_pick` publishes a small event on the pool's channel once the
+pick has been committed, and the draft event stream relays those events to
+clients. The broker class is `settings.DRAFT_EVENT_BROKER`. The default,
+`InProcessBroker`, only reaches subscribers in the same process, which is
+enough for a single server process and for tests. `RedisBroker` reaches
+every process that uses the same Redis server, e.g. every worker of a
+server, and is used whenever `REDIS_URL` is set.
+"""
+import json
+import threading
+
+from api.logs import get_logger
+from django.conf import settings
+from django.utils.module_loading import import_string
+from django.utils.six.moves import queue
+
+try:
+  import redis
+except ImportError:
+  redis = None
+
+logger = get_logger('nba-logger')
+
+DEFAULT_BROKER = 'api.pubsub.InProcessBroker'
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription(object):
+  """Messages published on one channel since the subscription was made."""
+  def __init__(self, broker, channel):
+    self._broker = broker
+    self.channel = channel
+    self.messages = queue.Queue()
+    # Called with no arguments, on the publishing thread, after each message
+    # is queued, e.g. to wake up a coroutine waiting for it.
+    self.listener = None
+
+  def deliver(self, message):
+    """Queues `message`. Called by the broker."""
+    self.messages.put(message)
+    listener = self.listener
+    if listener is not None:
+      listener()
+
+  def get(self, timeout=None):
+    """Returns the next message, or None if none arrives within `timeout`."""
+    try:
+      return self.messages.get(timeout=timeout)
+    except queue.Empty:
+      return None
+
+  def get_nowait(self):
+    """Returns the next message if there is one already, or else None."""
+    try:
+      return self.messages.get_nowait()
+    except queue.Empty:
+      return None
+
+  def close(self):
+    self._broker.unsubscribe(self)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+
+class InProcessBroker(object):
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._subscriptions = {}
+
+  def publish(self, channel, message):
+    with self._lock:
+      subscriptions = list(self._subscriptions.get(channel, ()))
+    for subscription in subscriptions:
+      subscription.deliver(message)
+
+  def subscribe(self, channel):
+    subscription = Subscription(self, channel)
+    with self._lock:
+      self._subscriptions.setdefault(channel, set()).add(subscription)
+    return subscription
+
+  def unsubscribe(self, subscription):
+    with self._lock:
+      subscriptions = self._subscriptions.get(subscription.channel, set())
+      subscriptions.discard(subscription)
+      if not subscriptions:
+        self._subscriptions.pop(subscription.channel, None)
+
+
+class RedisBroker(InProcessBroker):
+  """
+  Relays events between processes through Redis pub/sub. Each process holds
+  a single Redis subscription to every channel. A daemon thread, started with
+  the broker, reads that subscription and hands each event to the
+  subscriptions of its own process. `subscribe` never waits for Redis, so the
+  async views can call it on the event loop.
+
+  Events published while Redis is unreachable, or before it has confirmed the
+  subscription, are lost, and publishing never raises. A long-poll or stream that misses an event times out, and the
+  client resumes after its last pick, which is replayed from the database.
+  """
+  PREFIX = 'nba-wins-pool:'
+  RECONNECT_SECONDS = 1.0
+
+  def __init__(self, url=None):
+    super(RedisBroker, self).__init__()
+    self._redis = redis.StrictRedis.from_url(url or settings.REDIS_URL)
+    self._stopped = threading.Event()
+    self._listener = threading.Thread(target=self._listen, name='draft-events')
+    self._listener.daemon = True
+    self._listener.start()
+
+  def publish(self, channel, message):
+    try:
+      self._redis.publish(self.PREFIX + channel, json.dumps(message))
+    except redis.RedisError as e:
+      logger.warning('pubsub.publish_failed', channel=channel, error=e)
+
+  def dispatch(self, channel, data):
+    """Hands the message `data`, read from the Redis `channel`, to the subscriptions of this process."""
+    channel = channel.decode('utf-8')
+    if channel.startswith(self.PREFIX):
+      super(RedisBroker, self).publish(channel[len(self.PREFIX):], json.loads(data.decode('utf-8')))
+
+  def close(self):
+    """Stops listening, e.g. at the end of a test."""
+    self._stopped.set()
+
+  def _listen(self):
+    while not self._stopped.is_set():
+      pubsub = self._redis.pubsub()
+      try:
+        pubsub.psubscribe(self.PREFIX + '*')
+        while not self._stopped.is_set():
+          message = pubsub.get_message(timeout=self.RECONNECT_SECONDS)
+          if message is not None and message['type'] == 'pmessage':
+            self.dispatch(message['channel'], message['data'])
+      except Exception as e:
+        logger.warning('pubsub.listen_failed', error=e)
+        self._stopped.wait(self.RECONNECT_SECONDS)
+      finally:
+        pubsub.close()
+
+
+def get_broker():
+  """Returns the process-wide broker, creating it on first use."""
+  global _broker
+  if _broker is None:
+    with _broker_lock:
+      if _broker is None:
+        _broker = import_string(getattr(settings, 'DRAFT_EVENT_BROKER', DEFAULT_BROKER))()
+  return _broker
+
+
+def draft_channel(pool_id):
+  return 'draft:%s' % pool_id
+
+
+def draft_pick_event(draft_pick):
+  """The event published when `draft_pick` is made. Only the delta is sent."""
+  return {
+    'draft_pick_number': draft_pick.draft_pick_number,
+    'username': draft_pick.user.username,
+    'team_id': draft_pick.team.team_short_code,
+  }
@@ -0,0 +1,80 @@
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+try:
+  import msgpack
+except ImportError:
+  msgpack = None
+
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+
+class FastJSONRenderer(JSONRenderer):
+  """
+  Renders compact JSON with orjson when it's installed, and with DRF's
+  `JSONRenderer` otherwise or when an indent is asked for, e.g. by the
+  browsable API. Anything orjson can't serialize natively, including
+  datetimes so they look the same either way, goes through DRF's encoder.
+  Unlike `JSONRenderer`, orjson doesn't escape U+2028 and U+2029, which is
+  only a concern for JSON embedded in JavaScript.
+  """
+  compact = True
+  _encoder = JSONEncoder()
+
+  def render(self, data, accepted_media_type=None, renderer_context=None):
+    if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+      return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+    if data is None:
+      return b''
+    return orjson.dumps(data, default=self._encoder.default, option=ORJSON_OPTIONS)
+
+
+class CompactJSONRenderer(FastJSONRenderer):
+  """
+  Selected with `?format=compact` (or its media type) by views that offer a
+  columnar representation, which is rendered as plain JSON.
+  """
+  media_type = 'application/vnd.nba-wins-pool.compact+json'
+  format = 'compact'
+
+
+class MessagePackRenderer(BaseRenderer):
+  """
+  Renders the columnar representation as MessagePack, selected with
+  `?format=msgpack`. Only offered when msgpack is installed.
+  """
+  media_type = 'application/msgpack'
+  format = 'msgpack'
+  charset = None
+  render_style = 'binary'
+
+  def render(self, data, accepted_media_type=None, renderer_context=None):
+    if data is None:
+      return b''
+    return msgpack.packb(data, use_bin_type=True)
+
+
+# The renderers that views which can answer with a columnar representation
+# add to the default ones, and the formats which select it.
+COLUMNAR_RENDERER_CLASSES = (CompactJSONRenderer,) + ((MessagePackRenderer,) if msgpack else ())
+COLUMNAR_FORMATS = ('compact', 'msgpack')
+
+
+class EventStreamRenderer(BaseRenderer):
+  """
+  Lets views answer `Accept: text/event-stream` requests. Views stream their
+  events themselves, so this only renders errors, as a single `error` event.
+  """
+  media_type = 'text/event-stream'
+  format = 'event-stream'
+  charset = 'utf-8'
+
+  def render(self, data, accepted_media_type=None, renderer_context=None):
+    return 'event: error\ndata: %s\n\n' % json.dumps(data)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from api import parsers, renderers
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer
+from api.views_tests import ViewsTestCase
+from datetime import datetime
+from django.utils.six import BytesIO
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+DATA = {
+  'name': u'Caf\xe9 Pool',
+  'picks': [{'draft_pick_number': 1, 'team': None}, {'draft_pick_number': 2}],
+  'created': datetime(2016, 10, 1, 6, 33, 0, 123456),
+}
+
+
+class without_orjson(object):
+  """Runs the `with` block as if orjson weren't installed."""
+  def __enter__(self):
+    self.orjson = renderers.orjson
+    renderers.orjson = parsers.orjson = None
+
+  def __exit__(self, *exc_info):
+    renderers.orjson = parsers.orjson = self.orjson
+
+
+class FastJSONRendererTests(ViewsTestCase):
+  def test_matches_compact_json_renderer(self):
+    expected = JSONRenderer().render(DATA)
+
+    assert FastJSONRenderer().render(DATA) == expected
+    with without_orjson():
+      assert FastJSONRenderer().render(DATA) == expected
+    assert b', ' not in expected and b': ' not in expected
+
+  def test_indent(self):
+    rendered = FastJSONRenderer().render(DATA, 'application/json; indent=2')
+
+    assert rendered == JSONRenderer().render(DATA, 'application/json; indent=2')
+
+  def test_none(self):
+    assert FastJSONRenderer().render(None) == b''
+
+  def test_responses_are_compact(self):
+    users = self.create_test_users(num_users=2)
+    pool = self.create_test_draft(users, num_picks=2)
+
+    response = self.client.get('/api/v1/pools/%s/draft/' % pool.id)
+
+    assert response.status_code == 200
+    assert b', ' not in response.content and b': ' not in response.content
+
+
+class FastJSONParserTests(ViewsTestCase):
+  def _parse(self, body, encoding='utf-8'):
+    return FastJSONParser().parse(BytesIO(body), 'application/json', {'encoding': encoding})
+
+  def test_parse(self):
+    body = u'{"team_id": "caf\xe9", "picks": [1, 2]}'.encode('utf-8')
+    expected = {'team_id': u'caf\xe9', 'picks': [1, 2]}
+
+    assert self._parse(body) == expected
+    assert self._parse(u'{"team_id": "caf\xe9", "picks": [1, 2]}'.encode('latin-1'), 'latin-1') == expected
+    with without_orjson():
+      assert self._parse(body) == expected
+
+  def test_parse_error(self):
+    with self.assertRaises(ParseError):
+      self._parse(b'{"team_id": ')
+    with without_orjson():
+      with self.assertRaises(ParseError):
+        self._parse(b'{"team_id": ')
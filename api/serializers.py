@@ -1,17 +1,23 @@
-import logging
 import time
 
+from api.logs import get_logger
+from api.catalog import get_team_data
+from api.exceptions import InvalidPoolsException
 from api.models import (
   DraftPick,
   Membership,
   Pool,
   SUPPORTED_POOL_SIZES,
   Team,
+  TeamPreference,
 )
 from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import six
 from rest_framework import serializers
 
-logger = logging.getLogger('nba-logger')
+logger = get_logger('nba-logger')
 
 
 ######################################################################
@@ -87,6 +93,60 @@ class TeamSerializer(object):
     return [TeamSerializer.to_data(team) for team in teams]
 
 
+######################################################################
+# TEAM PREFERENCE SERIALIZER
+######################################################################
+class TeamPreferenceSerializer(object):
+  @staticmethod
+  def to_data_batch(preferences):
+    """Returns the teams of `preferences`, which are ordered by rank."""
+    return [TeamSerializer.to_data(preference.team) for preference in preferences]
+
+  @staticmethod
+  def update_from_data(user, preference_data):
+    """
+    Replaces the team ranking of `user`.
+
+    Args:
+      user: The user whose ranking is replaced.
+      preference_data: Expected to be in the format:
+        {"team_ids": [<team_id of the best team>, ...]}
+        An empty list clears the ranking.
+
+    Returns:
+      preferences(list): The new `TeamPreference`s, best first.
+
+    Raises:
+      ValueError: If `preference_data` is malformed, names a team twice or
+        names a team that doesn't exist.
+    """
+    # 0. Validate the `preference_data`.
+    team_ids = preference_data.get('team_ids') if hasattr(preference_data, 'get') else None
+    if not isinstance(team_ids, list):
+      raise ValueError('Expected a list of team_ids')
+    if len(set(team_ids)) != len(team_ids):
+      raise ValueError('A team can only be ranked once')
+
+    # 1. Verify that the team ids correspond to actual teams.
+    teams_by_short_code = {
+      team.team_short_code: team for team in Team.objects.filter(team_short_code__in=team_ids)
+    }
+    unknown = [team_id for team_id in team_ids if team_id not in teams_by_short_code]
+    if unknown:
+      raise ValueError('Unknown teams: %s' % ', '.join(sorted(unknown)))
+
+    # 2. Replace the ranking.
+    preferences = [
+      TeamPreference(user=user, team=teams_by_short_code[team_id], rank=rank)
+      for rank, team_id in enumerate(team_ids, 1)
+    ]
+    with transaction.atomic():
+      TeamPreference.objects.filter(user=user).delete()
+      TeamPreference.objects.bulk_create(preferences)
+
+    return preferences
+
+
 ######################################################################
 # DRAFT PICK SERIALIZER
 ######################################################################
@@ -99,8 +159,8 @@ class DraftPickSerializer(object):
       'draft_pick_number': draft_pick.draft_pick_number,
     }
 
-    if draft_pick.team is not None:
-      draft_pick_dict['team'] = TeamSerializer.to_data(draft_pick.team)
+    if draft_pick.team_id is not None:
+      draft_pick_dict['team'] = get_team_data(draft_pick.team_id)
 
     return draft_pick_dict
 
@@ -108,32 +168,158 @@ class DraftPickSerializer(object):
   def to_data_batch(draft_picks):
     return [DraftPickSerializer.to_data(draft_pick) for draft_pick in draft_picks]
 
+  @staticmethod
+  def to_columns(draft_picks):
+    """
+    Returns a board with its users and drafted teams sent once each, and its
+    picks as parallel arrays of indexes into them:
+      {
+        "users": [<user>, ...],
+        "teams": [<team>, ...],
+        "picks": {
+          "draft_pick_number": [1, 2, ...],
+          "user": [<index into users>, ...],
+          "team": [<index into teams, or None if not drafted yet>, ...]
+        }
+      }
+
+    Args:
+      draft_picks: The picks ordered by `draft_pick_number`, with their `user`
+        loaded. Teams come from the team catalog.
+    """
+    users = []
+    teams = []
+    user_indexes = {}
+    team_indexes = {}
+    picks = {'draft_pick_number': [], 'user': [], 'team': []}
+    for draft_pick in draft_picks:
+      if draft_pick.user_id not in user_indexes:
+        user_indexes[draft_pick.user_id] = len(users)
+        users.append(UserSerializer.to_data(draft_pick.user))
+      team_index = None
+      if draft_pick.team_id is not None:
+        if draft_pick.team_id not in team_indexes:
+          team_indexes[draft_pick.team_id] = len(teams)
+          teams.append(get_team_data(draft_pick.team_id))
+        team_index = team_indexes[draft_pick.team_id]
+
+      picks['draft_pick_number'].append(draft_pick.draft_pick_number)
+      picks['user'].append(user_indexes[draft_pick.user_id])
+      picks['team'].append(team_index)
+
+    return {'users': users, 'teams': teams, 'picks': picks}
+
+
+######################################################################
+# STANDING SERIALIZER
+######################################################################
+class StandingSerializer(object):
+  @staticmethod
+  def to_data_batch(standings):
+    """
+    `standings` must be ordered from best to worst record. Users with the
+    same record share a rank.
+    """
+    standings_data = []
+    rank = 0
+    previous_record = None
+    for position, standing in enumerate(standings, 1):
+      record = (standing.wins, standing.losses)
+      if record != previous_record:
+        rank = position
+        previous_record = record
+
+      standings_data.append({
+        'rank': rank,
+        'user': UserSerializer.to_data(standing.user),
+        'wins': standing.wins,
+        'losses': standing.losses,
+      })
+
+    return standings_data
+
 
 ######################################################################
 # POOL SERIALIZER
 ######################################################################
 class PoolSerializer(object):
+  FIELDS = ('id', 'name', 'max_size', 'state', 'current_pick_number', 'members', 'draft_status')
+  # Enough to list pools without loading their members or boards.
+  SUMMARY_FIELDS = ('id', 'name', 'max_size', 'state', 'current_pick_number')
+  # The most pools `create_batch_from_data` creates at once.
+  MAX_BATCH_SIZE = 1000
+
   @staticmethod
-  def to_data(pool):
-    logger.info('pool.draft_pick_set: %s' % pool.draftpick_set.all())
-    return {
-      'id': pool.id,
-      'name': pool.name,
-      'max_size': pool.max_size,
-      'members': UserSerializer.to_data_batch(pool.members.all()),
-      'draft_status': DraftPickSerializer.to_data_batch(pool.draftpick_set.all()),
+  def prefetch_lookups(fields=FIELDS):
+    """
+    Lookups that load every member, draft pick, pick user and pick team for a
+    batch of pools in a constant number of queries. Relations that `fields`
+    leaves out aren't loaded at all.
+    """
+    lookups = []
+    if 'members' in fields:
+      lookups.append('members')
+    if 'draft_status' in fields:
+      lookups.append(Prefetch(
+        'draftpick_set',
+        queryset=DraftPick.objects.select_related('user').order_by('draft_pick_number'),
+        to_attr='draft_picks',
+      ))
+    return lookups
+
+  @staticmethod
+  def to_data(pool, fields=FIELDS):
+    return PoolSerializer.to_data_batch([pool], fields=fields)[0]
+
+  @staticmethod
+  def to_data_batch(pools, fields=FIELDS):
+    """
+    `pools` can be any iterable value, e.g. a QuerySet instead of just a list.
+    Pools that were already fetched with `prefetch_lookups` are not queried
+    again. Only the keys in `fields` are serialized.
+    """
+    pools = list(pools)
+    prefetch_related_objects(pools, *PoolSerializer.prefetch_lookups(fields))
+
+    serializers_by_field = {
+      'id': lambda pool: pool.id,
+      'name': lambda pool: pool.name,
+      'max_size': lambda pool: pool.max_size,
+      'state': lambda pool: pool.state,
+      'current_pick_number': lambda pool: pool.current_pick_number,
+      'members': lambda pool: UserSerializer.to_data_batch(pool.members.all()),
+      'draft_status': lambda pool: DraftPickSerializer.to_data_batch(pool.draft_picks),
     }
+    field_serializers = [(field, serializers_by_field[field]) for field in fields]
+
+    return [
+      {field: serialize(pool) for field, serialize in field_serializers}
+      for pool in pools
+    ]
 
   @staticmethod
-  def to_data_batch(pools):
-    # TODO(shravan): This should be defined the inverse way. `to_data` should
-    # be defined in terms of `to_data_batch`.
-    return [PoolSerializer.to_data(pool) for pool in pools]
+  def parse_fields(fields_param):
+    """
+    Parses a comma separated `fields=` query parameter into a tuple of
+    `FIELDS`, defaulting to all of them.
+
+    Raises:
+      ValueError: If an unknown field is requested.
+    """
+    if not fields_param:
+      return PoolSerializer.FIELDS
+
+    fields = tuple(field.strip() for field in fields_param.split(',') if field.strip())
+    unknown = [field for field in fields if field not in PoolSerializer.FIELDS]
+    if unknown or not fields:
+      raise ValueError('Unknown fields: %s' % ', '.join(unknown))
+
+    return fields
 
   @staticmethod
   def create_from_data(pool_data):
     # 0. Validate the `pool_data`
-    assert 'name' in pool_data and isinstance(pool_data['name'], basestring)
+    assert 'name' in pool_data and isinstance(pool_data['name'], six.string_types)
     assert 'max_size' in pool_data
 
     pool_name = pool_data['name']
@@ -157,6 +343,110 @@ class PoolSerializer(object):
 
     return pool
 
+  @staticmethod
+  def _parse_batch_pool(pool_data):
+    """
+    Returns the (name, max_size, usernames) of one pool of a batch.
+
+    Raises:
+      ValueError: If `pool_data` is malformed.
+    """
+    if not hasattr(pool_data, 'get'):
+      raise ValueError('Expected a pool')
+
+    name = pool_data.get('name')
+    if not isinstance(name, six.string_types) or not name.strip():
+      raise ValueError('Expected a name')
+    if len(name) > Pool._meta.get_field('name').max_length:
+      raise ValueError('Name is too long')
+
+    try:
+      max_size = int(pool_data.get('max_size'))
+    except (TypeError, ValueError):
+      raise ValueError('Expected a max_size')
+    if max_size not in SUPPORTED_POOL_SIZES:
+      raise ValueError('Unsupported max_size: %s' % max_size)
+
+    usernames = pool_data.get('members', [])
+    if not isinstance(usernames, list) or not all(isinstance(u, six.string_types) for u in usernames):
+      raise ValueError('Expected a list of member usernames')
+    if len(set(usernames)) != len(usernames):
+      raise ValueError('A user can only be a member once')
+    if len(usernames) > max_size:
+      raise ValueError('Too many members for a pool of %s' % max_size)
+
+    return name, max_size, usernames
+
+  @staticmethod
+  def _users_by_username(usernames):
+    """
+    Looks up the users named `usernames` in one query, or in a few on
+    databases that limit the number of query parameters (SQLite).
+    """
+    usernames = list(usernames)
+    chunk_size = connection.ops.bulk_batch_size([User._meta.get_field('username')], usernames) or 1
+    users_by_username = {}
+    for start in range(0, len(usernames), chunk_size):
+      users = User.objects.filter(username__in=usernames[start:start + chunk_size])
+      users_by_username.update((user.username, user) for user in users)
+    return users_by_username
+
+  @staticmethod
+  def create_batch_from_data(batch_data, rng=None):
+    """
+    Creates every pool of `batch_data` at once with `Pool.create_batch`, or
+    none of them if any is invalid. A pool given `max_size` members begins
+    drafting right away.
+
+    Args:
+      batch_data: Expected to be in the format:
+        {"pools": [{"name": <name>, "max_size": <size>, "members": [<username>, ...]}, ...]}
+        `members` may be left out.
+      rng(random.Random): Optional source of randomness for the draft orders.
+
+    Returns:
+      pools(list): The new Pools, in order.
+
+    Raises:
+      ValueError: If `batch_data` isn't a list of 1 to `MAX_BATCH_SIZE` pools.
+      InvalidPoolsException: If any pool is malformed or names an unknown user.
+    """
+    # 0. Validate the `batch_data`, and each pool on its own.
+    pools_data = batch_data.get('pools') if hasattr(batch_data, 'get') else None
+    if not isinstance(pools_data, list) or not pools_data:
+      raise ValueError('Expected a list of pools')
+    if len(pools_data) > PoolSerializer.MAX_BATCH_SIZE:
+      raise ValueError('At most %s pools can be created at once' % PoolSerializer.MAX_BATCH_SIZE)
+
+    specs = []
+    errors = []
+    for pool_data in pools_data:
+      try:
+        specs.append(PoolSerializer._parse_batch_pool(pool_data))
+        errors.append(None)
+      except ValueError as e:
+        specs.append(None)
+        errors.append(str(e))
+
+    # 1. Verify that the usernames of every pool correspond to actual users.
+    users_by_username = PoolSerializer._users_by_username(
+      set(username for spec in specs if spec is not None for username in spec[2]))
+    for i, spec in enumerate(specs):
+      if spec is None:
+        continue
+      unknown = [username for username in spec[2] if username not in users_by_username]
+      if unknown:
+        errors[i] = 'Unknown usernames: %s' % ', '.join(sorted(unknown))
+
+    if any(errors):
+      raise InvalidPoolsException(errors)
+
+    # 2. Create the Pools.
+    return Pool.create_batch([
+      (Pool(name=name, max_size=max_size), [users_by_username[username] for username in usernames])
+      for name, max_size, usernames in specs
+    ], rng=rng)
+
 
 class PoolMemberSerializer(object):
   @staticmethod
@@ -179,7 +469,7 @@ class PoolMemberSerializer(object):
     assert pool_id.isdigit()
     assert "username" in pool_member_data
     member_username = pool_member_data["username"]
-    pool_id = long(pool_id)
+    pool_id = int(pool_id)
 
     # 1. Validate that a user exists with `member_username`
     user = User.objects.get(username=member_username)
@@ -191,11 +481,9 @@ class PoolMemberSerializer(object):
     if not pool:
       raise Pool.DoesNotExist()
 
-    logger.info('pool: %s' % pool)
     # 3. Add the new member to the pool.
     pool.add_member(user)
-
-    logger.info('pool after adding member: %s' % pool.members.all())
+    logger.info('pool.member_added', pool_id=pool.id, username=user.username)
 
     return pool.members.all()
 
@@ -0,0 +1,87 @@
+from api.catalog import get_team_catalog
+from api.models import DraftPick, Membership, Pool
+from api.models_tests import ModelsTestCase
+from api.serializers import DraftPickSerializer, PoolSerializer
+from datetime import datetime
+
+
+class PoolSerializerTests(ModelsTestCase):
+  def _create_drafting_pools(self, num_pools, users, teams):
+    """Creates `num_pools` pools with every user as a member and a board with
+    one pick per user, the first of which has been made."""
+    pools = []
+    for i in range(num_pools):
+      pool = self.create_test_pool(name='Pool %s' % i, max_size=len(users))
+      for pick_number, user in enumerate(users, 1):
+        Membership.objects.create(pool=pool, user=user, date_joined=datetime.now())
+        team = teams[0] if pick_number == 1 else None
+        DraftPick.objects.create(pool=pool, user=user, team=team, draft_pick_number=pick_number)
+      pools.append(pool)
+
+    return pools
+
+  def test_to_data_batch_constant_queries(self):
+    """The number of queries must not depend on the number of pools."""
+    users = self.create_test_users(num_users=3)
+    teams = self.create_test_teams()
+
+    self._create_drafting_pools(2, users, teams)
+    # Teams come from the team catalog, which is loaded once per process.
+    get_team_catalog()
+    # 1 for the pools, 1 for the members and 1 for the picks and users.
+    with self.assertNumQueries(3):
+      PoolSerializer.to_data_batch(Pool.objects.all())
+
+    self._create_drafting_pools(20, users, teams)
+    with self.assertNumQueries(3):
+      pool_data = PoolSerializer.to_data_batch(Pool.objects.all())
+
+    assert len(pool_data) == 22
+
+  def test_to_data_batch_prefetched_pools(self):
+    """Pools that were fetched with `prefetch_lookups` are not queried again."""
+    users = self.create_test_users(num_users=2)
+    teams = self.create_test_teams()
+    self._create_drafting_pools(5, users, teams)
+
+    pools = list(Pool.objects.prefetch_related(*PoolSerializer.prefetch_lookups()))
+    get_team_catalog()
+    with self.assertNumQueries(0):
+      PoolSerializer.to_data_batch(pools)
+
+  def test_to_data(self):
+    """`to_data` is a batch of one and keeps the original structure."""
+    users = self.create_test_users(num_users=2)
+    teams = self.create_test_teams()
+    pool = self._create_drafting_pools(1, users, teams)[0]
+
+    pool_data = PoolSerializer.to_data(pool)
+
+    assert pool_data['id'] == pool.id
+    assert pool_data['name'] == pool.name
+    assert pool_data['max_size'] == 2
+    assert sorted(m['username'] for m in pool_data['members']) == sorted(u.username for u in users)
+    assert [p['draft_pick_number'] for p in pool_data['draft_status']] == [1, 2]
+    assert pool_data['draft_status'][0]['team']['team_id'] == teams[0].team_short_code
+    assert 'team' not in pool_data['draft_status'][1]
+
+
+class DraftPickSerializerTests(ModelsTestCase):
+  def test_to_columns(self):
+    """Users and teams are sent once, picks as indexes into them."""
+    users = self.create_test_users(num_users=2)
+    teams = self.create_test_teams(num_teams=3)
+    pool = self.create_test_draft(users, num_picks=4)
+    pool.make_draft_pick(users[0], teams[2])
+    pool.make_draft_pick(users[1], teams[0])
+    draft_picks = pool.draftpick_set.select_related('user', 'team').order_by('draft_pick_number')
+
+    columns = DraftPickSerializer.to_columns(draft_picks)
+
+    assert [user['username'] for user in columns['users']] == [u.username for u in users]
+    assert [team['team_id'] for team in columns['teams']] == ['team-2', 'team-0']
+    assert columns['picks'] == {
+      'draft_pick_number': [1, 2, 3, 4],
+      'user': [0, 1, 0, 1],
+      'team': [0, 1, None, None],
+    }
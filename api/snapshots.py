@@ -0,0 +1,180 @@
+"""
+Pre-rendered draft boards.
+
+The board of a Pool only changes when `begin_draft` or `make_draft_pick`
+commits, so both render it once, in their own transaction, into the Pool's
+`DraftBoardSnapshot`. `DraftDetail` answers plain JSON GETs with those bytes:
+one lookup by primary key, with no joins and no serialization. The other
+representations, and Pools without a snapshot, go through
+`api.cache.cached_response` as before.
+
+A snapshot holds the users and teams as they were when it was written. After
+renaming a team or a user, or whenever a snapshot may have diverged from its
+board, `manage.py rebuild_draft_snapshots` renders the boards again and
+rewrites the snapshots that differ.
+"""
+import json
+
+from api.cache import etag_matches
+from api.logs import get_logger
+from api.models import POOL_OPEN, DraftBoardSnapshot, DraftPick, Pool
+from api.renderers import FastJSONRenderer
+from api.serializers import DraftPickSerializer
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F
+from django.utils.cache import patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = get_logger('nba-logger')
+
+_renderer = FastJSONRenderer()
+
+
+def render_board(draft_picks):
+  """
+  Renders a board exactly like `DraftDetail` does.
+
+  Args:
+    draft_picks: The picks ordered by `draft_pick_number`, with their `user`
+      loaded.
+
+  Returns:
+    The JSON as bytes.
+  """
+  return _renderer.render(DraftPickSerializer.to_data_batch(draft_picks))
+
+
+def build_snapshot(pool_id, draft_picks):
+  """Returns the unsaved first snapshot of a new board, e.g. to bulk insert."""
+  return DraftBoardSnapshot(pool_id=pool_id, version=1, payload=render_board(draft_picks))
+
+
+def save_snapshot(pool_id, draft_picks):
+  """
+  Stores the board `draft_picks` as the snapshot of the Pool `pool_id`.
+  Called with the Pool row locked, so the writes to a snapshot are serialized.
+  """
+  payload = render_board(draft_picks)
+  updated = DraftBoardSnapshot.objects.filter(pool_id=pool_id).update(
+    version=F('version') + 1,
+    payload=payload,
+  )
+  if not updated:
+    DraftBoardSnapshot.objects.create(pool_id=pool_id, version=1, payload=payload)
+
+
+class SnapshotResponse(Response):
+  """
+  A `Response` whose JSON body has already been rendered. Its `data` is only
+  decoded if something asks for it, e.g. a test.
+  """
+  def __init__(self, payload, headers=None):
+    self.payload = payload
+    super(SnapshotResponse, self).__init__(headers=headers, content_type=FastJSONRenderer.media_type)
+
+  @property
+  def data(self):
+    return json.loads(self.payload.decode('utf-8'))
+
+  @data.setter
+  def data(self, value):
+    # Set to None by `Response.__init__`; the payload is the data.
+    pass
+
+  @property
+  def rendered_content(self):
+    self['Content-Type'] = self.content_type
+    return self.payload
+
+
+def get_snapshot(pool_id):
+  """
+  Returns:
+    (etag, payload): The ETag and the JSON of the snapshot of the board of
+      the Pool `pool_id`, or None if it has no snapshot.
+  """
+  snapshot = DraftBoardSnapshot.objects.filter(pool_id=pool_id).values_list('version', 'payload').first()
+  if snapshot is None:
+    return None
+
+  version, payload = snapshot
+  # Postgres hands binary columns back as memoryviews.
+  return quote_etag('draft-snapshot-%s-%s' % (pool_id, version)), bytes(payload)
+
+
+def snapshot_response(request, pool_id):
+  """
+  Answers `request` with the snapshot of the board of the Pool `pool_id`, or
+  with an empty 304 if its If-None-Match header matches the snapshot's ETag.
+  Both vary on Accept, like the other representations of the board.
+
+  Returns:
+    The response, or None if the Pool has no snapshot.
+  """
+  snapshot = get_snapshot(pool_id)
+  if snapshot is None:
+    return None
+
+  etag, payload = snapshot
+  if etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+    response = Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+  else:
+    response = SnapshotResponse(payload, headers={'ETag': etag})
+  patch_vary_headers(response, ('Accept',))
+  return response
+
+
+def rebuild_snapshots(pool_ids=None, batch_size=500, on_batch=None):
+  """
+  Renders the board of every Pool whose draft has started, or only of
+  `pool_ids`, and rewrites the snapshots that are missing or differ from it.
+  Boards are compared without locks, `batch_size` Pools at a time. A board
+  that differs is loaded again and rewritten with its Pool row locked, so a
+  pick made in the meantime is never overwritten with an older board. Each
+  rewrite commits on its own, unless called in a transaction, and
+  `on_batch()`, if given, is called after each batch.
+
+  Returns:
+    (num_checked, num_rebuilt): How many boards were compared and how many
+      snapshots were rewritten.
+  """
+  pools = Pool.objects.exclude(state=POOL_OPEN).order_by('id')
+  if pool_ids is not None:
+    pools = pools.filter(id__in=pool_ids)
+
+  num_checked = num_rebuilt = 0
+  last_id = 0
+  while True:
+    batch = list(pools.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+    if not batch:
+      break
+    last_id = batch[-1]
+
+    boards = defaultdict(list)
+    draft_picks = DraftPick.objects.filter(pool_id__in=batch).select_related('user')
+    for draft_pick in draft_picks.order_by('pool_id', 'draft_pick_number'):
+      boards[draft_pick.pool_id].append(draft_pick)
+    payloads = dict(DraftBoardSnapshot.objects.filter(pool_id__in=batch).values_list('pool_id', 'payload'))
+
+    for pool_id in batch:
+      num_checked += 1
+      payload = payloads.get(pool_id)
+      if payload is not None and bytes(payload) == render_board(boards[pool_id]):
+        continue
+
+      with transaction.atomic():
+        if not list(Pool.objects.select_for_update().filter(id=pool_id).values_list('id', flat=True)):
+          # Deleted since the batch was read, together with its snapshot.
+          continue
+        board = DraftPick.objects.filter(pool_id=pool_id).select_related('user')
+        save_snapshot(pool_id, list(board.order_by('draft_pick_number')))
+      num_rebuilt += 1
+      logger.info('draft.snapshot_rebuilt', pool_id=pool_id, missing=payload is None)
+
+    if on_batch is not None:
+      on_batch()
+
+  return num_checked, num_rebuilt
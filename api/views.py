@@ -1,26 +1,52 @@
-import logging
-
-from api.exceptions import TooManyMembersException
-from api.models import Membership, Pool, Team
+import json
+import time
+
+from api.cache import cached_response
+from api.catalog import get_team
+from api.exceptions import (
+  BadPickException,
+  DraftStartedException,
+  InvalidPoolsException,
+  TooManyMembersException,
+)
+from api.instrumentation import instrument
+from api.logs import get_logger
+from api.models import (
+  DraftPick,
+  NUM_DRAFT_PICKS,
+  POOL_STATES,
+  Pool,
+  Standing,
+  Team,
+  TeamPreference,
+)
+from api.pagination import PoolCursorPagination
+from api.parsers import FastJSONParser
 from api.permissions import IsStaffOrTargetUser
+from api.pubsub import draft_channel, draft_pick_event, get_broker
+from api.renderers import COLUMNAR_FORMATS, COLUMNAR_RENDERER_CLASSES, EventStreamRenderer
 from api.serializers import (
   DraftPickSerializer,
   PoolSerializer,
   PoolMemberSerializer,
+  StandingSerializer,
+  TeamPreferenceSerializer,
   UserSerializer,
 )
+from api.snapshots import snapshot_response
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
 
 from rest_framework import (status, viewsets)
-from rest_framework.parsers import JSONParser
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
 # Set up logger
-logger = logging.getLogger('nba-logger')
+logger = get_logger('nba-logger')
 
 
 ######################################################################
@@ -34,7 +60,7 @@ class UserViewSet(viewsets.ModelViewSet):
   model = User
   queryset = User.objects.all().order_by('-date_joined')
   lookup_field = ('username')
-  parser_classes = (JSONParser, )
+  parser_classes = (FastJSONParser,)
 
   def get_permissions(self):
     # Allow non-authenticated user to create via POST
@@ -50,18 +76,45 @@ class UserViewSet(viewsets.ModelViewSet):
 # LIST OF ALL POOLS
 ######################################################################
 class PoolList(APIView):
-  parser_classes = (JSONParser,)
+  parser_classes = (FastJSONParser,)
 
   """ List all pools, or create a new pool. """
   def get(self, request, format=None):
+    """
+    Lists pools a page at a time, oldest first. Accepts the optional query
+    parameters:
+      state: Only pools that are `open`, `drafting` or `complete`.
+      max_size: Only pools of this size.
+      fields: Comma separated subset of the pool fields to return.
+      cursor, page_size: See `PoolCursorPagination`.
+    """
     pools = Pool.objects.all()
-    logger.info('type of pools: %s' % type(pools[0]))
-    serialized_data = PoolSerializer.to_data_batch(pools)
 
-    return Response(serialized_data)
+    state = request.query_params.get('state')
+    if state is not None:
+      if state not in POOL_STATES:
+        return Response('Bad Request', status=status.HTTP_400_BAD_REQUEST)
+      pools = pools.filter(state=state)
+
+    max_size = request.query_params.get('max_size')
+    if max_size is not None:
+      if not max_size.isdigit():
+        return Response('Bad Request', status=status.HTTP_400_BAD_REQUEST)
+      pools = pools.filter(max_size=int(max_size))
+
+    try:
+      fields = PoolSerializer.parse_fields(request.query_params.get('fields'))
+    except ValueError:
+      return Response('Bad Request', status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = PoolCursorPagination()
+    page = paginator.paginate_queryset(pools, request, view=self)
+    with instrument('serialization'):
+      page_data = PoolSerializer.to_data_batch(page, fields=fields)
+    return paginator.get_paginated_response(page_data)
 
   def post(self, request, format=None):
-    logger.info('original pool data: %s' % request.data)
+    logger.info('pool.create_requested', data=request.data)
     pool = PoolSerializer.create_from_data(request.data)
     # if serializer.is_valid():
     #     serializer.save()
@@ -73,6 +126,40 @@ class PoolList(APIView):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class PoolBatch(APIView):
+  parser_classes = (FastJSONParser,)
+  permission_classes = (IsAdminUser,)
+
+  """
+  Creates many pools with their members at once, e.g. for a league that
+  onboards hundreds of pools at the start of a season. Staff only.
+  """
+  def post(self, request, format=None):
+    """
+    Creates every pool or, if any of them is invalid, none.
+
+    Args:
+      `request.data` is expected to be in the format:
+      {
+        "pools": [{"name": <name>, "max_size": <size>, "members": [<username>, ...]}, ...]
+      }
+
+    Returns:
+      201 with {"pools": [<summary of each new pool>, ...]} in order, or 400
+      with {"errors": [<error, or null for a valid pool>, ...]}.
+    """
+    try:
+      pools = PoolSerializer.create_batch_from_data(request.data)
+    except ValueError as e:
+      return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
+    except InvalidPoolsException as e:
+      return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    with instrument('serialization'):
+      pools_data = PoolSerializer.to_data_batch(pools, fields=PoolSerializer.SUMMARY_FIELDS)
+    return Response({'pools': pools_data}, status=status.HTTP_201_CREATED)
+
+
 ######################################################################
 # DETAILS OF A SPECIFIC POOL
 ######################################################################
@@ -87,8 +174,7 @@ class PoolDetail(APIView):
   def get(self, request, pool_id):
     """Fetch the draft picks for a particular pool"""
     pool = self.get_object(pool_id)
-    pool_data = PoolSerializer.to_data(pool)
-    return Response(pool_data)
+    return cached_response(request, 'pool', pool, lambda: PoolSerializer.to_data(pool))
 
   def delete(self, request, pool_id, format=None):
     """ Deletes the Pool entirely """
@@ -114,7 +200,7 @@ class PoolMembers(APIView):
       }
       If the pool already has reached `max_size`, this will raise a 400.
     """
-    logger.info('request data: %s' % request.data)
+    logger.debug('pool.join_requested', pool_id=pool_id, data=request.data)
     try:
       pool_members = PoolMemberSerializer.update_from_data(pool_id, request.data)
       return Response(PoolMemberSerializer.to_data_batch(pool_members))
@@ -127,7 +213,10 @@ class PoolMembers(APIView):
     """
     pool = self._get_object(pool_id)
     user = request.user
-    pool.remove_member(user)
+    try:
+      pool.remove_member(user)
+    except DraftStartedException:
+      return Response('Bad Request', status=status.HTTP_400_BAD_REQUEST)
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -137,41 +226,175 @@ class PoolMembers(APIView):
 class DraftDetail(APIView):
   """
   Retrieve the details of the draft corresponding to a particular pool.
+  `?format=compact` (JSON) and `?format=msgpack` answer with the columnar
+  board of `DraftPickSerializer.to_columns` instead of a list of picks.
+  Plain JSON is served from the board's snapshot when there is one.
   """
+  renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + COLUMNAR_RENDERER_CLASSES
+
   def get_pool(self, pool_id):
     try:
       return Pool.objects.get(id=pool_id)
     except Pool.DoesNotExist:
       raise Http404
 
-  def get_draft(self, pool_id):
-    pool = self.get_pool(pool_id)
-    draft_picks = pool.draftpick_set.all()
+  @staticmethod
+  def get_draft(pool):
+    # Teams come from the team catalog.
+    return pool.draftpick_set.select_related('user').order_by('draft_pick_number')
 
-    if draft_picks == [] or draft_picks is None:
-      raise Http404
+  @staticmethod
+  def board_data(format, draft_picks):
+    """The data of the board `draft_picks` in the representation of `format`."""
+    if format in COLUMNAR_FORMATS:
+      return DraftPickSerializer.to_columns(draft_picks)
+    return DraftPickSerializer.to_data_batch(draft_picks)
 
-    return draft_picks
+  def to_data(self, request, draft_picks):
+    return self.board_data(request.accepted_renderer.format, draft_picks)
 
   def get(self, request, pool_id):
     """Fetch the draft picks for a particular pool"""
-    draft_picks = self.get_draft(pool_id)
-    draft_pick_data = DraftPickSerializer.to_data_batch(draft_picks)
-    return Response(draft_pick_data)
+    renderer = request.accepted_renderer
+    if renderer.format == 'json' and not renderer.get_indent(request.accepted_media_type, {}):
+      response = snapshot_response(request, pool_id)
+      if response is not None:
+        return response
+
+    pool = self.get_pool(pool_id)
+    # Every representation has its own ETag and cache entry.
+    kind = 'draft'
+    if request.accepted_renderer.format in COLUMNAR_FORMATS:
+      kind = 'draft-%s' % request.accepted_renderer.format
+    return cached_response(request, kind, pool, lambda: self.to_data(request, self.get_draft(pool)))
 
   def put(self, request, pool_id, format=None):
     pool = self.get_pool(pool_id)
     user = request.user
 
-    team_short_code = request.data['team_id']
-    team = Team.objects.get(team_short_code=team_short_code)
+    try:
+      team = get_team(request.data['team_id'])
+    except Team.DoesNotExist:
+      return Response('Unknown team', status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+      draft_picks = pool.make_draft_pick(user, team)
+    except BadPickException as e:
+      return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
 
-    pool = pool.make_draft_pick(user, team)
-    draft_picks = self.get_draft(pool.id)
-    draft_pick_data = DraftPickSerializer.to_data_batch(draft_picks)
+    with instrument('serialization'):
+      draft_pick_data = self.to_data(request, draft_picks)
     return Response(draft_pick_data)
 
 
+######################################################################
+# LIVE UPDATES OF THE DRAFT CORRESPONDING TO THE POOL
+######################################################################
+class DraftEvents(APIView):
+  """
+  Follow a draft as the picks are made. Each event only carries the pick
+  number, the username and the team_id of the pick.
+
+  Clients that accept `text/event-stream` get server-sent events until the
+  draft is over or `DRAFT_EVENTS_TIMEOUT` seconds have passed. Every other
+  client gets a long-poll: the picks made so far, or else the next pick made
+  within `DRAFT_EVENTS_TIMEOUT` seconds, or no picks at once if the client
+  already has the last one.
+
+  Both resume after the pick number in the `Last-Event-ID` header or the
+  `after` query parameter.
+  """
+  renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (EventStreamRenderer,)
+
+  def get(self, request, pool_id):
+    if not Pool.objects.filter(id=pool_id).exists():
+      raise Http404
+
+    last_pick_number = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('after') or 0
+    try:
+      last_pick_number = int(last_pick_number)
+    except ValueError:
+      return Response('Bad Request', status=status.HTTP_400_BAD_REQUEST)
+
+    # Subscribe first, so that no pick falls between the replay and the
+    # subscription. Picks in both are dropped by their pick number.
+    subscription = get_broker().subscribe(draft_channel(pool_id))
+    events = self.missed_events(pool_id, last_pick_number)
+    timeout = getattr(settings, 'DRAFT_EVENTS_TIMEOUT', 30)
+
+    if request.accepted_renderer.format == EventStreamRenderer.format:
+      response = StreamingHttpResponse(
+        self._stream(subscription, events, last_pick_number, timeout),
+        content_type=EventStreamRenderer.media_type,
+      )
+      response['Cache-Control'] = 'no-cache'
+      response['X-Accel-Buffering'] = 'no'
+      return response
+
+    with subscription:
+      # Past the last pick, nothing can be published any more.
+      if not events and last_pick_number < NUM_DRAFT_PICKS:
+        event = subscription.get(timeout=timeout)
+        while event is not None and event['draft_pick_number'] <= last_pick_number:
+          event = subscription.get(timeout=timeout)
+        events = [event] if event is not None else []
+
+    return Response(events)
+
+  @staticmethod
+  def missed_events(pool_id, last_pick_number):
+    """The events of the picks made after `last_pick_number`, in order."""
+    missed_picks = (DraftPick.objects
+                    .filter(pool_id=pool_id, draft_pick_number__gt=last_pick_number, team__isnull=False)
+                    .select_related('user', 'team')
+                    .order_by('draft_pick_number'))
+    return [draft_pick_event(draft_pick) for draft_pick in missed_picks]
+
+  def _stream(self, subscription, events, last_pick_number, timeout):
+    keepalive = getattr(settings, 'DRAFT_EVENTS_KEEPALIVE', 15)
+    deadline = time.time() + timeout
+    with subscription:
+      for event in events:
+        yield self.format_event(event)
+        last_pick_number = event['draft_pick_number']
+
+      while last_pick_number < NUM_DRAFT_PICKS:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+          break
+
+        event = subscription.get(timeout=min(keepalive, remaining))
+        if event is None:
+          yield ': keepalive\n\n'
+        elif event['draft_pick_number'] > last_pick_number:
+          yield self.format_event(event)
+          last_pick_number = event['draft_pick_number']
+
+  @staticmethod
+  def format_event(event):
+    return 'id: %s\nevent: pick\ndata: %s\n\n' % (event['draft_pick_number'], json.dumps(event))
+
+
+######################################################################
+# LEADERBOARD OF A POOL
+######################################################################
+class PoolLeaderboard(APIView):
+  """
+  Retrieve the standings of a particular pool, best record first.
+  """
+  def get(self, request, pool_id):
+    standings = Standing.objects.filter(pool_id=pool_id).select_related('user').order_by(
+      '-wins', 'losses', 'user__username')
+    with instrument('serialization'):
+      standings_data = StandingSerializer.to_data_batch(standings)
+
+    # Pools that haven't started drafting yet have no standings.
+    if not standings_data and not Pool.objects.filter(id=pool_id).exists():
+      raise Http404
+
+    return Response(standings_data)
+
+
 ######################################################################
 # POOLS FOR A SPECIFIC USER
 ######################################################################
@@ -179,17 +402,33 @@ class PoolsByUser(APIView):
   permission_classes = (IsAuthenticated,)
 
   """
-  Allows fetching a particular user's pools.
+  Allows fetching a particular user's pools. Accepts the optional query
+  parameters:
+    fields: Comma separated subset of the pool fields to return.
+    limit: Return at most this many pools (up to `MAX_LIMIT`), oldest first.
+      Every pool is returned without it.
   """
-  def get(self, request, username, format=None):
-    user = User.objects.filter(username=username)
-    memberships = Membership.objects.filter(user=user)
-    pools = [membership.pool for membership in memberships]
-
-    logger.info('membership pools: %s type(%s)' % (pools, type(memberships[0].pool)))
+  MAX_LIMIT = 500
 
-    if pools:
-      pool_data = PoolSerializer.to_data_batch(pools)
+  def get(self, request, username, format=None):
+    limit = request.query_params.get('limit')
+    try:
+      fields = PoolSerializer.parse_fields(request.query_params.get('fields'))
+      if limit is not None:
+        limit = max(1, min(int(limit), self.MAX_LIMIT))
+    except ValueError:
+      return Response("Bad request", status=status.HTTP_400_BAD_REQUEST)
+
+    pools = (Pool.objects
+             .filter(membership__user__username=username)
+             .order_by('id')
+             .prefetch_related(*PoolSerializer.prefetch_lookups(fields)))
+    if limit is not None:
+      pools = pools[:limit]
+    with instrument('serialization'):
+      pool_data = PoolSerializer.to_data_batch(pools, fields=fields)
+
+    if pool_data:
       return Response(pool_data, status=status.HTTP_201_CREATED)
 
     return Response("Bad request", status=status.HTTP_400_BAD_REQUEST)
@@ -197,3 +436,66 @@ class PoolsByUser(APIView):
   # def get_permissions(self):
     # Allow non-authenticated user to create via POST
     # return (AllowAny() if self.request.method == 'POST' else IsStaffOrTargetUser()),
+
+
+######################################################################
+# POOLS WHERE IT'S A SPECIFIC USER'S TURN
+######################################################################
+class TurnsByUser(APIView):
+  permission_classes = (IsAuthenticated,)
+
+  """
+  Lists summaries of the pools in which it's a user's turn to pick. Users can
+  only see their own turns, unless they are staff.
+  """
+  def get(self, request, username, format=None):
+    if request.user.username != username and not request.user.is_staff:
+      return Response('Forbidden', status=status.HTTP_403_FORBIDDEN)
+
+    # `current_picker` is only set while a pool is drafting.
+    pools = Pool.objects.filter(current_picker__username=username).order_by('id')
+    with instrument('serialization'):
+      pool_data = PoolSerializer.to_data_batch(pools, fields=PoolSerializer.SUMMARY_FIELDS)
+    return Response(pool_data)
+
+
+######################################################################
+# TEAM PREFERENCES OF A SPECIFIC USER
+######################################################################
+class TeamPreferences(APIView):
+  permission_classes = (IsAuthenticated,)
+
+  """
+  A user's ranking of the teams, used to draft for them when their pick is
+  made by the `autodraft` command. Users can only see their own ranking,
+  unless they are staff, and only change their own.
+  """
+  def get(self, request, username, format=None):
+    if request.user.username != username and not request.user.is_staff:
+      return Response('Forbidden', status=status.HTTP_403_FORBIDDEN)
+
+    preferences = (TeamPreference.objects
+                   .filter(user__username=username)
+                   .select_related('team')
+                   .order_by('rank'))
+    return Response(TeamPreferenceSerializer.to_data_batch(preferences))
+
+  def put(self, request, username, format=None):
+    """
+    Replaces the user's ranking.
+
+    Args:
+      `request.data` is expected to be in the format:
+      {
+        "team_ids": [<team_id of the best team>, ...]
+      }
+    """
+    if request.user.username != username:
+      return Response('Forbidden', status=status.HTTP_403_FORBIDDEN)
+
+    try:
+      preferences = TeamPreferenceSerializer.update_from_data(request.user, request.data)
+    except ValueError as e:
+      return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(TeamPreferenceSerializer.to_data_batch(preferences))
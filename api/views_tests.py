@@ -0,0 +1,665 @@
+import json
+import threading
+import time
+import unittest
+
+from api.cache import LRUMemoryCache, cached_response, get_response_cache
+from api.models import NUM_DRAFT_PICKS, DraftBoardSnapshot, DraftPick, Pool, Team, TeamPreference
+from api.models_tests import ModelsTestCase, ModelsTestMixin
+from api.serializers import PoolSerializer
+from api.snapshots import snapshot_response
+from api.views import PoolsByUser
+from api.pubsub import RedisBroker, draft_channel, get_broker, redis
+from api.renderers import msgpack
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory
+
+
+class ViewsTestCase(ModelsTestCase):
+  def setUp(self):
+    self.client = APIClient()
+    # Pool ids are reused between tests, so cached responses must not be.
+    get_response_cache().clear()
+
+
+class LRUMemoryCacheTests(ViewsTestCase):
+  def test_evicts_least_recently_used(self):
+    cache = LRUMemoryCache('test', {'OPTIONS': {'MAX_ENTRIES': 2}})
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+  def test_values_are_copies(self):
+    cache = LRUMemoryCache('test', {})
+    value = {'picks': [1, 2]}
+    cache.set('a', value)
+    value['picks'].append(3)
+
+    assert cache.get('a') == {'picks': [1, 2]}
+
+
+class ResponseCacheTests(ViewsTestCase):
+  def setUp(self):
+    super(ResponseCacheTests, self).setUp()
+    self.users = self.create_test_users(num_users=2)
+    self.teams = self.create_test_teams(num_teams=2)
+    self.pool = self.create_test_draft(self.users)
+    self.client.force_authenticate(user=self.users[0])
+
+  def test_cache_hit(self):
+    for url in ('/api/v1/pools/%s' % self.pool.id, '/api/v1/pools/%s/draft/' % self.pool.id):
+      first = self.client.get(url)
+      # Only the pool itself is read on a hit.
+      with self.assertNumQueries(1):
+        second = self.client.get(url)
+
+      assert first.status_code == second.status_code == 200
+      assert first.data == second.data
+      assert first['ETag'] == second['ETag']
+      assert 'Accept' in first['Vary'] and 'Accept' in second['Vary']
+
+  def test_not_modified(self):
+    url = '/api/v1/pools/%s/draft/' % self.pool.id
+    etag = self.client.get(url)['ETag']
+
+    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 304
+    assert response.content == b''
+    assert response['ETag'] == etag
+    assert 'Accept' in response['Vary']
+
+  def test_varies_on_accept(self):
+    # Also when not answered through a view with several renderers.
+    response = cached_response(APIRequestFactory().get('/'), 'pool', self.pool, lambda: {})
+    assert response['Vary'] == 'Accept'
+
+    request = APIRequestFactory().get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+    response = cached_response(request, 'pool', self.pool, lambda: {})
+    assert response.status_code == 304
+    assert response['Vary'] == 'Accept'
+
+  def test_pick_invalidates(self):
+    url = '/api/v1/pools/%s/draft/' % self.pool.id
+    etag = self.client.get(url)['ETag']
+
+    response = self.client.put(url, {'team_id': self.teams[0].team_short_code}, format='json')
+    assert response.status_code == 200
+
+    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert response.json()[0]['team']['team_id'] == self.teams[0].team_short_code
+
+  def test_membership_change_invalidates(self):
+    pool = self.create_test_pool(max_size=3)
+    url = '/api/v1/pools/%s' % pool.id
+    etag = self.client.get(url)['ETag']
+
+    pool.add_member(self.users[0])
+    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert len(response.data['members']) == 1
+
+    etag = response['ETag']
+    pool.remove_member(self.users[0])
+    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.data['members'] == []
+
+
+class CompactDraftTests(ViewsTestCase):
+  def setUp(self):
+    super(CompactDraftTests, self).setUp()
+    self.users = self.create_test_users(num_users=2)
+    self.teams = self.create_test_teams(num_teams=2)
+    self.pool = self.create_test_draft(self.users)
+    self.client.force_authenticate(user=self.users[0])
+    self.url = '/api/v1/pools/%s/draft/' % self.pool.id
+
+  def test_compact(self):
+    self.client.put(self.url, {'team_id': 'team-1'}, format='json')
+
+    response = self.client.get(self.url, {'format': 'compact'})
+
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/vnd.nba-wins-pool.compact+json'
+    board = json.loads(response.content.decode('utf-8'))
+    assert [user['id'] for user in board['users']] == [user.id for user in self.users]
+    assert [team['team_id'] for team in board['teams']] == ['team-1']
+    assert board['picks']['user'][:3] == [0, 1, 0]
+    assert board['picks']['team'][:2] == [0, None]
+    # Far smaller than the list of picks.
+    assert len(response.content) * 4 < len(self.client.get(self.url).content)
+
+  def test_representations_are_cached_apart(self):
+    plain = self.client.get(self.url)
+    compact = self.client.get(self.url, {'format': 'compact'})
+
+    assert plain['ETag'] != compact['ETag']
+    assert isinstance(self.client.get(self.url).data, list)
+    assert 'picks' in self.client.get(self.url, {'format': 'compact'}).data
+
+  def test_pick_answers_in_the_requested_format(self):
+    response = self.client.put(
+      self.url + '?format=compact', {'team_id': 'team-1'}, format='json')
+
+    assert response.status_code == 200
+    assert response.data['picks']['team'][0] == 0
+
+  @unittest.skipIf(msgpack is None, 'msgpack is not installed')
+  def test_msgpack(self):
+    response = self.client.get(self.url, {'format': 'msgpack'})
+
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/msgpack'
+    board = msgpack.unpackb(response.content, raw=False)
+    assert board == self.client.get(self.url, {'format': 'compact'}).data
+
+
+class DraftSnapshotTests(ViewsTestCase):
+  def setUp(self):
+    super(DraftSnapshotTests, self).setUp()
+    self.users = self.create_test_users(num_users=2)
+    self.teams = self.create_test_teams(num_teams=2)
+    self.pool = self.create_test_draft(self.users)
+    self.client.force_authenticate(user=self.users[0])
+    self.url = '/api/v1/pools/%s/draft/' % self.pool.id
+
+  def test_begin_draft_writes_snapshot(self):
+    pool = self.create_test_pool(max_size=2)
+    for user in self.users:
+      pool.add_member(user)
+
+    snapshot = DraftBoardSnapshot.objects.get(pool=pool)
+    assert snapshot.version == 1
+    board = json.loads(bytes(snapshot.payload).decode('utf-8'))
+    assert [pick['draft_pick_number'] for pick in board] == list(range(1, 31))
+    assert not any('team' in pick for pick in board)
+
+  def test_served_from_snapshot(self):
+    # Without a snapshot, the board is serialized as usual.
+    DraftBoardSnapshot.objects.all().delete()
+    unsnapshotted = self.client.get(self.url).content
+    self.pool.make_draft_pick(self.users[0], self.teams[0])
+
+    # Only the snapshot is read.
+    with self.assertNumQueries(1):
+      response = self.client.get(self.url)
+
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/json'
+    assert 'Accept' in response['Vary']
+    board = response.json()
+    assert board[0]['team']['team_id'] == self.teams[0].team_short_code
+    assert board[1:] == json.loads(unsnapshotted.decode('utf-8'))[1:]
+    get_response_cache().clear()
+    DraftBoardSnapshot.objects.all().delete()
+    assert self.client.get(self.url).content == response.content
+
+  def test_not_modified(self):
+    self.pool.make_draft_pick(self.users[0], self.teams[0])
+    etag = self.client.get(self.url)['ETag']
+
+    response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response.content == b''
+    assert 'Accept' in response['Vary']
+
+    self.client.force_authenticate(user=self.users[1])
+    self.client.put(self.url, {'team_id': self.teams[1].team_short_code}, format='json')
+    response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert response.json()[1]['team']['team_id'] == self.teams[1].team_short_code
+
+  def test_snapshot_varies_on_accept(self):
+    response = snapshot_response(APIRequestFactory().get('/'), self.pool.id)
+    assert response['Vary'] == 'Accept'
+
+    request = APIRequestFactory().get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+    response = snapshot_response(request, self.pool.id)
+    assert response.status_code == 304
+    assert response['Vary'] == 'Accept'
+
+  def test_other_representations_are_serialized(self):
+    self.pool.make_draft_pick(self.users[0], self.teams[0])
+
+    compact = self.client.get(self.url, {'format': 'compact'})
+    indented = self.client.get(self.url, HTTP_ACCEPT='application/json; indent=2')
+
+    assert compact.data['teams'][0]['team_id'] == self.teams[0].team_short_code
+    assert b'\n  ' in indented.content
+    assert indented.data[0]['team']['team_id'] == self.teams[0].team_short_code
+
+
+class PoolLeaderboardTests(ViewsTestCase):
+  def test_leaderboard(self):
+    users = self.create_test_users(num_users=3)
+    teams = self.create_test_teams(num_teams=3)
+    teams[0].set_record(10, 2)
+    teams[1].set_record(4, 8)
+    teams[2].set_record(4, 8)
+    pool = self.create_test_draft(users)
+    for user, team in zip(users, teams):
+      pool.make_draft_pick(user, team)
+
+    response = self.client.get('/api/v1/pools/%s/leaderboard/' % pool.id)
+
+    assert response.status_code == 200
+    assert [(s['rank'], s['wins'], s['losses']) for s in response.data] == [(1, 10, 2), (2, 4, 8), (2, 4, 8)]
+    assert response.data[0]['user']['username'] == users[0].username
+
+  def test_leaderboard_before_draft(self):
+    pool = self.create_test_pool()
+
+    response = self.client.get('/api/v1/pools/%s/leaderboard/' % pool.id)
+
+    assert response.status_code == 200
+    assert response.data == []
+
+  def test_leaderboard_missing_pool(self):
+    response = self.client.get('/api/v1/pools/12345/leaderboard/')
+
+    assert response.status_code == 404
+
+
+@override_settings(DRAFT_EVENTS_TIMEOUT=0.2)
+class DraftEventsTests(ViewsTestCase):
+  def setUp(self):
+    super(DraftEventsTests, self).setUp()
+    self.users = self.create_test_users(num_users=2)
+    self.teams = self.create_test_teams(num_teams=3)
+    self.pool = self.create_test_draft(self.users)
+    for user, team in zip(self.users, self.teams):
+      self.pool.make_draft_pick(user, team)
+    self.url = '/api/v1/pools/%s/draft/events/' % self.pool.id
+
+  def _read_stream(self, response):
+    try:
+      return b''.join(response.streaming_content).decode('utf-8')
+    finally:
+      response.close()
+
+  def test_long_poll_missed_picks(self):
+    response = self.client.get(self.url, {'after': 1})
+
+    assert response.status_code == 200
+    assert response.data == [
+      {'draft_pick_number': 2, 'username': self.users[1].username, 'team_id': self.teams[1].team_short_code},
+    ]
+
+  def test_long_poll_waits_for_next_pick(self):
+    event = {'draft_pick_number': 3, 'username': self.users[0].username, 'team_id': self.teams[2].team_short_code}
+    timer = threading.Timer(0.05, get_broker().publish, (draft_channel(self.pool.id), event))
+    timer.start()
+
+    response = self.client.get(self.url, {'after': 2})
+    timer.join()
+
+    assert response.status_code == 200
+    assert response.data == [event]
+
+  @override_settings(DRAFT_EVENTS_TIMEOUT=5)
+  def test_long_poll_completed_draft(self):
+    pool = self.create_test_draft(self.users, name='Completed')
+    for draft_pick in DraftPick.objects.filter(pool=pool).order_by('draft_pick_number'):
+      team = Team.objects.create(team_short_code='done-%s' % draft_pick.draft_pick_number)
+      pool.make_draft_pick(draft_pick.user, team)
+
+    start = time.time()
+    response = self.client.get('/api/v1/pools/%s/draft/events/' % pool.id, {'after': NUM_DRAFT_PICKS})
+
+    assert response.status_code == 200
+    assert response.data == []
+    assert time.time() - start < 1
+
+  def test_long_poll_timeout(self):
+    response = self.client.get(self.url, {'after': 2})
+
+    assert response.status_code == 200
+    assert response.data == []
+
+  def test_event_stream_resumes_from_last_event_id(self):
+    response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream', HTTP_LAST_EVENT_ID='1')
+
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/event-stream')
+    body = self._read_stream(response)
+    assert body.startswith('id: 2\nevent: pick\ndata: ')
+    assert json.loads(body.split('data: ')[1].split('\n')[0])['team_id'] == self.teams[1].team_short_code
+    assert 'id: 1\n' not in body
+
+  def test_missing_pool(self):
+    response = self.client.get('/api/v1/pools/12345/draft/events/')
+
+    assert response.status_code == 404
+
+
+class DraftEventsPublishTests(ModelsTestMixin, TransactionTestCase):
+  def test_pick_published_on_commit(self):
+    users = self.create_test_users(num_users=2)
+    teams = self.create_test_teams(num_teams=1)
+    pool = self.create_test_draft(users)
+
+    with get_broker().subscribe(draft_channel(pool.id)) as subscription:
+      pool.make_draft_pick(users[0], teams[0])
+      event = subscription.get(timeout=1)
+
+    assert event == {'draft_pick_number': 1, 'username': users[0].username, 'team_id': teams[0].team_short_code}
+
+
+@unittest.skipIf(redis is None, 'redis is not installed')
+class RedisBrokerTests(SimpleTestCase):
+  def setUp(self):
+    # Nothing listens on port 1, so Redis is unreachable.
+    self.broker = RedisBroker('redis://127.0.0.1:1/0')
+
+  def tearDown(self):
+    self.broker.close()
+
+  def test_dispatch_reaches_subscribers_of_the_channel(self):
+    with self.broker.subscribe(draft_channel(1)) as subscription, self.broker.subscribe(draft_channel(2)) as other:
+      self.broker.dispatch(b'nba-wins-pool:draft:1', b'{"draft_pick_number": 1}')
+
+      assert subscription.get(timeout=1) == {'draft_pick_number': 1}
+      assert other.get_nowait() is None
+
+  def test_subscribe_does_not_wait_for_redis(self):
+    # The async views subscribe on the event loop.
+    start = time.time()
+    with self.broker.subscribe(draft_channel(1)):
+      pass
+
+    assert time.time() - start < 0.1
+
+  def test_publish_without_redis(self):
+    # The pick has been committed already: losing the event must not fail it.
+    self.broker.publish(draft_channel(1), {'draft_pick_number': 1})
+
+
+class PoolListTests(ViewsTestCase):
+  def setUp(self):
+    super(PoolListTests, self).setUp()
+    self.users = self.create_test_users(num_users=2)
+    self.teams = self.create_test_teams(num_teams=2)
+    self.open_pool = self.create_test_pool(name='Open', max_size=3)
+    self.drafting_pool = self.create_test_draft(self.users, name='Drafting')
+    self.complete_pool = self.create_test_draft(self.users, name='Complete', num_picks=2)
+    for user, team in zip(self.users, self.teams):
+      self.complete_pool.make_draft_pick(user, team)
+    for pool in (self.drafting_pool, self.complete_pool):
+      Pool.objects.filter(id=pool.id).update(member_count=2)
+
+  def _names(self, response):
+    return [pool['name'] for pool in response.data['results']]
+
+  def test_empty(self):
+    Pool.objects.all().delete()
+
+    response = self.client.get('/api/v1/pools/')
+
+    assert response.status_code == 200
+    assert response.data['results'] == []
+    assert response.data['next'] is None
+
+  def test_cursor_pagination(self):
+    for i in range(3):
+      self.create_test_pool(name='Extra %s' % i)
+
+    names = []
+    url = '/api/v1/pools/?page_size=2'
+    while url:
+      response = self.client.get(url)
+      assert response.status_code == 200
+      assert len(response.data['results']) <= 2
+      names.extend(self._names(response))
+      url = response.data['next']
+
+    assert names == ['Open', 'Drafting', 'Complete', 'Extra 0', 'Extra 1', 'Extra 2']
+
+  def test_filter_by_state(self):
+    for state, names in (('open', ['Open']), ('drafting', ['Drafting']), ('complete', ['Complete'])):
+      response = self.client.get('/api/v1/pools/', {'state': state})
+      assert response.status_code == 200
+      assert self._names(response) == names
+
+    response = self.client.get('/api/v1/pools/', {'state': 'paused'})
+    assert response.status_code == 400
+
+  def test_filter_by_max_size(self):
+    response = self.client.get('/api/v1/pools/', {'max_size': 3})
+
+    assert self._names(response) == ['Open']
+
+  def test_sparse_fields(self):
+    # Only the page of pools is read when no relations are requested.
+    with self.assertNumQueries(1):
+      response = self.client.get('/api/v1/pools/', {'fields': 'id,name'})
+
+    assert response.status_code == 200
+    assert response.data['results'][0] == {'id': self.open_pool.id, 'name': 'Open'}
+
+    response = self.client.get('/api/v1/pools/', {'fields': 'id,password'})
+    assert response.status_code == 400
+
+
+class PoolBatchTests(ViewsTestCase):
+  def setUp(self):
+    super(PoolBatchTests, self).setUp()
+    self.users = self.create_test_users(num_users=3)
+    self.usernames = [user.username for user in self.users]
+    self.staff = self.create_test_user(email='staff@mailinator.com', username='staff')
+    self.staff.is_staff = True
+    self.staff.save()
+    self.client.force_authenticate(user=self.staff)
+
+  def test_creates_pools(self):
+    response = self.client.post('/api/v1/pools/bulk/', {'pools': [
+      {'name': 'Open', 'max_size': 3, 'members': self.usernames[:1]},
+      {'name': 'Full', 'max_size': 2, 'members': self.usernames[1:]},
+      {'name': 'Empty', 'max_size': 5},
+    ]}, format='json')
+
+    assert response.status_code == 201
+    pools = response.data['pools']
+    assert [(pool['name'], pool['state']) for pool in pools] == [
+      ('Open', 'open'), ('Full', 'drafting'), ('Empty', 'open')]
+    assert pools[1]['current_pick_number'] == 1
+
+    open_pool, full_pool, empty_pool = [Pool.objects.get(id=pool['id']) for pool in pools]
+    assert list(open_pool.members.all()) == self.users[:1]
+    assert (open_pool.member_count, empty_pool.member_count) == (1, 0)
+    assert not open_pool.draftpick_set.exists()
+    assert full_pool.draftpick_set.count() == 30
+    assert full_pool.standing_set.count() == 2
+    assert full_pool.current_picker_id in (self.users[1].id, self.users[2].id)
+    assert full_pool.current_pick_started_at is not None
+
+    board = self.client.get('/api/v1/pools/%s/draft/' % full_pool.id).json()
+    assert len(board) == 30
+    assert DraftBoardSnapshot.objects.get(pool=full_pool).version == 1
+
+  def test_queries(self):
+    pools_data = [{'name': 'Pool %s' % i, 'max_size': 3, 'members': self.usernames} for i in range(5)]
+    # One query for the users, the Pools, one bulk INSERT per table and the
+    # savepoint around them.
+    num_pool_inserts = 1 if connection.features.can_return_ids_from_bulk_insert else 5
+    with self.assertNumQueries(1 + num_pool_inserts + 4 + 2):
+      pools = PoolSerializer.create_batch_from_data({'pools': pools_data})
+
+    assert len(pools) == 5
+    assert all(pool.state == 'drafting' for pool in pools)
+
+  def test_invalid_pools(self):
+    response = self.client.post('/api/v1/pools/bulk/', {'pools': [
+      {'name': 'Fine', 'max_size': 3, 'members': self.usernames},
+      {'name': 'Unknown', 'max_size': 3, 'members': ['nobody', self.usernames[0]]},
+      {'name': 'Too many', 'max_size': 2, 'members': self.usernames},
+      {'name': 'Twice', 'max_size': 2, 'members': self.usernames[:1] * 2},
+      {'name': 'Odd size', 'max_size': 4},
+    ]}, format='json')
+
+    assert response.status_code == 400
+    assert response.data['errors'] == [
+      None,
+      'Unknown usernames: nobody',
+      'Too many members for a pool of 2',
+      'A user can only be a member once',
+      'Unsupported max_size: 4',
+    ]
+    assert not Pool.objects.exists()
+
+  def test_bad_request(self):
+    for data in ({}, {'pools': []}, {'pools': [{'name': 'Pool', 'max_size': 2}] * 1001}):
+      response = self.client.post('/api/v1/pools/bulk/', data, format='json')
+      assert response.status_code == 400
+
+  def test_staff_only(self):
+    self.client.force_authenticate(user=self.users[0])
+
+    response = self.client.post(
+      '/api/v1/pools/bulk/', {'pools': [{'name': 'Pool', 'max_size': 2}]}, format='json')
+
+    assert response.status_code == 403
+    assert not Pool.objects.exists()
+
+
+class TurnsByUserTests(ViewsTestCase):
+  def setUp(self):
+    super(TurnsByUserTests, self).setUp()
+    self.users = [
+      self.create_test_user(email='%s@mailinator.com' % username, username=username)
+      for username in ('alice', 'bob')
+    ]
+    self.teams = self.create_test_teams(num_teams=1)
+    # alice picks first in both pools, but has already picked in the second.
+    self.pools = [self.create_test_draft(self.users, name='Pool %s' % i) for i in range(2)]
+    self.pools[1].make_draft_pick(self.users[0], self.teams[0])
+
+  def test_turns(self):
+    self.client.force_authenticate(user=self.users[0])
+    with self.assertNumQueries(1):
+      response = self.client.get('/api/v1/alice/turns/')
+
+    assert response.status_code == 200
+    assert response.data == [{
+      'id': self.pools[0].id,
+      'name': 'Pool 0',
+      'max_size': 2,
+      'state': 'drafting',
+      'current_pick_number': 1,
+    }]
+
+    self.client.force_authenticate(user=self.users[1])
+    response = self.client.get('/api/v1/bob/turns/')
+    assert [pool['id'] for pool in response.data] == [self.pools[1].id]
+
+  def test_other_users_turns(self):
+    self.client.force_authenticate(user=self.users[1])
+    response = self.client.get('/api/v1/alice/turns/')
+
+    assert response.status_code == 403
+
+  def test_requires_authentication(self):
+    response = self.client.get('/api/v1/alice/turns/')
+
+    assert response.status_code == 401
+
+
+class PoolsByUserTests(ViewsTestCase):
+  def setUp(self):
+    super(PoolsByUserTests, self).setUp()
+    self.users = [
+      self.create_test_user(email='%s@mailinator.com' % username, username=username)
+      for username in ('alice', 'bob')
+    ]
+    self.client.force_authenticate(user=self.users[0])
+
+  def test_constant_queries(self):
+    """Pools, members and boards are each read once, however many pools."""
+    self.create_test_draft(self.users, name='Pool 0')
+    with self.assertNumQueries(3):
+      response = self.client.get('/api/v1/alice/pools/')
+    assert [pool['name'] for pool in response.data] == ['Pool 0']
+
+    for i in range(1, 10):
+      self.create_test_draft(self.users, name='Pool %s' % i)
+    with self.assertNumQueries(3):
+      response = self.client.get('/api/v1/alice/pools/')
+    assert [pool['name'] for pool in response.data] == ['Pool %s' % i for i in range(10)]
+    assert all(len(pool['draft_status']) == 30 for pool in response.data)
+
+  def test_limit_and_fields(self):
+    for i in range(3):
+      self.create_test_draft(self.users, name='Pool %s' % i)
+
+    with self.assertNumQueries(1):
+      response = self.client.get('/api/v1/alice/pools/', {'limit': 2, 'fields': 'id,name'})
+
+    assert [sorted(pool.keys()) for pool in response.data] == [['id', 'name'], ['id', 'name']]
+    assert [pool['name'] for pool in response.data] == ['Pool 0', 'Pool 1']
+
+  def test_without_limit_returns_every_pool(self):
+    self.addCleanup(setattr, PoolsByUser, 'MAX_LIMIT', PoolsByUser.MAX_LIMIT)
+    PoolsByUser.MAX_LIMIT = 2
+    for i in range(3):
+      self.create_test_draft(self.users, name='Pool %s' % i)
+
+    response = self.client.get('/api/v1/alice/pools/')
+    assert [pool['name'] for pool in response.data] == ['Pool 0', 'Pool 1', 'Pool 2']
+
+    response = self.client.get('/api/v1/alice/pools/', {'limit': 5})
+    assert [pool['name'] for pool in response.data] == ['Pool 0', 'Pool 1']
+
+  def test_no_pools(self):
+    response = self.client.get('/api/v1/alice/pools/')
+
+    assert response.status_code == 400
+
+
+class TeamPreferencesTests(ViewsTestCase):
+  def setUp(self):
+    super(TeamPreferencesTests, self).setUp()
+    self.users = [
+      self.create_test_user(email='%s@mailinator.com' % username, username=username)
+      for username in ('alice', 'bob')
+    ]
+    self.teams = self.create_test_teams(num_teams=3)
+
+  def test_replace_preferences(self):
+    self.client.force_authenticate(user=self.users[0])
+    response = self.client.put(
+      '/api/v1/alice/preferences/', {'team_ids': ['team-2', 'team-0']}, format='json')
+    assert response.status_code == 200
+
+    response = self.client.put(
+      '/api/v1/alice/preferences/', {'team_ids': ['team-1', 'team-2']}, format='json')
+    assert response.status_code == 200
+
+    response = self.client.get('/api/v1/alice/preferences/')
+    assert [team['team_id'] for team in response.data] == ['team-1', 'team-2']
+    assert list(TeamPreference.objects.filter(user=self.users[0])
+                .order_by('rank').values_list('rank', flat=True)) == [1, 2]
+
+  def test_bad_preferences(self):
+    self.client.force_authenticate(user=self.users[0])
+    for team_ids in (['team-0', 'not-a-team'], ['team-0', 'team-0'], 'team-0'):
+      response = self.client.put(
+        '/api/v1/alice/preferences/', {'team_ids': team_ids}, format='json')
+      assert response.status_code == 400
+
+    assert not TeamPreference.objects.exists()
+
+  def test_other_users_preferences(self):
+    self.client.force_authenticate(user=self.users[1])
+    assert self.client.get('/api/v1/alice/preferences/').status_code == 403
+    response = self.client.put(
+      '/api/v1/alice/preferences/', {'team_ids': ['team-0']}, format='json')
+    assert response.status_code == 403
@@ -0,0 +1,24 @@
+"""
+ASGI config for nba_wins_pool project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+The live endpoints of api/async_views.py are answered without holding a
+thread while they wait; every other request goes to the WSGI application of
+nba_wins_pool/wsgi.py. Serve it with any ASGI server, e.g.
+
+    uvicorn nba_wins_pool.asgi:application
+"""
+
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "nba_wins_pool.settings")
+
+# Sets Django up, so it comes before anything that loads the models.
+from nba_wins_pool.wsgi import application as wsgi_application  # noqa: E402
+from api.async_views import AsyncRoutes, django_to_asgi  # noqa: E402
+from api.pubsub import get_broker  # noqa: E402
+
+# Subscribes to the events of the other processes before the first request.
+get_broker()
+
+application = AsyncRoutes(django_to_asgi(wsgi_application))
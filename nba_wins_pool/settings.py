@@ -33,7 +33,7 @@ else:
 # Application definition
 
 INSTALLED_APPS = [
-    'api',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -96,6 +97,32 @@ if os.environ['ENVIRONMENT'] == 'PRODUCTION':
     DATABASES['default'].update(db_from_env)
 
 
+# Caches
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+# `responses` holds the rendered pool and draft boards, see api/cache.py.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'api.cache.LRUMemoryCache',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Share the response cache between processes through a Redis-protocol server.
+if os.environ.get('REDIS_URL'):
+    CACHES['responses'] = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+        'TIMEOUT': 60 * 60,
+    }
+    # Relay live draft events between processes, see api/pubsub.py.
+    REDIS_URL = os.environ['REDIS_URL']
+    DRAFT_EVENT_BROKER = 'api.pubsub.RedisBroker'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
 
@@ -142,9 +169,44 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication'
     ],
+    # Compact JSON through orjson when it's installed, see api/renderers.py.
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'PAGE_SIZE': 10
 }
 
+# Pagination is set per view (see api/pagination.py), so `PAGE_SIZE` is only
+# the default page size.
+SILENCED_SYSTEM_CHECKS = ['rest_framework.W001']
+
+# How long a draft event stream or long-poll stays open, and how often an
+# idle stream sends a keepalive, in seconds.
+DRAFT_EVENTS_TIMEOUT = 30
+DRAFT_EVENTS_KEEPALIVE = 15
+
+# How many threads run the blocking work under nba_wins_pool/asgi.py: the
+# database calls of api/async_views.py and every request left to Django.
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', '8'))
+
+# Server-Timing headers and Prometheus metrics at /metrics, see
+# api/instrumentation.py. When off, the instrumentation costs nothing.
+INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', '').lower() in ('1', 'true')
+
+# How long a user has to make their pick, in minutes, before the `autodraft`
+# command picks for them.
+AUTODRAFT_DEADLINE_MINUTES = 60
+
+# Start drafts from a `run_jobs` worker instead of in the request that adds
+# the last member, see api/jobs.py.
+DRAFT_START_ASYNC = os.environ.get('DRAFT_START_ASYNC', '').lower() in ('1', 'true')
+
 # Honor the 'X-Forwarded-Proto' header for request.is_secure()
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
@@ -175,10 +237,24 @@ STATICFILES_STORAGE = 'whitenoise.django.GzipManifestStaticFilesStorage'
 ######################################################################
 # LOGGING CONFIGURATION
 ######################################################################
+# `LOG_FORMAT=json` logs one JSON object per line, and `LOG_SAMPLE_RATE`
+# keeps that fraction of the INFO and DEBUG records of 'nba-logger'.
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'verbose')
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '1.0'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {
+            '()': 'api.logs.SamplingFilter',
+            'rate': LOG_SAMPLE_RATE,
+        },
+    },
     'formatters': {
+        'json': {
+            '()': 'api.logs.JsonFormatter',
+        },
         'verbose': {
             'format': ('%(asctime)s [%(process)d] [%(levelname)s] ' +
                        'pathname=%(pathname)s lineno=%(lineno)s ' +
@@ -197,12 +273,13 @@ LOGGING = {
         'console': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
-            'formatter': 'verbose'
+            'formatter': LOG_FORMAT,
         }
     },
     'loggers': {
         'nba-logger': {
             'handlers': ['console'],
+            'filters': ['sampling'],
             'level': 'INFO',
         }
     }
@@ -14,9 +14,9 @@ Including another URLconf
     2. Add a URL to urlpatterns:  url(r'^blog/', include('blog.urls'))
 """
 
-import logging
-
 from api import views
+from api.instrumentation import metrics
+from api.logs import Lazy, get_logger
 from django.conf.urls import url, include
 from rest_framework import routers
 from rest_framework.authtoken.views import obtain_auth_token
@@ -26,21 +26,28 @@ router = routers.DefaultRouter()
 router.register(r'accounts', views.UserViewSet)
 # router.register(r'pools', views.PoolViewSet)
 
-logger = logging.getLogger('nba-logger')
+logger = get_logger('nba-logger')
 
-logger.info('all router urls: %s' % router.urls)
+logger.debug('urls.router', urls=Lazy(lambda: router.urls))
 # Wire up our API using automatic URL routing.
 # Additionally, we include login URLs for the browsable API.
 urlpatterns = [
     url(r'^api/v1/', include(router.urls)),
 
+    url(r'^api/v1/pools/bulk/$', views.PoolBatch.as_view()),
+
     # Details of Pools
     url(r'^api/v1/pools/(?P<pool_id>[0-9]+)$', views.PoolDetail.as_view()),
+    url(r'^api/v1/pools/(?P<pool_id>[0-9]+)/draft/events/$', views.DraftEvents.as_view()),
     url(r'^api/v1/pools/(?P<pool_id>[0-9]+)/draft/', views.DraftDetail.as_view()),
     url(r'^api/v1/pools/(?P<pool_id>[0-9]+)/members/', views.PoolMembers.as_view()),
+    url(r'^api/v1/pools/(?P<pool_id>[0-9]+)/leaderboard/', views.PoolLeaderboard.as_view()),
 
     url(r'^api/v1/(?P<username>[a-zA-Z0-9]+)/pools/', views.PoolsByUser.as_view()),
+    url(r'^api/v1/(?P<username>[a-zA-Z0-9]+)/turns/$', views.TurnsByUser.as_view()),
+    url(r'^api/v1/(?P<username>[a-zA-Z0-9]+)/preferences/$', views.TeamPreferences.as_view()),
     url(r'^api/v1/auth/', obtain_auth_token),
+    url(r'^metrics$', metrics),
 
     # TODO(shravan): Remove this in production.
     # DEBUGGING ONLY